@@ -38,6 +38,7 @@
 # UNITED STATES DEPARTMENT OF ENERGY under Contract DE-AC05-76RL01830
 # -------------------------------------------------------------------------------
 
+import atexit
 import logging
 import logging.config
 import os
@@ -49,6 +50,7 @@ from argparse import ArgumentParser
 from multiprocessing import Process
 from pathlib import Path
 from time import sleep
+from typing import Optional
 
 import yaml
 from werkzeug.serving import BaseWSGIServer
@@ -76,23 +78,20 @@ class ServerThread(threading.Thread):
 
 
 def get_tls_repository(cfg: ServerConfiguration,
-                       create_certificates_for_devices: bool = True) -> TLSRepository:
+                       create_certificates_for_devices: bool = True,
+                       cert_workers: Optional[int] = None) -> TLSRepository:
     tlsrepo = TLSRepository(cfg.tls_repository,
                             cfg.openssl_cnf,
                             cfg.server_hostname,
                             cfg.proxy_hostname,
                             clear=create_certificates_for_devices,
-                            generate_admin_cert=cfg.generate_admin_cert)
+                            generate_admin_cert=cfg.generate_admin_cert,
+                            warm_start=True)
 
     if create_certificates_for_devices:
-        already_represented = set()
-
         # registers the devices, but doesn't initialize_device the end devices here.
-        for k in cfg.devices:
-            if tlsrepo.has_device(k.id):
-                already_represented.add(k)
-            else:
-                tlsrepo.create_cert(k.id)
+        tlsrepo.create_certs([k.id for k in cfg.devices if not tlsrepo.has_device(k.id)],
+                             workers=cert_workers)
     return tlsrepo
 
 
@@ -180,11 +179,20 @@ def _main():
         "--create-certs",
         action="store_true",
         help="If specified certificates for for client and server will be created.")
+    parser.add_argument(
+        "--cert-workers",
+        type=int,
+        help="Number of processes creating the device certificates with --create-certs, "
+        "defaults to the number of cpus.")
     parser.add_argument("--debug", action="store_true", help="Debug level of the server")
     parser.add_argument("--production",
                         action="store_true",
                         default=False,
                         help="Run the server in a threaded environment.")
+    parser.add_argument("--asyncio",
+                        action="store_true",
+                        default=False,
+                        help="Serve the clients from an asyncio event loop.")
     parser.add_argument(
         "--lfdi",
         help="Use lfdi mode allows a single lfdi to be connected to on an http connection")
@@ -252,7 +260,9 @@ def _main():
         sys.stderr.write("Can't show lfdi when creating certificates.\n")
         sys.exit(1)
 
-    tls_repo = get_tls_repository(config, create_certificates_for_devices=opts.create_certs)
+    tls_repo = get_tls_repository(config,
+                                  create_certificates_for_devices=opts.create_certs,
+                                  cert_workers=opts.cert_workers)
     gridappsd_adpt = None
 
     if config.gridappsd is not None:
@@ -297,8 +307,8 @@ def _main():
         config.storage_path = Path(config.storage_path)
 
     # Cleanse means we want to reload the storage each time the server
-    # is run.  Note this is dependent on the adapter being filestore
-    # not database.  I will have to modify later to deal with that.
+    # is run.  initialize_2030_5 also clears the adapters in case a store
+    # outside of these directories was loaded.
     if config.cleanse_storage and config.storage_path.exists():
         _log.debug(f"Removing {config.storage_path}")
         shutil.rmtree(config.storage_path)
@@ -309,11 +319,26 @@ def _main():
         shutil.rmtree(data_store_userdir)
 
     # Has to be after we remove the storage path if necessary
-    from ieee_2030_5.server.server_constructs import initialize_2030_5
-
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.data.indexer import load_hrefs
+    from ieee_2030_5.persistance.storage import create_storage
+    from ieee_2030_5.server.server_constructs import initialize_2030_5, restore_der_controls
+
+    loaded = adpt.set_storage(create_storage(config.storage_backend, config.storage_path))
+    if config.storage_backend:
+        adpt.enable_write_behind(config.storage_flush_interval, config.storage_flush_max_pending)
+    if not config.cleanse_storage:
+        # Warm restart, initialize_2030_5 only adds what the configuration has and the store
+        # doesn't.
+        _log.info(f"Loaded {loaded} resources and {load_hrefs()} hrefs from {config.storage_path}")
+    # With cleanse_storage set this clears anything that was still loaded from the store.
     initialize_2030_5(config, tls_repo)
+    restore_der_controls()
+    adpt.checkpoint()
+    atexit.register(adpt.disable_write_behind)
+    atexit.register(adpt.checkpoint)
 
-    from ieee_2030_5.flask_server import run_server
+    from ieee_2030_5.flask_server import run_production_server, run_server
 
     #from ieee_2030_5.gui import run_gui
     #if not opts.production:
@@ -344,12 +369,18 @@ def _main():
     # # while True:
     # #     sleep(1)
     try:
-        run_server(config,
-                tls_repo,
-                debug=opts.debug,
-                use_reloader=False,
-                use_debugger=opts.debug,
-                threaded=False)
+        if opts.asyncio:
+            from ieee_2030_5.async_server import run_async_server
+            run_async_server(config, tls_repo)
+        elif opts.production:
+            run_production_server(config, tls_repo)
+        else:
+            run_server(config,
+                    tls_repo,
+                    debug=opts.debug,
+                    use_reloader=False,
+                    use_debugger=opts.debug,
+                    threaded=False)
     except KeyboardInterrupt:
         _log.info("Shutting down server")
         sys.flush()
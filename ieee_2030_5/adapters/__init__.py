@@ -2,6 +2,9 @@ from __future__ import annotations
 import os
 
 import inspect
+import pickle
+import time
+from bisect import bisect_left, insort
 from pprint import pprint
 import logging
 import typing
@@ -22,6 +25,11 @@ import ieee_2030_5.config as cfg
 import ieee_2030_5.hrefs as hrefs
 import ieee_2030_5.models as m
 from ieee_2030_5.certs import TLSRepository
+from ieee_2030_5.data.prefix_index import PrefixIndex
+from ieee_2030_5.data.reading_store import ReadingSeries
+from ieee_2030_5.data.response_cache import response_cache
+from ieee_2030_5.persistance.storage import NullStorage, StorageBackend
+from ieee_2030_5.persistance.write_behind import WriteBehindQueue
 
 _log = logging.getLogger(__name__)
 
@@ -51,51 +59,250 @@ def __get_store__(store_name: str) -> Path:
     return store_path
 
 
+# The storage engine the adapters persist to.  Replaced through set_storage.
+_storage: StorageBackend = NullStorage()
+# Adapters that have been through the load_event and are therefore persisted.
+_persisted_adapters: List[Union[Adapter, ResourceListAdapter]] = []
+# Queue used to persist changes off the request path, see enable_write_behind.
+_write_behind: Optional[WriteBehindQueue] = None
+
+
+def __namespace__(caller: Union[Adapter, ResourceListAdapter]) -> str:
+    if isinstance(caller, Adapter):
+        return f"{Adapter.__name__}:{caller.generic_type_name}"
+    return caller.__class__.__name__
+
+
+def set_storage(storage: StorageBackend) -> int:
+    """Use storage as the storage engine for all persisted adapters.
+
+    Anything already in the storage engine is loaded into the adapters, which allows
+    a warm restart of the server without re-running the initialization.
+
+    :return: The number of resources loaded from the storage engine.
+    """
+    global _storage
+    flush()
+    _storage = storage
+    loaded = 0
+    for adapter in _persisted_adapters:
+        loaded += __load_adapter__(adapter)
+    return loaded
+
+
+def get_storage() -> StorageBackend:
+    return _storage
+
+
+def __load_adapter__(caller: Union[Adapter, ResourceListAdapter]) -> int:
+    loaded = 0
+    namespace = __namespace__(caller)
+    if isinstance(caller, Adapter):
+        for key, value in _storage.items(namespace):
+            item = pickle.loads(value)
+            caller._item_list[int(key)] = item
+            GlobalmRIDs.add_item(item)
+            loaded += 1
+        caller._item_list = dict(sorted(caller._item_list.items()))
+        caller._current_index = max(caller._item_list.keys(), default=-1)
+        caller.reindex()
+    elif isinstance(caller, ResourceListAdapter):
+        for list_uri, value in _storage.items(f"{namespace}:types"):
+            caller._types[list_uri] = pickle.loads(value)
+        for list_uri, value in _storage.items(f"{namespace}:series"):
+            uom, power_of_ten_multiplier = pickle.loads(value)
+            caller._container_dict[list_uri] = ReadingSeries(list_uri, uom,
+                                                             power_of_ten_multiplier)
+        for uri, value in _storage.items(f"{namespace}:singles"):
+            caller._singleton_dict[uri] = pickle.loads(value)
+            caller._singleton_uris.add(uri)
+            GlobalmRIDs.add_item(caller._singleton_dict[uri])
+            loaded += 1
+        list_prefix = f"{namespace}:list:"
+        for list_namespace in _storage.namespaces():
+            if not list_namespace.startswith(list_prefix):
+                continue
+            list_uri = list_namespace[len(list_prefix):]
+            container = caller._container_dict.setdefault(list_uri, {})
+            items = sorted((int(key), value) for key, value in _storage.items(list_namespace))
+            for key, value in items:
+                container[key] = pickle.loads(value)
+                GlobalmRIDs.add_item(container[key])
+                loaded += 1
+            caller.reindex(list_uri)
+            caller._next_keys.pop(list_uri, None)
+    else:
+        raise ValueError(f"Invalid caller type {type(caller)}")
+
+    if loaded:
+        _log.debug(f"Loaded {loaded} items from store into {namespace}")
+    return loaded
+
+
+def checkpoint() -> None:
+    """Write every item of every persisted adapter to the storage engine and commit.
+
+    Resources that are mutated in place (rather than through set/put) are only captured
+    by a checkpoint, so one is taken after initialization and at shutdown.
+    """
+    if isinstance(_storage, NullStorage):
+        return
+    for adapter in _persisted_adapters:
+        if isinstance(adapter, Adapter):
+            for key in list(adapter._item_list):
+                do_save_event(adapter, key=key)
+        else:
+            for list_uri in list(adapter._types) + adapter.reading_series_uris():
+                do_save_event(adapter, list_uri=list_uri)
+            for list_uri, container in list(adapter._container_dict.items()):
+                for key in list(container):
+                    do_save_event(adapter, list_uri=list_uri, key=key)
+            for uri in list(adapter._singleton_dict):
+                do_save_event(adapter, single_uri=uri)
+    flush()
+
+
 def do_load_event(caller: Union[Adapter, ResourceListAdapter]) -> None:
-    """Load an adaptor type from the data_store path.
+    """Register the adapter for persistence and load its items from the storage engine.
+    """
+    if caller not in _persisted_adapters:
+        _persisted_adapters.append(caller)
+    __load_adapter__(caller)
+
+
+def enable_write_behind(flush_interval: float = 1.0, max_pending: int = 1000) -> WriteBehindQueue:
+    """Persist changes from a background thread instead of on the calling thread.
+
+    Changes to the same item between flushes are coalesced into a single write.
     """
-    _log.debug("No-op load")
-    # store_file = None
-    # if isinstance(caller, Adapter):
-    #     _log.debug(f"Loading store {caller.generic_type_name}")
-    #     store_file = __get_store__(caller.generic_type_name)
-    # elif isinstance(caller, ResourceListAdapter):
-    #     store_file = __get_store__(caller.__class__.__name__)
-    # else:
-    #     raise ValueError(f"Invalid caller type {type(caller)}")
-    #
-    # if not store_file.exists():
-    #     _log.debug(f"Store {store_file.as_posix()} does not exist at present.")
-    #     return
-    #
-    # # Load from yaml unsafe values etc.
-    # with open(store_file, "r") as f:
-    #     items = yaml.load(f, Loader=yaml.UnsafeLoader)
-    #
-    #     caller.__dict__.update(items)
-
-    # _log.debug(f"Loaded {caller.count} items from store")
-
-
-def do_save_event(caller: Union[Adapter, ResourceListAdapter]) -> None:
-
-    _log.debug("Store no op")
-    # store_file = None
-    # if isinstance(caller, Adapter):
-    #     _log.debug(f"Loading store {caller.generic_type_name}")
-    #     store_file = __get_store__(caller.generic_type_name)
-    #     _log.debug(f"Storing: {caller.generic_type_name}")
-    # elif isinstance(caller, ResourceListAdapter):
-    #     store_file = __get_store__(caller.__class__.__name__)
-    # else:
-    #     raise ValueError(f"Invalid caller type {type(caller)}")
-    #
-    # with open(store_file, 'w') as f:
-    #     yaml.dump(caller.__dict__, f, default_flow_style=False, allow_unicode=True)
+    global _write_behind
+    if _write_behind is None:
+        _write_behind = WriteBehindQueue(write=lambda change: __write_item__(*change),
+                                         commit=lambda: _storage.commit(),
+                                         flush_interval=flush_interval,
+                                         max_pending=max_pending)
+        _write_behind.start()
+    return _write_behind
+
+
+def disable_write_behind() -> None:
+    """Stop the write-behind thread after flushing everything pending to the storage engine."""
+    global _write_behind
+    if _write_behind is not None:
+        _write_behind.stop()
+        _write_behind = None
+
+
+def flush() -> None:
+    """Write all pending changes to the storage engine and commit them."""
+    if _write_behind is not None:
+        _write_behind.flush()
+    _storage.commit()
+
+
+def do_save_event(caller: Union[Adapter, ResourceListAdapter],
+                  list_uri: Optional[str] = None,
+                  key: Optional[int] = None,
+                  single_uri: Optional[str] = None,
+                  cleared: bool = False) -> None:
+    """Write the changed item of the caller to the storage engine.
+
+    Only the item identified by the keyword arguments is written.  A store_event without
+    any arguments marks the end of a logical batch and commits the storage engine.  When
+    write-behind is enabled the change is queued instead and written by the flush thread.
+    """
+    if isinstance(_storage, NullStorage) or caller not in _persisted_adapters:
+        return
+
+    if _write_behind is None:
+        __write_item__(caller, list_uri, key, single_uri, cleared)
+    elif list_uri is not None or key is not None or single_uri is not None or cleared:
+        change_key = (id(caller), list_uri, key, single_uri, cleared)
+        supersedes = None
+        if cleared:
+            # Pending writes for what is being cleared no longer matter.
+            def supersedes(pending_key) -> bool:
+                return pending_key[0] == id(caller) and (list_uri is None or (
+                    pending_key[1] == list_uri and pending_key[2] is not None))
+
+        _write_behind.put(change_key, (caller, list_uri, key, single_uri, cleared), supersedes)
+
+
+def __write_item__(caller: Union[Adapter, ResourceListAdapter],
+                   list_uri: Optional[str] = None,
+                   key: Optional[int] = None,
+                   single_uri: Optional[str] = None,
+                   cleared: bool = False) -> None:
+    namespace = __namespace__(caller)
+    if isinstance(caller, Adapter):
+        if cleared:
+            _storage.delete_namespace(namespace)
+        elif key is not None:
+            if key in caller._item_list:
+                _storage.put(namespace, str(key), pickle.dumps(caller._item_list[key]))
+            else:
+                _storage.delete(namespace, str(key))
+        else:
+            _storage.commit()
+    elif isinstance(caller, ResourceListAdapter):
+        if cleared and list_uri is None:
+            for existing in _storage.namespaces():
+                if existing == namespace or existing.startswith(f"{namespace}:"):
+                    _storage.delete_namespace(existing)
+        elif cleared:
+            _storage.delete_namespace(f"{namespace}:list:{list_uri}")
+            _storage.delete(f"{namespace}:types", list_uri)
+        elif single_uri is not None:
+            _storage.put(f"{namespace}:singles", single_uri,
+                         pickle.dumps(caller._singleton_dict[single_uri]))
+        elif list_uri is not None and key is None:
+            if list_uri in caller._types:
+                _storage.put(f"{namespace}:types", list_uri,
+                             pickle.dumps(caller._types[list_uri]))
+            series = caller._container_dict.get(list_uri)
+            if isinstance(series, ReadingSeries):
+                _storage.put(f"{namespace}:series", list_uri,
+                             pickle.dumps((series.uom, series.power_of_ten_multiplier)))
+        elif list_uri is not None:
+            list_namespace = f"{namespace}:list:{list_uri}"
+            container = caller._container_dict.get(list_uri, {})
+            if key in container:
+                _storage.put(list_namespace, str(key), pickle.dumps(container[key]))
+            else:
+                _storage.delete(list_namespace, str(key))
+        else:
+            _storage.commit()
+    else:
+        raise ValueError(f"Invalid caller type {type(caller)}")
+
+
+def do_invalidate_responses(caller: Union[Adapter, ResourceListAdapter],
+                            list_uri: Optional[str] = None,
+                            key: Optional[int] = None,
+                            single_uri: Optional[str] = None,
+                            cleared: bool = False) -> None:
+    """
+    Drop the cached responses for the resources changed by a store_event.  A store_event
+    without arguments (e.g. after items were changed in place) may have changed anything the
+    caller holds.
+    """
+    if isinstance(caller, Adapter):
+        response_cache.invalidate_list(caller.href_prefix)
+    elif list_uri is None and single_uri is None:
+        response_cache.clear()
+    elif cleared:
+        response_cache.invalidate_list(list_uri)
+    elif single_uri is not None:
+        response_cache.invalidate(single_uri)
+    elif list_uri is not None:
+        response_cache.invalidate(list_uri)
+        if key is not None:
+            response_cache.invalidate(hrefs.SEP.join([list_uri, str(key)]))
 
 
 load_event.connect(do_load_event)
 store_event.connect(do_save_event)
+store_event.connect(do_invalidate_responses)
 
 
 class ReturnCode(Enum):
@@ -143,6 +350,32 @@ class AdapterListProtocol(AdapterIndexProtocol):
 
 ready_signal = Signal("ready-signal")
 
+
+@dataclass
+class ReadingRetention:
+    """Retention policy for an ordered list, see ResourceListAdapter.set_retention."""
+    max_count: Optional[int] = None
+    max_age: Optional[int] = None
+    prop: str = "timePeriod.start"
+
+# Properties that every list in a ResourceListAdapter is indexed on by default.  Additional
+# (possibly dotted) properties can be declared per list through ResourceListAdapter.add_index.
+DEFAULT_INDEXED_PROPERTIES = ("mRID", "href", "localID")
+
+
+def resolve_property(obj: object, prop: str) -> Any:
+    """Resolve a possibly dotted property path (e.g. ``timePeriod.start``) on obj.
+
+    An AttributeError is raised when a property does not exist on the object.  If an
+    intermediate value is None then None is returned.
+    """
+    value = obj
+    for part in prop.split('.'):
+        if value is None:
+            return None
+        value = getattr(value, part)
+    return value
+
 T = TypeVar('T')
 C = TypeVar('C')
 D = TypeVar('D')
@@ -168,8 +401,17 @@ class ResourceListAdapter:
         self._list_urls = []
         self._container_dict: Dict[str, Dict[int, D]] = {}
         self._singleton_dict: Dict[str, D] = {}
+        self._singleton_uris = PrefixIndex()
         self._singleton_envelops: Dict[str, E] = {}
         self._types: Dict[str, D] = {}
+        # list_uri -> property -> property value -> ordered keys (dict used as an ordered set)
+        self._indexes: Dict[str, Dict[str, Dict[Any, Dict[int, None]]]] = {}
+        self._index_props: Dict[str, List[str]] = {}
+        # list_uri -> property -> sorted (has value, value, key) entries
+        self._ordered: Dict[str, Dict[str, List[tuple]]] = {}
+        self._ordered_entries: Dict[str, Dict[str, Dict[int, tuple]]] = {}
+        self._retention: Dict[str, ReadingRetention] = {}
+        self._next_keys: Dict[str, int] = {}
         if not os.environ.get('IEEE_ADAPTER_IGNORE_INITIAL_LOAD'):
             _log.debug(f"Intializing adapter {self.__class__.__name__}")
             load_event.send(self)
@@ -195,14 +437,212 @@ class ResourceListAdapter:
             _log.error("Must initialize before container has any items.")
             raise ValueError("Must initialize before container has any items.")
         self._types[list_uri] = obj
+        store_event.send(self, list_uri=list_uri)
+
+    def add_index(self, list_uri: str, prop: str):
+        """
+        Declare a secondary index on prop for the list at list_uri.
+
+        The property may be dotted (e.g. ``timePeriod.start``).  Items already in the list are
+        indexed immediately and the index is maintained through append, set, remove and clear.
+
+        :param list_uri: The URI of the list container
+        :param prop: The property to index
+        """
+        props = self._index_props.setdefault(list_uri, list(DEFAULT_INDEXED_PROPERTIES))
+        if prop not in props:
+            props.append(prop)
+        self._build_index(list_uri, prop)
+
+    def reindex(self, list_uri: str):
+        """
+        Rebuild all of the indexes for list_uri.  Required only when an indexed property of an
+        item is mutated in place rather than through :meth:`set`.
+        """
+        self._indexes.pop(list_uri, None)
+        for prop in self._index_props.get(list_uri, DEFAULT_INDEXED_PROPERTIES):
+            self._build_index(list_uri, prop)
+        for prop in list(self._ordered.pop(list_uri, {})):
+            self.add_ordered_index(list_uri, prop)
+
+    def _build_index(self, list_uri: str, prop: str):
+        index = self._indexes.setdefault(list_uri, {})
+        index[prop] = {}
+        for key, obj in self._container_dict.get(list_uri, {}).items():
+            self._index_value(index[prop], key, obj, prop)
+
+    @staticmethod
+    def _index_value(prop_index: Dict[Any, Dict[int, None]], key: int, obj: D, prop: str):
+        try:
+            value = resolve_property(obj, prop)
+            if value is not None:
+                prop_index.setdefault(value, {})[key] = None
+        except (AttributeError, TypeError):
+            # Property not on this type or value not hashable, so it can't be indexed.
+            pass
+
+    def _index_item(self, list_uri: str, key: int, obj: D):
+        index = self._indexes.setdefault(list_uri, {})
+        for prop in self._index_props.get(list_uri, DEFAULT_INDEXED_PROPERTIES):
+            self._index_value(index.setdefault(prop, {}), key, obj, prop)
+
+    def _unindex_item(self, list_uri: str, key: int, obj: D):
+        for prop, prop_index in self._indexes.get(list_uri, {}).items():
+            try:
+                value = resolve_property(obj, prop)
+                keys = prop_index.get(value)
+            except (AttributeError, TypeError):
+                continue
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del prop_index[value]
+
+    def add_ordered_index(self, list_uri: str, prop: str = "timePeriod.start"):
+        """
+        Keep the items of list_uri ordered by the (possibly dotted) prop.
+
+        get_resource_list sorted by prop pages through the ordered index rather than sorting
+        the list on every call and get_range answers range queries in O(log n).  Items
+        without a value for prop sort before all others.
+        """
+        ordered = self._ordered.setdefault(list_uri, {})
+        if prop in ordered:
+            return
+        entries = self._ordered_entries.setdefault(list_uri, {})[prop] = {}
+        for key, obj in self._container_dict.get(list_uri, {}).items():
+            entries[key] = self._ordered_entry(obj, prop, key)
+        ordered[prop] = sorted(entries.values())
+
+    def use_reading_series(self,
+                           list_uri: str,
+                           reading_type: Optional[m.ReadingType] = None) -> ReadingSeries:
+        """
+        Store the Reading objects of list_uri column by column rather than as objects.
+
+        Items are materialized into a new Reading each time they are read from the list, so
+        changing a Reading read from (or appended to) the list doesn't change the list.  Pass
+        the changed Reading back through :meth:`set` instead.  Returns the series, which
+        provides the aggregate queries over the readings.
+        """
+        container = self._container_dict.get(list_uri)
+        changed = not isinstance(container, ReadingSeries)
+        if changed:
+            series = ReadingSeries(list_uri)
+            for key, obj in (container or {}).items():
+                series[key] = obj
+            self._container_dict[list_uri] = container = series
+        if reading_type is not None and (container.uom, container.power_of_ten_multiplier) != (
+                reading_type.uom, reading_type.powerOfTenMultiplier):
+            container.uom = reading_type.uom
+            container.power_of_ten_multiplier = reading_type.powerOfTenMultiplier
+            changed = True
+        if changed:
+            # Stored along with the type of the list so a warm restart loads a series.
+            store_event.send(self, list_uri=list_uri)
+        return container
+
+    def get_reading_series(self, list_uri: str) -> Optional[ReadingSeries]:
+        """The ReadingSeries of list_uri, None if the list isn't stored as one."""
+        container = self._container_dict.get(list_uri)
+        return container if isinstance(container, ReadingSeries) else None
+
+    def reading_series_uris(self, prefix: str = "") -> List[str]:
+        """The uris of the lists starting with prefix that are stored as a ReadingSeries."""
+        return [
+            list_uri for list_uri, container in self._container_dict.items()
+            if isinstance(container, ReadingSeries) and list_uri.startswith(prefix)
+        ]
+
+    def set_retention(self, list_uri: str, retention: ReadingRetention):
+        """
+        Limit list_uri to retention.max_count items and/or items no older than
+        retention.max_age seconds, based upon the ordered index of retention.prop.  Items
+        without a value for retention.prop are never too old, though they are the first
+        removed for max_count.
+        """
+        self.add_ordered_index(list_uri, retention.prop)
+        self._retention[list_uri] = retention
+        self._apply_retention(list_uri)
+
+    @staticmethod
+    def _ordered_entry(obj: D, prop: str, key: int) -> tuple:
+        try:
+            value = resolve_property(obj, prop)
+        except AttributeError:
+            value = None
+        return (0, 0, key) if value is None else (1, value, key)
+
+    def _order_item(self, list_uri: str, key: int, obj: D):
+        for prop, ordered in self._ordered.get(list_uri, {}).items():
+            entry = self._ordered_entry(obj, prop, key)
+            self._ordered_entries[list_uri][prop][key] = entry
+            insort(ordered, entry)
+
+    def _unorder_item(self, list_uri: str, key: int):
+        for prop, ordered in self._ordered.get(list_uri, {}).items():
+            entry = self._ordered_entries[list_uri][prop].pop(key, None)
+            if entry is not None:
+                pos = bisect_left(ordered, entry)
+                if pos < len(ordered) and ordered[pos] == entry:
+                    del ordered[pos]
+
+    def _apply_retention(self, list_uri: str):
+        retention = self._retention.get(list_uri)
+        if retention is None:
+            return
+        ordered = self._ordered[list_uri][retention.prop]
+        if retention.max_count is not None:
+            while len(ordered) > retention.max_count:
+                self.remove(list_uri, ordered[0][2])
+        if retention.max_age is not None:
+            oldest_allowed = int(time.time()) - retention.max_age
+            # Skip the items without a value, they sort first.
+            pos = bisect_left(ordered, (1, ))
+            while pos < len(ordered) and ordered[pos][1] < oldest_allowed:
+                self.remove(list_uri, ordered[pos][2])
+
+    def get_range(self,
+                  list_uri: str,
+                  low: Any = None,
+                  high: Any = None,
+                  prop: str = "timePeriod.start",
+                  step: Optional[int] = None) -> List[D]:
+        """
+        Return the items of list_uri with low <= prop < high in ascending order.
+
+        :param step: Downsample by returning only the first item in each step wide bucket of
+                     prop values.
+        :raises KeyError: If there is no ordered index on prop for list_uri.
+        """
+        ordered = self._ordered[list_uri][prop]
+        container = self._container_dict[list_uri]
+        pos = 0 if low is None else bisect_left(ordered, (1, low))
+        end = len(ordered) if high is None else bisect_left(ordered, (1, high))
+        items = []
+        last_bucket = None
+        for has_value, value, key in ordered[pos:end]:
+            if step is not None and has_value:
+                bucket = value // step
+                if bucket == last_bucket:
+                    continue
+                last_bucket = bucket
+            items.append(container[key])
+        return items
+
+    def next_key(self, list_uri: str) -> int:
+        """The key the next item appended to list_uri will be stored under."""
+        if list_uri not in self._next_keys:
+            self._next_keys[list_uri] = max(self._container_dict.get(list_uri, {}), default=-1) + 1
+        return self._next_keys[list_uri]
 
     def append_and_increment_href(self, list_uri: str, obj: D) -> D:
         url_parts: list[str] = list_uri.split(hrefs.SEP)
         try:
             int(url_parts[0])
-            obj.href = hrefs.SEP.join(url_parts[1:].append(str(self.list_size(list_uri))))
+            obj.href = hrefs.SEP.join(url_parts[1:].append(str(self.next_key(list_uri))))
         except ValueError:
-            obj.href = hrefs.SEP.join([list_uri, str(self.list_size(list_uri))])
+            obj.href = hrefs.SEP.join([list_uri, str(self.next_key(list_uri))])
 
         GlobalmRIDs.add_item(value=obj)
 
@@ -235,6 +675,7 @@ class ResourceListAdapter:
                 raise ValueError(f"List for {list_uri} has already been initialized")
 
             self._types[list_uri] = expected_type
+            store_event.send(self, list_uri=list_uri)
 
             # Recurse over the list appending to the end for each in the list
             for ele in getattr(obj, expected_type.__name__):
@@ -255,10 +696,15 @@ class ResourceListAdapter:
 
         if list_uri not in self._container_dict:
             self._container_dict[list_uri] = {}
-        self._container_dict[list_uri][len(self._container_dict[list_uri])] = obj
+        key = self.next_key(list_uri)
+        self._next_keys[list_uri] = key + 1
+        self._container_dict[list_uri][key] = obj
+        self._index_item(list_uri, key, obj)
+        self._order_item(list_uri, key, obj)
         if hasattr(obj, "mRID"):
             GlobalmRIDs.add_item_with_mrid(obj.mRID, obj)
-        store_event.send(self)
+        store_event.send(self, list_uri=list_uri, key=key)
+        self._apply_retention(list_uri)
 
     def get_by_mrid(self, list_uri: str, mrid: str) -> Optional[T]:
         try:
@@ -268,11 +714,49 @@ class ResourceListAdapter:
             return None
 
     def get_item_by_prop(self, list_uri: str, prop: str, value: Any) -> D:
-        for item in self._container_dict.get(list_uri, {}).values():
-            if getattr(item, prop) == value:
-                return item
+        """
+        Return the first item in list_uri whose (possibly dotted) prop equals value.
+
+        Indexed properties are resolved through a hash lookup, a value the index doesn't have
+        isn't in the list.  An indexed property changed in place must be passed back through
+        :meth:`set` (or the list reindexed) before it can be found by its new value.  Any other
+        property falls back to a scan of the list.
+
+        :raises NotFoundError: If no item in the list matches.
+        :raises AttributeError: If prop is not indexed and does not exist on the items.
+        """
+        for item in self._items_by_prop(list_uri, prop, value):
+            return item
         raise NotFoundError(f"Uri {list_uri} does not contain {prop} == {value}")
 
+    def get_items_by_prop(self, list_uri: str, prop: str, value: Any) -> List[D]:
+        """
+        Return every item in list_uri whose (possibly dotted) prop equals value, resolved the
+        same way as :meth:`get_item_by_prop`.
+        """
+        return list(self._items_by_prop(list_uri, prop, value))
+
+    def _items_by_prop(self, list_uri: str, prop: str, value: Any) -> Iterator[D]:
+        container = self._container_dict.get(list_uri, {})
+        prop_index = self._indexes.get(list_uri, {}).get(prop)
+
+        if prop_index is None:
+            for item in container.values():
+                if resolve_property(item, prop) == value:
+                    yield item
+            return
+
+        try:
+            # Unset values are never indexed.
+            keys = prop_index.get(value) if value is not None else None
+        except TypeError:
+            keys = None
+        for key in list(keys or ()):
+            item = container[key]
+            # Skip an item whose value was changed in place since it was indexed.
+            if resolve_property(item, prop) == value:
+                yield item
+
     def has_list(self, list_uri: str) -> bool:
         return list_uri in self._container_dict
 
@@ -296,6 +780,9 @@ class ResourceListAdapter:
             # exist on first access now.
             if list_uri not in self._container_dict:
                 self._container_dict[list_uri] = {}
+            if len(sort_by) == 1 and sort_by[0] in self._ordered.get(list_uri, {}):
+                return self._get_ordered_resource_list(thelist, cls, list_uri, sort_by[0], start,
+                                                       after, limit, reverse)
             thecontainerlist = list(self._container_dict[list_uri].values())
             for sort in sort_by:
                 subobj = sort.split('.')
@@ -331,6 +818,27 @@ class ResourceListAdapter:
             thelist.results = len(getattr(thelist, cls.__name__))
         return thelist
 
+    def _get_ordered_resource_list(self, thelist: D, cls: type, list_uri: str, prop: str,
+                                   start: int, after: int, limit: int,
+                                   reverse: bool) -> Union[m.List_type, m.SubscribableList]:
+        ordered = self._ordered[list_uri][prop]
+        container = self._container_dict[list_uri]
+        total = len(ordered)
+        if start == after == limit == 0:
+            positions = range(total)
+        else:
+            posx = start + after
+            positions = range(posx, min(posx + limit, total))
+        if reverse:
+            items = [container[ordered[total - 1 - pos][2]] for pos in positions]
+        else:
+            items = [container[ordered[pos][2]] for pos in positions]
+        thelist.href = list_uri
+        thelist.all = total
+        setattr(thelist, cls.__name__, items)
+        thelist.results = len(items)
+        return thelist
+
     def get_list(self, list_uri: str, start: int = 0, limit: int = 0, after: int = 0) -> D:
         if list_uri not in self._container_dict:
             raise KeyError(f"List {list_uri} not found in adapter")
@@ -340,6 +848,8 @@ class ResourceListAdapter:
     def set_single(self, uri: str, obj: D):
         GlobalmRIDs.add_item(value=obj)
         self._singleton_dict[uri] = obj
+        self._singleton_uris.add(uri)
+        store_event.send(self, single_uri=uri)
 
     def get_single(self, uri: str) -> D:
         return self._singleton_dict.get(uri)
@@ -366,6 +876,22 @@ class ResourceListAdapter:
         """
         return filter(fn, self._singleton_dict.keys())
 
+    def get_single_uris(self, prefix: Optional[str] = None, suffix: Optional[str] = None) -> List[str]:
+        """
+        Return the singleton uris starting with prefix and/or whose last segment is suffix.
+
+        Unlike :meth:`filter_single_dict` this does not visit every singleton.
+
+        :param prefix: e.g. ``/edev_0`` for every singleton under the first end device.
+        :param suffix: A sub-resource type, e.g. ``ders`` for every DERStatus.
+        """
+        if suffix is not None:
+            uris = self._singleton_uris.with_suffix(suffix)
+            if prefix is not None:
+                uris = [uri for uri in uris if uri.startswith(prefix)]
+            return uris
+        return self._singleton_uris.with_prefix(prefix or "")
+
     def get(self, list_uri: str, key: int) -> D:
         if list_uri not in self._container_dict:
             raise KeyError(f"List {list_uri} not found in adapter")
@@ -385,8 +911,14 @@ class ResourceListAdapter:
             raise AlreadyExists(
                 f"Key {key} already exists in list {list_uri} but overwrite not set to True")
 
+        if key in self._container_dict[list_uri]:
+            self._unindex_item(list_uri, key, self._container_dict[list_uri][key])
+            self._unorder_item(list_uri, key)
         self._container_dict[list_uri][key] = value
-        store_event.send(self)
+        self._next_keys[list_uri] = max(self.next_key(list_uri), key + 1)
+        self._index_item(list_uri, key, value)
+        self._order_item(list_uri, key, value)
+        store_event.send(self, list_uri=list_uri, key=key)
 
     def store(self):
         store_event.send(self)
@@ -400,8 +932,10 @@ class ResourceListAdapter:
             return cpy
 
     def remove(self, list_uri: str, index: int):
+        self._unindex_item(list_uri, index, self._container_dict[list_uri][index])
+        self._unorder_item(list_uri, index)
         del self._container_dict[list_uri][index]
-        store_event.send(self)
+        store_event.send(self, list_uri=list_uri, key=index)
 
     def render_container(self, list_uri: str, instance: object, prop: str):
         setattr(instance, prop, deepcopy(self._container_dict[list_uri]))
@@ -454,12 +988,31 @@ class ResourceListAdapter:
         self._container_dict.clear()
         self._list_urls.clear()
         self._types.clear()
+        self._indexes.clear()
+        self._ordered.clear()
+        self._ordered_entries.clear()
+        self._retention.clear()
+        self._next_keys.clear()
+        store_event.send(self, cleared=True)
 
     def clear(self, list_uri: str):
+        """
+        Remove every item of list_uri along with the type registered for it, the next item
+        added to the list registers its type again.
+        """
         if list_uri in self._container_dict:
             self._container_dict[list_uri].clear()
-            self._list_urls[list_uri].clear()
-            self._types[list_uri].clear()
+            if list_uri in self._list_urls:
+                self._list_urls.remove(list_uri)
+            self._types.pop(list_uri, None)
+            for prop_index in self._indexes.get(list_uri, {}).values():
+                prop_index.clear()
+            for ordered in self._ordered.get(list_uri, {}).values():
+                ordered.clear()
+            for entries in self._ordered_entries.get(list_uri, {}).values():
+                entries.clear()
+            self._next_keys.pop(list_uri, None)
+            store_event.send(self, list_uri=list_uri, cleared=True)
 
 class _GlobalAdapter:
     def __init__(self):
@@ -503,6 +1056,10 @@ class _GlobalAdapter:
 
 GlobalmRIDs = _GlobalAdapter()
 
+# Properties that every Adapter maintains a hash index for.
+ADAPTER_INDEXED_PROPERTIES = ("lFDI", "sFDI", "mRID", "href")
+
+
 class Adapter(Generic[T]):
     """
     A generic adapter class for storing and retrieving objects of a specific type. The adapter is initialized with a
@@ -525,6 +1082,12 @@ class Adapter(Generic[T]):
         self._href_prefix: str = url_prefix
         self._current_index: int = -1
         self._item_list: Dict[int, T] = {}
+        # property -> property value -> indexes of the items with that value, first added first
+        self._indexes: Dict[str, Dict[Any, Dict[int, None]]] = {}
+        # index -> property -> value at the time the item was indexed, the reverse of _indexes
+        self._indexed_values: Dict[int, Dict[str, Any]] = {}
+        # id(item) -> index for fetch_index without a property
+        self._identity_index: Dict[int, int] = {}
         if not os.environ.get('IEEE_ADAPTER_IGNORE_INITIAL_LOAD'):
             _log.debug(f"Intializing adapter {self.generic_type_name}")
             load_event.send(self)
@@ -555,15 +1118,88 @@ class Adapter(Generic[T]):
     def clear(self) -> None:
         self._current_index = -1
         self._item_list: Dict[int, T] = {}
-        store_event.send(self)
+        self._indexes.clear()
+        self._indexed_values.clear()
+        self._identity_index.clear()
+        store_event.send(self, cleared=True)
+
+    @staticmethod
+    def _property_value(obj: T, prop: str) -> Any:
+        # Mirrors the matching rules of fetch_by_property; Link objects are unwrapped.
+        value = getattr(obj, prop, None)
+        if value is not None and not isinstance(value, (str, bytes, int)):
+            value = getattr(value, prop, None)
+        return value
+
+    def _index_item(self, index: int, item: T):
+        old_values = self._indexed_values.get(index, {})
+        old_item = self._item_list.get(index)
+        if old_item is not None and self._identity_index.get(id(old_item)) == index:
+            del self._identity_index[id(old_item)]
+
+        values = {}
+        for prop in ADAPTER_INDEXED_PROPERTIES:
+            value = self._property_value(item, prop)
+            if value is None:
+                continue
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            values[prop] = value
+
+        for prop, value in old_values.items():
+            if values.get(prop) != value:
+                self._drop_index_entry(index, prop, value)
+        for prop, value in values.items():
+            self._indexes.setdefault(prop, {}).setdefault(value, {})[index] = None
+
+        self._indexed_values[index] = values
+        self._identity_index[id(item)] = index
+
+    def _drop_index_entry(self, index: int, prop: str, value: Any):
+        indexes = self._indexes[prop].get(value)
+        if indexes is not None:
+            indexes.pop(index, None)
+            if not indexes:
+                del self._indexes[prop][value]
+
+    def reindex(self):
+        """
+        Rebuild the indexes.  Only required when an indexed property of a stored item was
+        mutated in place and the item was not passed back through :meth:`put`.
+        """
+        self._indexes.clear()
+        self._indexed_values.clear()
+        self._identity_index.clear()
+        for index, item in self._item_list.items():
+            self._index_item(index, item)
 
-    def fetch_by_mrid(self, mrid: str) -> Optional[T]:
-        return self.fetch_by_property("mRID", mrid)
+    def _fetch_indexed(self, prop: str, prop_value: Any) -> Optional[int]:
+        """
+        The index of the first item whose prop is prop_value according to the indexes, items
+        changed in place since they were put aren't found by their new value.
+        """
+        if prop_value is None:
+            return None
+        try:
+            indexes = self._indexes.get(prop, {}).get(prop_value, ())
+        except TypeError:
+            return None
+        for index in indexes:
+            # Skip an item whose value was changed in place since it was indexed.
+            if self._property_value(self._item_list[index], prop) == prop_value:
+                return index
+        return None
 
     def fetch_by_href(self, href: str) -> Optional[T]:
         return self.fetch_by_property("href", href)
 
     def fetch_by_property(self, prop: str, prop_value: Any) -> Optional[T]:
+        if prop in ADAPTER_INDEXED_PROPERTIES:
+            index = self._fetch_indexed(prop, prop_value)
+            return self._item_list[index] if index is not None else None
+
         for obj in self._item_list.values():
             # Most properties are pointers to other objects so we are going to
             # check both the property and the sub object property here, because
@@ -587,12 +1223,13 @@ class Adapter(Generic[T]):
             setattr(item, 'href', hrefs.SEP.join([self._href_prefix,
                                                   str(self._current_index + 1)]))
         self._current_index += 1
+        self._index_item(self._current_index, item)
         self._item_list[self._current_index] = item
 
         if hasattr(item, 'mRID'):
-            GlobalmRIDs.add_item(getattr(item, 'mRID'), item)
+            GlobalmRIDs.add_item(item)
 
-        store_event.send(self)
+        store_event.send(self, key=self._current_index)
         return item
 
     def fetch_all(self,
@@ -631,6 +1268,16 @@ class Adapter(Generic[T]):
         return container
 
     def fetch_index(self, obj: T, using_prop: str = None) -> int:
+        if using_prop is None:
+            index = self._identity_index.get(id(obj))
+            if index is not None and self._item_list.get(index) is obj:
+                return index
+        elif using_prop in ADAPTER_INDEXED_PROPERTIES:
+            index = self._fetch_indexed(using_prop, getattr(obj, using_prop))
+            if index is None:
+                raise KeyError(f"Object {obj} not found in adapter")
+            return index
+
         found_index = -1
         for index, obj1 in self._item_list.items():
             if using_prop is None:
@@ -649,17 +1296,18 @@ class Adapter(Generic[T]):
         return self._item_list[index]
 
     def put(self, index: int, obj: T):
+        self._index_item(index, obj)
         self._item_list[index] = obj
-        store_event.send(self)
+        store_event.send(self, key=index)
 
     def fetch_by_mrid(self, mRID: str):
-        for item in self._item_list.values():
-            if not hasattr(item, 'mRID'):
-                raise ValueError(f"Item of {type(T)} does not have mRID property")
-            if item.mRID == mRID:
-                return item
+        if not hasattr(self._generic_type, 'mRID'):
+            raise ValueError(f"Item of {self.generic_type_name} does not have mRID property")
 
-        raise KeyError(f"mRID ({mRID}) not found.")
+        index = self._fetch_indexed("mRID", mRID)
+        if index is None:
+            raise KeyError(f"mRID ({mRID}) not found.")
+        return self._item_list[index]
 
     def size(self) -> int:
         return len(self._item_list)
@@ -696,13 +1344,14 @@ from ieee_2030_5.adapters.adapters import (DERAdapter, DERControlAdapter, DERCur
                                            DERProgramAdapter, DeviceCapabilityAdapter,
                                            EndDeviceAdapter, FunctionSetAssignmentsAdapter,
                                            RegistrationAdapter, TimeAdapter, ListAdapter,
-                                           create_mirror_usage_point, create_or_update_meter_reading)
+                                           create_mirror_usage_point, create_or_update_meter_reading,
+                                           ingest_mirror_readings, meter_reading_aggregates)
 
 __all__ = [
     'DERControlAdapter', 'DERCurveAdapter', 'DERProgramAdapter', 'DeviceCapabilityAdapter',
     'EndDeviceAdapter', 'FunctionSetAssignmentsAdapter', 'RegistrationAdapter', 'DERAdapter',
     'TimeAdapter', 'create_mirror_usage_point', 'create_or_update_meter_reading', 'ListAdapter',
-    'GlobalmRIDs'
+    'GlobalmRIDs', 'ReadingRetention', 'ingest_mirror_readings', 'meter_reading_aggregates'
 ]
 
 
@@ -1,12 +1,16 @@
 from dataclasses import dataclass, field
+import heapq
+import itertools
 import threading
-from typing import Callable, Dict, List, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from ieee_2030_5.data.indexer import add_href
 import ieee_2030_5.hrefs as hrefs
 import ieee_2030_5.models as m
 import ieee_2030_5.adapters as adpt
-from ieee_2030_5.adapters import Adapter, NotFoundError, ResourceListAdapter
+from ieee_2030_5.adapters import Adapter, NotFoundError, ReadingRetention, ResourceListAdapter
 from ieee_2030_5.config import ReturnValue
+from ieee_2030_5.data.reading_store import ReadingAggregate, ReadingSeries, combine_aggregates
+from ieee_2030_5.utils.xml_stream import MirrorReadingStream
 
 from copy import deepcopy
 from datetime import datetime
@@ -31,11 +35,26 @@ RegistrationAdapter = Adapter[m.Registration](url_prefix="/reg", generic_type=m.
 DERAdapter = Adapter[m.DER](url_prefix="/der", generic_type=m.DER)
 UsagePointAdapter = Adapter[m.UsagePoint](url_prefix="/upt", generic_type=m.UsagePoint)
 ListAdapter = ResourceListAdapter()
+# Resolves the UsagePoints of a device for meter_reading_aggregates.
+ListAdapter.add_index(hrefs.DEFAULT_UPT_ROOT, "deviceLFDI")
 
 
-def _create_or_update_reading(reading_list_href: str, reading: m.Reading) -> ReturnValue:
+def _create_or_update_reading(reading_list_href: str,
+                              reading: m.Reading,
+                              retention: Optional[ReadingRetention] = None,
+                              reading_type: Optional[m.ReadingType] = None) -> ReturnValue:
     updated = False
 
+    # The UsagePoint readings are only read back by GETs and aggregate queries so keep them
+    # in columns rather than a Reading object per value.
+    adpt.ListAdapter.use_reading_series(reading_list_href, reading_type)
+
+    # Reading lists are served newest first and queried by time window so keep them ordered
+    # by start time rather than sorting on every request.
+    adpt.ListAdapter.add_ordered_index(reading_list_href, "timePeriod.start")
+    if retention is not None:
+        adpt.ListAdapter.set_retention(reading_list_href, retention)
+
     saved_reading: m.Reading | None = None
     # Attempt to find an existing reading with the same loc
     try:
@@ -63,6 +82,7 @@ def _create_or_update_reading_set(reading_set_list_href: str,
 
     update = False
     current_mmr_reading_set: m.MirrorReadingSet | None = None
+    adpt.ListAdapter.add_ordered_index(reading_set_list_href, "timePeriod.start")
 
     current_mmr_reading_set = adpt.ListAdapter.get_by_mrid(mirror_reading_set.href,
                                                            mirror_reading_set.mRID)
@@ -198,14 +218,141 @@ def _create_or_update_meter_reading(
     return saved_mr
 
 
+class MirrorReadingIngest:
+    """
+    Stores the parts of posted MirrorMeterReadings as they become available and mirrors them
+    to the UsagePoint.
+
+    The meter reading (with its ReadingType) has to be started before its reading sets and
+    readings are added.  Readings added while a reading set is started go into the reading
+    set, otherwise into the meter reading.  This lets a body be stored while it is parsed
+    (see utils.stream_mirror_readings) so only the reading being parsed is held in memory.
+
+    :param mup_href: The MirrorUsagePoint the readings are posted to.
+    :param retention: When specified, limits the readings kept in each reading list.
+    """
+
+    def __init__(self, mup_href: str, retention: Optional[ReadingRetention] = None):
+        self.mup_href = mup_href
+        self.retention = retention
+        self.mmr_list_href = hrefs.SEP.join([mup_href, "mr"])
+        self.upt_list_href = self.mmr_list_href.replace("mup", "upt")
+        self.meter_reading_result: Optional[ReturnValue] = None
+        self.reading_set_result: Optional[ReturnValue] = None
+        self.readings = 0
+        self._mirror_meter_reading: Optional[m.MirrorMeterReading] = None
+        self._meter_reading: Optional[m.MeterReading] = None
+        self._reading_type: Optional[m.ReadingType] = None
+        self._reading_set: Optional[m.ReadingSet] = None
+        self._reading_lists: List[str] = []
+
+    def start_meter_reading(self, mmr: m.MirrorMeterReading) -> ReturnValue:
+        # Attempt to find an existing mirror meter reading with the same mRID.
+        mmr_current: m.MirrorMeterReading = adpt.ListAdapter.get_by_mrid(
+            self.mmr_list_href, mmr.mRID)
+        if mmr_current is None:
+            # Store the new mirror meter reading.
+            saved_mmr = adpt.ListAdapter.append_and_increment_href(self.mmr_list_href, mmr)
+        else:
+            saved_mmr = mmr_current
+
+        # Create a meter reading for the usage point from the mirror meter reading.
+        self.meter_reading_result = _create_or_update_meter_reading(self.upt_list_href, saved_mmr)
+        self._mirror_meter_reading = saved_mmr
+        self._meter_reading = self.meter_reading_result.an_object
+        self._reading_type = None
+        self._reading_set = None
+        self._reading_lists = []
+        self._set_reading_type(mmr.ReadingType)
+        return self.meter_reading_result
+
+    def end_meter_reading(self, mmr: m.MirrorMeterReading):
+        """
+        Complete the started meter reading with mmr, which holds what of the meter reading
+        wasn't available when it was started (the ReadingType follows the readings).
+        """
+        if self._reading_type is None and mmr.ReadingType is not None:
+            self._mirror_meter_reading.ReadingType = mmr.ReadingType
+            self._set_reading_type(mmr.ReadingType)
+            for reading_list_href in self._reading_lists:
+                adpt.ListAdapter.use_reading_series(reading_list_href, mmr.ReadingType)
+        self._mirror_meter_reading = self._meter_reading = self._reading_set = None
+
+    def _set_reading_type(self, reading_type: Optional[m.ReadingType]):
+        if reading_type is None:
+            return
+        self._reading_type = reading_type
+        rt_href = hrefs.SEP.join([self._meter_reading.href, "rt"])
+        adpt.ListAdapter.set_single(rt_href, reading_type)
+        self._meter_reading.ReadingTypeLink = m.ReadingTypeLink(href=rt_href)
+
+    def resume_meter_reading(self, index: int):
+        """Add to the meter reading already stored at index of the MirrorUsagePoint."""
+        self._mirror_meter_reading = adpt.ListAdapter.get(self.mmr_list_href, index)
+        self._meter_reading = adpt.ListAdapter.get(self.upt_list_href, index)
+        self._reading_type = self._mirror_meter_reading.ReadingType
+        self._reading_set = None
+        self._reading_lists = []
+        self.meter_reading_result = ReturnValue(True,
+                                                an_object=self._meter_reading,
+                                                was_update=True,
+                                                location=self._meter_reading.href)
+
+    def start_reading_set(self, mirror_reading_set: m.MirrorReadingSet) -> ReturnValue:
+        if self._meter_reading is None:
+            raise ValueError("A meter reading must be started before its reading sets.")
+        upt_rs_href = hrefs.SEP.join([self._meter_reading.href, "rs"])
+        self._meter_reading.ReadingSetListLink = m.ReadingSetListLink(href=upt_rs_href)
+
+        self.reading_set_result = _create_or_update_reading_set(upt_rs_href, mirror_reading_set)
+        assert isinstance(self.reading_set_result.an_object, m.ReadingSet)
+        self._reading_set = self.reading_set_result.an_object
+        self._reading_set.ReadingListLink = m.ReadingListLink(
+            href=hrefs.SEP.join([self._reading_set.href, "r"]))
+        return self.reading_set_result
+
+    def end_reading_set(self):
+        self._reading_set = None
+
+    def add_reading(self, reading: m.Reading) -> ReturnValue:
+        if self._reading_set is not None:
+            reading_list_href = self._reading_set.ReadingListLink.href
+        elif self._meter_reading is not None:
+            reading_list_href = hrefs.SEP.join([self._meter_reading.href, "r"])
+            self._meter_reading.ReadingListLink = m.ReadingListLink(href=reading_list_href)
+        else:
+            raise ValueError("A meter reading must be started before its readings.")
+        if reading_list_href not in self._reading_lists:
+            self._reading_lists.append(reading_list_href)
+        self.readings += 1
+        return _create_or_update_reading(reading_list_href, reading, self.retention,
+                                         self._reading_type)
+
+    def add_meter_reading(self, mmr: m.MirrorMeterReading) -> ReturnValue:
+        """Store an already parsed MirrorMeterReading with its reading sets and reading."""
+        result = self.start_meter_reading(mmr)
+        if mmr.Reading is not None:
+            self.add_reading(mmr.Reading)
+        for mmr_rs in mmr.MirrorReadingSet or []:
+            self.start_reading_set(mmr_rs)
+            for mmr_r in mmr_rs.Reading:
+                self.add_reading(mmr_r)
+            self.end_reading_set()
+        self.end_meter_reading(mmr)
+        return result
+
+
 def create_or_update_meter_reading(
     mup_href: str,
     mmr_input: Union[m.MirrorMeterReading, m.MirrorMeterReadingList],
+    retention: Optional[ReadingRetention] = None,
 ) -> ReturnValue:
+    """
+    Create or update the MirrorMeterReading (or each one of a MirrorMeterReadingList) below
+    mup_href and mirror it to the UsagePoint.
 
-    if isinstance(mmr_input, m.MirrorMeterReadingList):
-        raise NotImplemented()
-
+    :param retention: When specified, limits the readings kept in each reading list.
+    """
     mup: m.MirrorUsagePoint = adpt.ListAdapter.get(hrefs.DEFAULT_MUP_ROOT,
                                                    mup_href.split(hrefs.SEP)[-1])
     assert isinstance(mup, m.MirrorUsagePoint)
@@ -214,64 +361,20 @@ def create_or_update_meter_reading(
 
     assert isinstance(upt, m.UsagePoint)
 
-    was_updated = False
-    location = None
-
+    ingest = MirrorReadingIngest(mup_href, retention)
     if isinstance(mmr_input, m.MirrorMeterReadingList):
-        return ReturnValue(False, "Not Implemented")
-
-    elif isinstance(mmr_input, m.MirrorMeterReading):
-
-        # Attempt to find an existing mirror meter reading with the same mRID.
-        # If found then we need to replace it with this new meter reading.
-        mmr_list_href = hrefs.SEP.join([mup_href, "mr"])
-        upt_list_href = mmr_list_href.replace("mup", "upt")
+        results = [ingest.add_meter_reading(mmr) for mmr in mmr_input.MirrorMeterReading]
+        adpt.ListAdapter.store()
+        return ReturnValue(True,
+                           an_object=None,
+                           was_update=bool(results) and all(r.was_update for r in results),
+                           location=ingest.upt_list_href)
 
-        mmr_current: m.MirrorMeterReading = adpt.ListAdapter.get_by_mrid(
-            mmr_list_href, mmr_input.mRID)
+    # The over all result of this call!
+    meter_reading_result = ingest.add_meter_reading(mmr_input)
+    adpt.ListAdapter.store()
+    return meter_reading_result
 
-        # Each of the following will only create a single level and then return.  The return
-        # object will be the last object created.
-        #
-        # if not found then we add the mmr to the list of mmrs.
-        if mmr_current is None:
-            # Store the new mirror meter reading.
-            saved_mmr = adpt.ListAdapter.append_and_increment_href(mmr_list_href, mmr_input)
-        else:
-            saved_mmr = mmr_current
-
-        # Create a meter reading for the usage point from the mirror meter reading.
-        meter_reading_result = _create_or_update_meter_reading(upt_list_href, saved_mmr)
-        meter_reading = meter_reading_result.an_object
-
-        if mmr_input.ReadingType is not None:
-            rt_href = hrefs.SEP.join([meter_reading.href, "rt"])
-            adpt.ListAdapter.set_single(rt_href, mmr_input.ReadingType)
-            meter_reading.ReadingTypeLink = m.ReadingTypeLink(href=rt_href)
-
-        if mmr_input.Reading is not None:
-            upt_r_href = hrefs.SEP.join([meter_reading.href, "r"])
-            meter_reading.ReadingListLink = m.ReadingListLink(href=upt_r_href)
-            reading_result = _create_or_update_reading(upt_r_href, mmr_input.Reading)
-
-        # Use the meter_reading_results object
-        if mmr_input.MirrorReadingSet is not None:
-            upt_rs_href = hrefs.SEP.join([meter_reading_result.an_object.href, "rs"])
-            meter_reading.ReadingSetListLink = m.ReadingSetListLink(href=upt_rs_href)
-
-            for mmr_rs in mmr_input.MirrorReadingSet:
-                ret = _create_or_update_reading_set(upt_rs_href, mmr_rs)
-                assert isinstance(ret.an_object, m.ReadingSet)
-                myrs: m.ReadingSet = ret.an_object
-
-                upt_r_href = hrefs.SEP.join([ret.an_object.href, "r"])
-                myrs.ReadingListLink = m.ReadingListLink(href=upt_r_href)
-                for mmr_r in mmr_rs.Reading:
-                    reading_result = _create_or_update_reading(upt_r_href, mmr_r)
-
-        adpt.ListAdapter.store()
-        # The over all result of this call!
-        return meter_reading_result
 
         # new_mmr_index = adpt.ListAdapter.list_size(mmr_list_href)
         # new_mmr_href = hrefs.SEP.join([mmr_list_href, str(new_mmr_index)])
@@ -427,6 +530,59 @@ def create_or_update_meter_reading(
     return ReturnValue(True, mmr_item, was_updated, location)
 
 
+def ingest_mirror_readings(href: str,
+                           stream: MirrorReadingStream,
+                           retention: Optional[ReadingRetention] = None) -> ReturnValue:
+    """
+    Store a MirrorMeterReadingList, MirrorMeterReading or MirrorReadingSet body as it is
+    parsed by stream (see utils.stream_mirror_readings).
+
+    MirrorMeterReading bodies are posted to the MirrorUsagePoint (/mup_0), MirrorReadingSet
+    bodies to the MirrorMeterReading they belong to (/mup_0_mr_1).  Everything stored before
+    an error in the body is kept.
+
+    :param retention: When specified, limits the readings kept in each reading list.
+    """
+    parts = href.split(hrefs.SEP)
+    mup_href = hrefs.SEP.join(parts[:2])
+    # Make sure the mirror usage point and its usage point exist.
+    adpt.ListAdapter.get(hrefs.DEFAULT_MUP_ROOT, parts[1])
+    adpt.ListAdapter.get(hrefs.DEFAULT_UPT_ROOT, parts[1])
+
+    ingest = MirrorReadingIngest(mup_href, retention)
+    if stream.root_tag == "MirrorReadingSet":
+        if len(parts) != 4 or parts[2] != "mr":
+            raise ValueError("MirrorReadingSet must be posted to a MirrorMeterReading")
+        ingest.resume_meter_reading(int(parts[3]))
+
+    results: List[ReturnValue] = []
+    started: List[str] = []
+    for kind, value in stream:
+        if kind == "MirrorMeterReading":
+            results.append(ingest.start_meter_reading(value))
+        elif kind == "MirrorReadingSet":
+            results.append(ingest.start_reading_set(value))
+        elif kind == "Reading":
+            ingest.add_reading(value)
+            continue
+        elif started.pop() == "MirrorReadingSet":
+            ingest.end_reading_set()
+            continue
+        else:
+            ingest.end_meter_reading(value)
+            continue
+        started.append(kind)
+    adpt.ListAdapter.store()
+
+    if stream.root_tag != "MirrorMeterReadingList" and results:
+        # The result of the meter reading or reading set posted.
+        return results[0]
+    return ReturnValue(True,
+                       an_object=None,
+                       was_update=bool(results) and all(r.was_update for r in results),
+                       location=ingest.upt_list_href)
+
+
 def create_mirror_usage_point(mup: m.MirrorUsagePoint, ) -> ReturnValue:
     """Creates a MirrorUsagePoint and associated UsagePoint and adds them to their adapters.
     """
@@ -508,11 +664,65 @@ def create_mirror_usage_point(mup: m.MirrorUsagePoint, ) -> ReturnValue:
         found_with_mrid.roleFlags = mup.roleFlags
         found_with_mrid.status = mup.status
         update = True
-        adpt.ListAdapter.store()
+        adpt.ListAdapter.set(hrefs.DEFAULT_MUP_ROOT, int(mup.href.split(hrefs.SEP)[-1]),
+                             found_with_mrid)
 
     return ReturnValue(True, mup, update, mup.href)
 
 
+def _hex(value: Union[bytes, str]) -> str:
+    return value.hex() if isinstance(value, bytes) else str(value).lower()
+
+
+def meter_reading_aggregates(device_lfdi: Union[bytes, str], start: int,
+                             end: int) -> Dict[str, ReadingAggregate]:
+    """
+    Aggregate the readings starting in [start, end) of each MeterReading of the UsagePoints
+    of device_lfdi.
+
+    :return: The aggregate of each MeterReading that has readings in the window by the
+             MeterReading's mRID as hex, the start of the aggregates is start.
+    """
+    aggregates: Dict[str, ReadingAggregate] = {}
+    for upt in _usage_points_of(device_lfdi):
+        if upt.MeterReadingListLink is None or \
+                not adpt.ListAdapter.list_size(upt.MeterReadingListLink.href):
+            continue
+        for meter_reading in adpt.ListAdapter.get_list(upt.MeterReadingListLink.href):
+            combined = combine_aggregates(
+                aggregate for series in _reading_series_of(meter_reading)
+                for aggregate in series.aggregate(end - start, start, end))
+            if combined is not None:
+                combined.start = start
+                aggregates[_hex(meter_reading.mRID)] = combined
+    return aggregates
+
+
+def _usage_points_of(device_lfdi: Union[bytes, str]) -> List[m.UsagePoint]:
+    # deviceLFDI is kept as it was posted, either as bytes or as a hex string.
+    lfdi = _hex(device_lfdi)
+    values = {lfdi, lfdi.upper()}
+    try:
+        values.add(bytes.fromhex(lfdi))
+    except ValueError:
+        pass
+    return [
+        upt for value in values
+        for upt in adpt.ListAdapter.get_items_by_prop(hrefs.DEFAULT_UPT_ROOT, "deviceLFDI", value)
+    ]
+
+
+def _reading_series_of(meter_reading: m.MeterReading) -> List[ReadingSeries]:
+    """The series of the readings of meter_reading and of each of its reading sets."""
+    list_uris = [hrefs.SEP.join([meter_reading.href, "r"])]
+    rs_list_uri = hrefs.SEP.join([meter_reading.href, "rs"])
+    if adpt.ListAdapter.list_size(rs_list_uri):
+        list_uris.extend(
+            hrefs.SEP.join([rs.href, "r"]) for rs in adpt.ListAdapter.get_list(rs_list_uri))
+    series = (adpt.ListAdapter.get_reading_series(list_uri) for list_uri in list_uris)
+    return [x for x in series if x is not None]
+
+
 @dataclass
 class TimerSpec:
     trigger_after_seconds: int
@@ -551,13 +761,47 @@ class TimerSpec:
 
 
 class _TimeAdapter(threading.Thread):
+    """
+    Sends the scheduled, started and ended signals for the events added with add_event.
+
+    Each event is kept in a heap under the time of its next transition so the thread only
+    wakes when a transition is due (or once a second while something is connected to tick)
+    rather than scanning every event.
+
+    :param clock: Returns the current time in seconds, defaults to the utc wall clock.
+    """
     tick = Signal("tick")
     event_started = Signal("event_started")
     event_ended = Signal("event_endend")
     event_scheduled = Signal("event_scheduled")
-    events: Dict[str, m.Event] = {}
-    current_tick: int = 0
-    looping: bool = False
+
+    def __init__(self, clock: Optional[Callable[[], float]] = None):
+        super().__init__(daemon=True, name="time-adapter")
+        self._clock = clock or self._utc_now
+        self.events: Dict[str, m.Event] = {}
+        # (due time, sequence, href) of the next transition of each event, entries that no
+        # longer match _due are stale and skipped.
+        self._transitions: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        # Events taken off _due by process_due while their transition is made.
+        self._in_flight: Dict[str, m.Event] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition(threading.RLock())
+        self._last_tick: Optional[int] = None
+
+    @staticmethod
+    def _utc_now() -> float:
+        now = datetime.utcnow()
+        return time.mktime(now.timetuple()) + now.microsecond / 1e6
+
+    @property
+    def current_tick(self) -> int:
+        return int(self._clock())
+
+    @property
+    def pending(self) -> int:
+        """Number of events that still have a transition to make."""
+        return len(self._due.keys() | self._in_flight.keys())
 
     @staticmethod
     def user_readable(timestamp: int) -> str:
@@ -569,45 +813,126 @@ class _TimeAdapter(threading.Thread):
         dt = datetime.strptime(iso_fmt_date, "%Y-%m-%dT%H:%M:%S")
         return int(time.mktime(dt.timetuple()))
 
-    @staticmethod
-    def add_event(evnt: m.Event):
-        time_now = _TimeAdapter.current_tick
+    def _schedule(self, href: str, due: Optional[float]):
+        if due is None:
+            self._due.pop(href, None)
+            return
+        self._due[href] = due
+        heapq.heappush(self._transitions, (due, next(self._sequence), href))
+
+    def add_event(self, evnt: m.Event):
+        """
+        Add an event to be tracked.  Adding an event with the href of a tracked event
+        re-evaluates it, e.g. after its interval has been changed.
+        """
         if evnt.EventStatus is None:
             evnt.EventStatus = m.EventStatus()
-        if evnt.href not in _TimeAdapter.events:
-            while _TimeAdapter.looping:
-                time.sleep(0.1)
-            _TimeAdapter.events[evnt.href] = evnt
+        with self._condition:
+            self.events[evnt.href] = evnt
+            self._schedule(evnt.href, self._clock())
+            self._condition.notify()
 
-    def run(self) -> None:
+    def remove_event(self, href: str) -> Optional[m.Event]:
+        """Stop tracking the event at href."""
+        with self._condition:
+            self._due.pop(href, None)
+            return self.events.pop(href, None)
 
+    @staticmethod
+    def _send(signal: Signal, evnt: m.Event):
+        # A failing receiver mustn't stop the event from making its remaining transitions.
+        try:
+            signal.send(evnt)
+        except Exception:
+            _log.exception(f"Receiver of {signal.name} failed for {evnt.href}")
+
+    def _transition(self, evnt: m.Event, time_now: float) -> Optional[float]:
+        """
+        Move the event to the status for time_now sending the matching signal.  Returns the
+        time of the event's next transition or None when it has none left.
+        """
+        start = evnt.interval.start
+        end = start + evnt.interval.duration
+        status = evnt.EventStatus
+        # Cancelled (with or without randomization) and superseded events never start again,
+        # even when they are added back, e.g. after a PUT of the control.
+        if status.currentStatus in (2, 3, 4):
+            return None
+        if time_now < start:
+            if status.currentStatus is None:
+                status.dateTime = int(time_now)
+                status.currentStatus = 0
+                _log.debug(f"{'='*20}Event Scheduled {evnt.href}")
+                self._send(_TimeAdapter.event_scheduled, evnt)
+            return start
+        if time_now < end:
+            if status.currentStatus != 1:
+                status.currentStatus = 1
+                status.dateTime = int(time_now)
+                _log.debug(f"{'='*20}Event Started {evnt.href}")
+                self._send(_TimeAdapter.event_started, evnt)
+            return end
+        if status.currentStatus == 1:
+            status.currentStatus = 5
+            status.dateTime = int(time_now)
+            _log.debug(f"{'='*20}Event Complete {evnt.href}")
+            self._send(_TimeAdapter.event_ended, evnt)
+        return None
+
+    def process_due(self) -> Optional[float]:
+        """
+        Make every transition that is due.  Returns the number of seconds until the next
+        transition or None when there is nothing scheduled.
+        """
+        time_now = self._clock()
+        with self._condition:
+            due = []
+            while self._transitions and self._transitions[0][0] <= time_now:
+                when, _, href = heapq.heappop(self._transitions)
+                # An event added again while in flight stays due until its transition is done.
+                if self._due.get(href) == when and href not in self._in_flight:
+                    # Taken off _due so any later entry of the event is stale until the
+                    # transition schedules the next one.
+                    del self._due[href]
+                    self._in_flight[href] = self.events[href]
+                    due.append(self.events[href])
+
+        # Signals are sent without holding the lock so receivers are free to add events.
+        for evnt in due:
+            next_due = self._transition(evnt, time_now)
+            with self._condition:
+                del self._in_flight[evnt.href]
+                if evnt.href in self._due:
+                    # Added again during the transition, evaluate it again.
+                    self._schedule(evnt.href, self._due[evnt.href])
+                elif self.events.get(evnt.href) is evnt:
+                    self._schedule(evnt.href, next_due)
+
+        with self._condition:
+            if not self._transitions:
+                return None
+            return max(self._transitions[0][0] - self._clock(), 0)
+
+    def run(self) -> None:
         while True:
-            _TimeAdapter.current_tick = int(time.mktime(datetime.utcnow().timetuple()))
-            _TimeAdapter.tick.send(self.current_tick)
-            _TimeAdapter.looping = True
-            time_now = _TimeAdapter.current_tick
-            for href, evnt in _TimeAdapter.events.items():
-                if time_now < evnt.interval.start and evnt.EventStatus.currentStatus is None:
-                    evnt.EventStatus.dateTime = time_now
-                    evnt.EventStatus.currentStatus = 0
-                    _log.debug(f"{'='*20}Event Scheduled {evnt.href}")
-                    _TimeAdapter.event_scheduled.send(evnt)
-                elif evnt.interval.start < time_now and time_now < evnt.interval.start + evnt.interval.duration:
-                    if evnt.EventStatus.currentStatus != 1:
-                        evnt.EventStatus.currentStatus = 1
-                        evnt.EventStatus.dateTime = time_now
-                        _log.debug(f"{'='*20}Event Started {evnt.href}")
-                        _TimeAdapter.event_started.send(evnt)
-                elif time_now > evnt.interval.start + evnt.interval.duration and evnt.EventStatus.currentStatus == 1:
-                    evnt.EventStatus.currentStatus = 5
-                    evnt.EventStatus.dateTime = time_now
-                    _log.debug(f"{'='*20}Event Complete {evnt.href}")
-                    _TimeAdapter.event_ended.send(evnt)
-
-            _TimeAdapter.looping = False
-            time.sleep(1)
+            self.process_due()
+            to_next_second = None
+            if _TimeAdapter.tick.receivers:
+                current_tick = self.current_tick
+                if current_tick != self._last_tick:
+                    self._last_tick = current_tick
+                    _TimeAdapter.tick.send(current_tick)
+                to_next_second = 1 - (self._clock() % 1)
+            with self._condition:
+                # Computed under the lock so an event added since processing wakes us.
+                wait = None
+                if self._transitions:
+                    wait = self._transitions[0][0] - self._clock()
+                if to_next_second is not None:
+                    wait = to_next_second if wait is None else min(wait, to_next_second)
+                if wait is None or wait > 0:
+                    self._condition.wait(wait)
 
 
 TimeAdapter = _TimeAdapter()
-TimeAdapter.daemon = True
 TimeAdapter.start()
@@ -317,11 +317,7 @@ if ENABLED:
             #     if inverter := next(filter(lambda x: x.lfdi == dev.lfdi, self._inverters):
 
 
-            def detect(v):
-                if v:
-                    return v.endswith("ders")
-
-            der_status_uris = adpt.ListAdapter.filter_single_dict(lambda k: detect(k))
+            der_status_uris = adpt.ListAdapter.get_single_uris(suffix=hrefs.DER_STATUS)
 
 
             for uri in der_status_uris:
@@ -352,19 +348,34 @@ if ENABLED:
                                 analog_value.value = status.stateOfChargeStatus.value
                         msg[inverter.mRID] = asdict(analog_value)
 
+            # The mean of each meter reading of the inverters over the last publish interval,
+            # aggregated from the reading columns rather than the Reading objects.
+            end = adpt.TimeAdapter.current_tick
+            start = end - self._publish_interval_seconds
+            for inverter in self._inverters or []:
+                if inverter.lfdi is None:
+                    continue
+                aggregates = adpt.meter_reading_aggregates(inverter.lfdi, start, end)
+                for mrid, aggregate in aggregates.items():
+                    analog_value = mo.AnalogValue(mRID=mrid, name=inverter.name,
+                                                  value=aggregate.mean)
+                    analog_value.timeStamp = aggregate.start
+                    msg[mrid] = asdict(analog_value)
+
             return msg
 
         def create_2030_5_device_certificates_and_configurations(self) -> list[DeviceConfiguration]:
 
             self._devices = []
             if self.use_houses_as_inverters():
-                for house in self.get_house_and_utility_inverters():
-                    self.tls.create_cert(house.mRID)
+                houses = self.get_house_and_utility_inverters()
+                self.tls.create_certs([house.mRID for house in houses])
+                for house in houses:
                     if house.lfdi is None:
                         house.lfdi = self.tls.lfdi(house.mRID)
             else:
-                for inv in self.get_power_electronic_connections():
-                    self.tls.create_cert(inv.mRID)
+                self.tls.create_certs(
+                    [inv.mRID for inv in self.get_power_electronic_connections()])
             self._build_device_configurations()
             return self._devices
 
@@ -0,0 +1,358 @@
+"""
+asyncio front end for the 2030.5 server.
+
+Each connection is a coroutine rather than a thread so thousands of mostly idle keep-alive
+connections (e.g. inverters polling /dcap, /edev and /tm) cost little more than their
+sockets.  Mutual TLS is terminated by asyncio, the client is identified the same way
+PeerCertWSGIRequestHandler.make_environ does and the request is dispatched to the Flask app,
+and therefore the RequestOp subclasses, on a pool of worker threads.  Only the requests being
+processed occupy a worker.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import signal
+import ssl
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+import werkzeug.exceptions
+
+from ieee_2030_5.certs import TLSRepository
+from ieee_2030_5.config import ServerConfiguration
+from ieee_2030_5.utils.tls_sessions import HandshakeStats
+
+_log = logging.getLogger(__name__)
+
+__all__ = ["AsyncWSGIServer", "run_async_server"]
+
+# Returns the environ entries identifying the client given the path, a callable returning
+# the DER encoded peer certificate and a dictionary that lives as long as the connection.
+IdentityCallback = Callable[[str, Callable[[], Optional[bytes]], Dict[str, Any]], Dict[str, Any]]
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class AsyncWSGIServer:
+    """
+    HTTP/1.1 server running a WSGI application.
+
+    :param app: The WSGI application, called from the worker threads.
+    :param ssl_context: Terminate TLS with this context when specified.
+    :param identity: Adds the client identity to the environ of each request.
+    :param workers: Number of threads running the application.
+    :param keepalive_timeout: Seconds an idle connection is kept open, None to keep it open
+                              until the client closes it.
+    :param max_body: Largest request body accepted.
+
+    The completed TLS handshakes, full and resumed, are counted in handshake_stats.
+    """
+
+    def __init__(self,
+                 app: Callable,
+                 host: str,
+                 port: int,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 identity: Optional[IdentityCallback] = None,
+                 workers: int = 32,
+                 keepalive_timeout: Optional[float] = 300.0,
+                 max_body: int = 10 * 1024 * 1024):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.identity = identity
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self.connections = 0
+        self.max_connections = 0
+        self.handshake_stats = HandshakeStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="2030.5-async")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set = set()
+        # Connections waiting for their next request.
+        self._idle: set = set()
+        self._stopping = False
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection,
+                                                  self.host,
+                                                  self.port,
+                                                  ssl=self.ssl_context,
+                                                  backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop accepting connections and close the open connections once their current
+        request is complete."""
+        self._stopping = True
+        self._server.close()
+        for handler in list(self._idle):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        self._handlers.add(asyncio.current_task())
+        self.connections += 1
+        self.max_connections = max(self.max_connections, self.connections)
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object is not None:
+            self.handshake_stats.record(ssl_object.session_reused)
+        connection_cache: Dict[str, Any] = {}
+        try:
+            while await self._handle_request(reader, writer, connection_cache):
+                pass
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.CancelledError,
+                ConnectionError, ssl.SSLError):
+            pass
+        except Exception:
+            _log.exception("Error handling connection")
+        finally:
+            self.connections -= 1
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              connection_cache: Dict[str, Any]) -> bool:
+        """Handle one request, returns True when the connection should be kept open."""
+        if self._stopping:
+            return False
+        task = asyncio.current_task()
+        self._idle.add(task)
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+        except asyncio.IncompleteReadError as ex:
+            if ex.partial:
+                raise
+            # Client closed an idle connection.
+            return False
+        except asyncio.LimitOverrunError:
+            await self._write_error(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            return False
+        finally:
+            self._idle.discard(task)
+
+        try:
+            method, target, version, headers = self._parse_head(head)
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            body = await self._read_body(reader, headers)
+        except _BadRequest as ex:
+            _log.debug(f"Bad request: {ex}")
+            await self._write_error(writer, HTTPStatus.BAD_REQUEST)
+            return False
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        keep_alive = keep_alive and not self._stopping
+
+        environ = self._build_environ(method, target, version, headers, body, writer)
+        environ["ieee_2030_5_connection_cache"] = connection_cache
+        status, response_headers, response_body = await asyncio.get_running_loop(
+        ).run_in_executor(self._executor, self._call_app, environ)
+
+        lines = [f"{version} {status}"]
+        names = set()
+        for name, value in response_headers:
+            names.add(name.lower())
+            lines.append(f"{name}: {value}")
+        if "content-length" not in names:
+            lines.append(f"Content-Length: {len(response_body)}")
+        if not keep_alive:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if method != "HEAD":
+            writer.write(response_body)
+        await writer.drain()
+        return keep_alive
+
+    @staticmethod
+    async def _write_error(writer: asyncio.StreamWriter, status: HTTPStatus):
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Length: 0\r\n"
+                     "Connection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+
+    @staticmethod
+    def _parse_head(head: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+        try:
+            request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+            method, target, version = request_line.split(" ")
+        except ValueError:
+            raise _BadRequest("Invalid request line")
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise _BadRequest(f"Unsupported version {version}")
+        headers: Dict[str, str] = {}
+        for line in header_lines:
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise _BadRequest(f"Invalid header {line}")
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name] = f"{headers[name]},{value}" if name in headers else value
+        return method, target, version, headers
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        """
+        Read the body of a request, a client that doesn't send all of it within
+        keepalive_timeout has its connection closed.
+        """
+        try:
+            return await asyncio.wait_for(self._read_body_data(reader, headers),
+                                          self.keepalive_timeout)
+        except asyncio.LimitOverrunError:
+            raise _BadRequest("Chunk line too long")
+
+    async def _read_body_data(self, reader: asyncio.StreamReader,
+                              headers: Dict[str, str]) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks: List[bytes] = []
+            size = 0
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                try:
+                    chunk_size = int(line.split(b";")[0], 16)
+                except ValueError:
+                    raise _BadRequest("Invalid chunk size")
+                if chunk_size == 0:
+                    # Skip any trailers.
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    return b"".join(chunks)
+                size += chunk_size
+                if size > self.max_body:
+                    raise _BadRequest("Body too large")
+                chunks.append(await reader.readexactly(chunk_size))
+                await reader.readexactly(2)
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise _BadRequest("Invalid content length")
+        if length < 0 or length > self.max_body:
+            raise _BadRequest("Invalid content length")
+        return await reader.readexactly(length) if length else b""
+
+    def _build_environ(self, method: str, target: str, version: str, headers: Dict[str, str],
+                       body: bytes, writer: asyncio.StreamWriter) -> Dict[str, Any]:
+        path, _, query = target.partition("?")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "REMOTE_PORT": str(peer[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "https" if self.ssl_context else "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.input_terminated": True,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            if name == "content-type":
+                environ["CONTENT_TYPE"] = value
+            elif name not in ("content-length", "transfer-encoding"):
+                environ[f"HTTP_{name.upper().replace('-', '_')}"] = value
+
+        ssl_object = writer.get_extra_info("ssl_object")
+        environ["ieee_2030_5_ssl_object"] = ssl_object
+        return environ
+
+    def _call_app(self, environ: Dict[str, Any]) -> Tuple[str, List[Tuple[str, str]], bytes]:
+        ssl_object = environ.pop("ieee_2030_5_ssl_object")
+        connection_cache = environ.pop("ieee_2030_5_connection_cache")
+        try:
+            if self.identity is not None:
+                environ.update(
+                    self.identity(environ["PATH_INFO"],
+                                  lambda: ssl_object.getpeercert(True) if ssl_object else None,
+                                  connection_cache))
+        except werkzeug.exceptions.HTTPException as ex:
+            return f"{ex.code} {ex.name}", [("Content-Type", "text/plain")], ex.name.encode()
+        except Exception:
+            _log.exception("Unable to identify client")
+            return "403 Forbidden", [("Content-Type", "text/plain")], b"Forbidden"
+
+        response: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+            return lambda data: response.setdefault("written", []).append(data)
+
+        try:
+            result = self.app(environ, start_response)
+            try:
+                body = b"".join(response.pop("written", [])) + b"".join(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception:
+            _log.exception(f"Error processing {environ['REQUEST_METHOD']} {environ['PATH_INFO']}")
+            return "500 Internal Server Error", [("Content-Type", "text/plain")], b""
+        return response["status"], response["headers"], body
+
+
+def run_async_server(config: ServerConfiguration, tlsrepo: TLSRepository):
+    """
+    Serve the 2030.5 server on an AsyncWSGIServer until SIGINT or SIGTERM is received.
+    """
+    import ieee_2030_5.flask_server as flask_server
+
+    flask_server.server_config = config
+    flask_server.tls_repository = tlsrepo
+    app = flask_server.__build_app__(config, tlsrepo)
+
+    ssl_context = None
+    if not config.lfdi_client:
+        ssl_context = flask_server.__build_ssl_context__(tlsrepo, config)
+
+    try:
+        host, port = config.server_hostname.split(":")
+    except ValueError:
+        # host and port not available
+        host = config.server_hostname
+        port = 8443
+
+    handler = flask_server.PeerCertWSGIRequestHandler
+    handler.configure(config, tlsrepo)
+
+    server = AsyncWSGIServer(app,
+                             host,
+                             int(port),
+                             ssl_context=ssl_context,
+                             identity=handler.peer_environ,
+                             workers=config.server_workers,
+                             keepalive_timeout=config.async_keepalive_timeout)
+
+    async def _serve():
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopped.set)
+        await server.start()
+        _log.info(f"Serving on {host}:{server.port} using asyncio")
+        await stopped.wait()
+        _log.info("Shutting down server")
+        await server.stop()
+        if ssl_context is not None:
+            _log.info(f"TLS handshakes: {server.handshake_stats.snapshot()}")
+
+    asyncio.run(_serve())
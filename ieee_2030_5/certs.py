@@ -1,16 +1,22 @@
 import argparse
 import hashlib
+import json
 import logging
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import shutil
 import yaml
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
 
-__all__ = ['TLSRepository']
+__all__ = ['TLSRepository', 'ProvisioningReport']
 
 from ieee_2030_5.types_ import Lfdi, PathStr
 from ieee_2030_5.utils.tls_wrapper import OpensslWrapper, TLSWrap
@@ -27,6 +33,55 @@ CERTIFICATE_EXTENSION = os.environ.get('2030_5_PUBLIC_EXTENSION', CERTIFICATE_EX
 GLOB_PRIVATE = f'*.{PRIVATE_EXTENTION}'
 GLOB_CERT = f'*.{CERTIFICATE_EXTENSION}'
 
+def _serial_hex(serial: int) -> str:
+    value = f"{serial:X}"
+    return value if len(value) % 2 == 0 else f"0{value}"
+
+
+def _replace_file(path: Path, content: str):
+    """Write content to path so readers see either the old or the new content."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(content)
+    os.replace(tmp, path)
+
+
+def _cert_identity(common_name: str, cert: x509.Certificate) -> Dict:
+    """The identity of a certificate as stored in its manifest."""
+    fingerprint = cert.fingerprint(hashes.SHA256()).hex().upper()
+    lfdi = lfdi_from_fingerprint(fingerprint)
+    not_after = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+    return dict(common_name=common_name,
+                fingerprint=fingerprint,
+                lfdi=lfdi,
+                sfdi=sfdi_from_lfdi(lfdi),
+                not_after=not_after.isoformat())
+
+
+def _write_manifest(manifest_file: Path, cert_file: Path, identity: Dict):
+    """
+    Store the identity of the certificate in manifest_file.
+
+    The size and modification time of the certificate are stored with it so a manifest that
+    no longer matches its certificate (e.g. the certificate was replaced) isn't used.
+    """
+    stat = cert_file.stat()
+    manifest = dict(identity, cert_size=stat.st_size, cert_mtime_ns=stat.st_mtime_ns)
+    _replace_file(manifest_file, json.dumps(manifest))
+
+
+def _read_manifest(manifest_file: Path, cert_file: Path) -> Optional[Dict]:
+    """The identity stored in manifest_file or None if it's missing or out of date."""
+    try:
+        manifest = json.loads(manifest_file.read_text())
+        stat = cert_file.stat()
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("cert_size") != stat.st_size or \
+            manifest.get("cert_mtime_ns") != stat.st_mtime_ns:
+        return None
+    return manifest
+
+
 def lfdi_from_fingerprint(fingerprint: str) -> Lfdi:
     fp = fingerprint.replace(":", "")
     return Lfdi(fp[:40])
@@ -42,6 +97,59 @@ def sfdi_from_lfdi(lfdi: Lfdi) -> int:
     return int(hex_str + str(check_bit))
 
 
+@dataclass
+class ProvisioningReport:
+    """The outcome of TLSRepository.create_certs."""
+    created: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    workers: int = 1
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return len(self.created) / self.seconds if self.seconds else 0.0
+
+
+# The ca used by the provisioning workers, loaded once per worker process.
+_provision_ca: Optional[Tuple[object, x509.Certificate]] = None
+
+
+def _init_provision_worker(ca_key_pem: bytes, ca_cert_pem: bytes):
+    global _provision_ca
+    _provision_ca = (serialization.load_pem_private_key(ca_key_pem, None),
+                     x509.load_pem_x509_certificate(ca_cert_pem))
+
+
+def _provision_device(job: Tuple[str, int, str, str, str, str, int]) -> Tuple[str, int, str, str]:
+    """
+    Create the key, certificate, combined file and manifest of a device.
+
+    Returns the common name, serial, expiration (as written to index.txt) and fingerprint.
+    """
+    common_name, serial, key_file, cert_file, combined_file, manifest_file, days = job
+    ca_key, ca_cert = _provision_ca
+    key_pem, cert = CryptographyWrapper.tls_create_signed_credentials(common_name, ca_key, ca_cert,
+                                                                      serial, days)
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+    Path(key_file).write_bytes(key_pem)
+    Path(cert_file).write_bytes(cert_pem)
+    Path(combined_file).write_bytes(key_pem + b"\n" + cert_pem + b"\n")
+    identity = _cert_identity(common_name, cert)
+    _write_manifest(Path(manifest_file), Path(cert_file), identity)
+    not_after = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+    expires = not_after.strftime("%y%m%d%H%M%SZ")
+    return common_name, serial, expires, identity["fingerprint"]
+
+
+def _try_provision_device(job) -> Tuple[str, object]:
+    """Provision the device of job returning the common name with the result or the error."""
+    try:
+        return job[0], _provision_device(job)
+    except Exception as ex:
+        return job[0], f"{ex.__class__.__name__}: {ex}"
+
+
 class TLSRepository:
 
     def __init__(self,
@@ -61,6 +169,11 @@ class TLSRepository:
         self._certs_dir = repo_dir.joinpath("certs")
         self._private_dir = repo_dir.joinpath("private")
         self._combined_dir = repo_dir.joinpath("combined")
+        # The fingerprint, lfdi, sfdi and expiration of each certificate, written when the
+        # certificate is created so they don't have to be computed from it again.
+        self._manifest_dir = repo_dir.joinpath("manifest")
+        # The whole index in one file so a restart doesn't have to list the directories.
+        self._index_manifest_file = repo_dir.joinpath("manifest.json")
         self._openssl_cnf_file = self._repo_dir.joinpath(openssl_cnffile_template.name)
         self._common_names = {serverhost: serverhost}
         if proxyhost:
@@ -75,6 +188,7 @@ class TLSRepository:
             self._certs_dir.mkdir(parents=True)
             self._private_dir.mkdir(parents=True)
             self._combined_dir.mkdir(parents=True)
+        self._manifest_dir.mkdir(parents=True, exist_ok=True)
 
         index_txt = self._repo_dir.joinpath("index.txt")
         serial = self._repo_dir.joinpath("serial")
@@ -86,12 +200,29 @@ class TLSRepository:
 
         self._current_pk: Dict[str, Path] = {}
         self._current_certs: Dict[str, Path] = {}
-        # lfdi -> sfdi and sfdi -> lfdi for devices.
-        self._devices: Dict[str, str] = {}
-        
+
+        # Index of the certificates in the certs directory.  common_name -> (fingerprint,
+        # lfdi, sfdi) and the reverse lfdi -> common_name, sfdi -> common_name so looking up
+        # a device doesn't read and hash every certificate.
+        self._index_lock = threading.RLock()
+        self._index: Dict[str, Tuple[str, Lfdi, int]] = {}
+        self._by_lfdi: Dict[Lfdi, str] = {}
+        self._by_sfdi: Dict[int, str] = {}
+        # Incremented whenever a certificate leaves the index (removed, replaced or the index
+        # is rebuilt) so identities cached from certificates can be dropped.
+        self.index_version = 0
+        # Changes made outside of create_cert are picked up when the modification time of
+        # the certs directory changes.
+        self._indexed_dir_mtime: Optional[int] = None
+        self._indexed_from_combined = bool(os.environ.get('IEEE_2030_5_CERT_FROM_COMBINED_FILE'))
+        # Checks the index loaded by a warm start against the certificates.
+        self._verifier: Optional[threading.Thread] = None
+
         new_contents = openssl_cnffile_template.read_text().replace(
             "dir = REPLACE_WITH_REPO_PATH", f"dir = {repo_dir}")
-        self._openssl_cnf_file.write_text(new_contents)
+        if not self._openssl_cnf_file.exists() or \
+                self._openssl_cnf_file.read_text() != new_contents:
+            self._openssl_cnf_file.write_text(new_contents)
         self._ca_key = self._private_dir / f"ca.{PRIVATE_EXTENTION}"
         self._ca_cert = self._certs_dir / f"ca.{CERTIFICATE_EXTENSION}"
         self._serverhost = serverhost
@@ -100,7 +231,9 @@ class TLSRepository:
         self._tls: TLSWrap = OpensslWrapper(self._openssl_cnf_file)
         # self._cert_paths: List[Path] = []
         # self._certificate_specs: Dict[str, Dict[str, str]] = {}
-        if not clear:
+        warm_start = kwargs.pop('warm_start', False)
+        warm = not clear and warm_start and self._load_index_manifest()
+        if not clear and not warm:
             
             # creating certs has something screwy so we are going
             # to create the cert_paths based upon the private key
@@ -149,9 +282,12 @@ class TLSRepository:
                 
         
 
-        for crt in self._current_certs:
-            if crt not in (serverhost, proxyhost, "ca", "admin"):
-                self._devices[crt] = (self.lfdi(crt), self.sfdi(crt))
+        self.refresh_index()
+        if warm:
+            self._verifier = threading.Thread(target=self.verify_index,
+                                              name="tls-index-verifier",
+                                              daemon=True)
+            self._verifier.start()
 
         assert len(self._current_pk) == len(self._current_certs)
         
@@ -167,7 +303,8 @@ class TLSRepository:
         self._current_pk["ca"] = self.ca_key_file
 
     def has_device(self, common_name: str) -> bool:
-        return common_name in self._devices
+        return common_name in self._current_certs and \
+            common_name not in (self._serverhost, self._proxyhost, "ca", "admin")
         
     def create_cert(self, common_name: str, as_server: bool = False):
 
@@ -183,6 +320,8 @@ class TLSRepository:
         self._tls.tls_create_pkcs23_pem_and_cert(self.__get_key_file__(common_name),
                                                  self.__get_cert_file__(common_name),
                                                  self.__get_combined_file__(common_name))
+        with self._index_lock:
+            self._index_cert(common_name, self._create_manifest(common_name)["fingerprint"])
 
         # self._common_names[common_name] = common_name
         # self._cert_paths.append(self.__get_cert_file__(common_name=common_name))
@@ -191,6 +330,99 @@ class TLSRepository:
         #                                             path=self.__get_cert_file__(common_name).as_posix())
         
 
+    def create_certs(self,
+                     common_names: Iterable[str],
+                     workers: Optional[int] = None,
+                     days: int = 365) -> ProvisioningReport:
+        """
+        Create the certificates of many devices at once.
+
+        Keys are generated and certificates signed in process (rather than by running openssl
+        a number of times per device) spread over a pool of workers processes.  The serial
+        numbers are reserved from the serial file up front and the certificates are recorded
+        in index.txt once they are all created, both files are replaced atomically.  Devices
+        that already have a certificate are skipped.
+
+        :param workers: The number of processes to use, defaults to the number of cpus.
+        :param days: How long the certificates are valid for.
+        """
+        start = time.perf_counter()
+        report = ProvisioningReport(workers=max(1, workers or os.cpu_count() or 1))
+        pending = []
+        for common_name in dict.fromkeys(common_names):
+            if self.__get_cert_file__(common_name).exists():
+                report.skipped.append(common_name)
+            else:
+                pending.append(common_name)
+
+        if pending:
+            first_serial = self._reserve_serials(len(pending))
+            jobs = [(common_name, first_serial + i, str(self.__get_key_file__(common_name)),
+                     str(self.__get_cert_file__(common_name)),
+                     str(self.__get_combined_file__(common_name)),
+                     str(self.__get_manifest_file__(common_name)), days)
+                    for i, common_name in enumerate(pending)]
+            initargs = (self._ca_key.read_bytes(), self._ca_cert.read_bytes())
+            report.workers = min(report.workers, len(jobs))
+
+            created = []
+            if report.workers == 1:
+                _init_provision_worker(*initargs)
+                self._collect_provisioned(map(_try_provision_device, jobs), created, report)
+            else:
+                with ProcessPoolExecutor(report.workers,
+                                         initializer=_init_provision_worker,
+                                         initargs=initargs) as executor:
+                    chunksize = max(1, len(jobs) // (report.workers * 4))
+                    self._collect_provisioned(
+                        executor.map(_try_provision_device, jobs, chunksize=chunksize), created,
+                        report)
+
+            self._record_issued(sorted(created, key=lambda item: item[1]))
+            with self._index_lock:
+                for common_name, _, _, fingerprint in created:
+                    self._current_pk[common_name] = self.__get_key_file__(common_name)
+                    self._current_certs[common_name] = self.__get_cert_file__(common_name)
+                    self._index_cert(common_name, fingerprint)
+            self.refresh_index()
+
+        report.seconds = time.perf_counter() - start
+        _log.info(f"Created {len(report.created)} certificates in {report.seconds:.2f}s "
+                  f"({report.per_second:.1f}/s) using {report.workers} workers, "
+                  f"{len(report.skipped)} skipped, {len(report.failed)} failed")
+        return report
+
+    @staticmethod
+    def _collect_provisioned(results: Iterable[Tuple[str, object]], created: List,
+                             report: ProvisioningReport):
+        for common_name, result in results:
+            if isinstance(result, str):
+                _log.error(f"Creating the certificate of {common_name} failed: {result}")
+                report.failed[common_name] = result
+            else:
+                created.append(result)
+                report.created.append(common_name)
+
+    def _reserve_serials(self, count: int) -> int:
+        """Reserve count serial numbers from the serial file returning the first of them."""
+        serial_file = self._repo_dir.joinpath("serial")
+        with self._index_lock:
+            first = int(serial_file.read_text().strip() or "1", 16)
+            _replace_file(serial_file, f"{_serial_hex(first + count)}\n")
+        return first
+
+    def _record_issued(self, issued: List[Tuple[str, int, str, str]]):
+        """Add the certificates to index.txt the way openssl ca does."""
+        if not issued:
+            return
+        index_txt = self._repo_dir.joinpath("index.txt")
+        lines = [
+            f"V\t{expires}\t\t{_serial_hex(serial)}\tunknown\t/C=US/CN={cn.split(':')[0]}\n"
+            for cn, serial, expires, _ in issued
+        ]
+        with self._index_lock:
+            _replace_file(index_txt, index_txt.read_text() + "".join(lines))
+
     def lfdi(self, device_id: str) -> Lfdi:
         """
         Using the fingerprint of the certifcate return the left truncation of 160 bits with no check digit.
@@ -202,14 +434,17 @@ class TLSRepository:
             as an integer.
         """
         # 160 / 4 == 40
-        fp = self.fingerprint(device_id, True)
-        return Lfdi(lfdi_from_fingerprint(fp))
+        return self._index_entry(device_id)[1]
 
     def sfdi(self, device_id: str) -> int:
-        lfdi_ = self.lfdi(device_id)
-        return sfdi_from_lfdi(lfdi_)
+        return self._index_entry(device_id)[2]
 
     def fingerprint(self, device_id: str, without_colan: bool = True) -> str:
+        if without_colan:
+            return self._index_entry(device_id)[0]
+        return self._read_fingerprint(device_id, without_colan)
+
+    def _read_fingerprint(self, device_id: str, without_colan: bool = True) -> str:
         if os.environ.get('IEEE_2030_5_CERT_FROM_COMBINED_FILE'):
             # _log.debug("Using hash from combined file.")
             value = Path(self.__get_combined_file__(device_id)).read_text()
@@ -223,6 +458,202 @@ class TLSRepository:
         assert isinstance(value, str)
         return value
 
+    def _create_manifest(self, common_name: str) -> Dict:
+        """Compute the identity of the certificate of common_name and store it in its manifest."""
+        cert_file = self.__get_cert_file__(common_name)
+        cert = x509.load_pem_x509_certificate(cert_file.read_bytes())
+        identity = _cert_identity(common_name, cert)
+        _write_manifest(self.__get_manifest_file__(common_name), cert_file, identity)
+        return identity
+
+    def manifest(self, common_name: str) -> Dict:
+        """
+        The identity of the certificate of common_name: common_name, fingerprint, lfdi, sfdi
+        and not_after.
+
+        It's read from the manifest written when the certificate was created, certificates
+        without an up to date manifest have one created.
+        """
+        manifest = _read_manifest(self.__get_manifest_file__(common_name),
+                                  self.__get_cert_file__(common_name))
+        if manifest is None:
+            manifest = self._create_manifest(common_name)
+        return manifest
+
+    def _index_entry(self, common_name: str) -> Tuple[str, Lfdi, int]:
+        with self._index_lock:
+            self._check_index_mode()
+            entry = self._index.get(common_name)
+            if entry is None:
+                entry = self._index_cert(common_name)
+            return entry
+
+    def _check_index_mode(self):
+        from_combined = bool(os.environ.get('IEEE_2030_5_CERT_FROM_COMBINED_FILE'))
+        if from_combined != self._indexed_from_combined:
+            self._indexed_from_combined = from_combined
+            self.index_version += 1
+            self._index.clear()
+            self._by_lfdi.clear()
+            self._by_sfdi.clear()
+            self._indexed_dir_mtime = None
+
+    def _index_cert(self,
+                    common_name: str,
+                    fingerprint: Optional[str] = None) -> Tuple[str, Lfdi, int]:
+        self._unindex_cert(common_name)
+        if self._indexed_from_combined:
+            fp = self._read_fingerprint(common_name, True)
+        elif fingerprint is None:
+            fp = self.manifest(common_name)["fingerprint"]
+        else:
+            fp = fingerprint
+        lfdi_ = Lfdi(lfdi_from_fingerprint(fp))
+        entry = (fp, lfdi_, sfdi_from_lfdi(lfdi_))
+        self._index[common_name] = entry
+        self._by_lfdi[entry[1]] = common_name
+        self._by_sfdi[entry[2]] = common_name
+        return entry
+
+    def _unindex_cert(self, common_name: str):
+        entry = self._index.pop(common_name, None)
+        if entry is not None:
+            self.index_version += 1
+            if self._by_lfdi.get(entry[1]) == common_name:
+                del self._by_lfdi[entry[1]]
+            if self._by_sfdi.get(entry[2]) == common_name:
+                del self._by_sfdi[entry[2]]
+
+    def refresh_index(self, force: bool = False):
+        """
+        Bring the certificate index up to date with the certs directory.
+
+        Only certificates that were added or removed are (re)indexed, unless force is True
+        in which case every certificate is read again (e.g. after certificates were replaced
+        in place).
+        """
+        with self._index_lock:
+            self._check_index_mode()
+            mtime = self._certs_dir.stat().st_mtime_ns
+            if not force and mtime == self._indexed_dir_mtime:
+                return
+            if force:
+                self.index_version += 1
+                self._index.clear()
+                self._by_lfdi.clear()
+                self._by_sfdi.clear()
+            on_disk = {Path(f).stem for f in self._certs_dir.glob(GLOB_CERT)}
+            for common_name in set(self._index) - on_disk:
+                self._unindex_cert(common_name)
+                self.__get_manifest_file__(common_name).unlink(missing_ok=True)
+                self._current_certs.pop(common_name, None)
+                if not self.__get_key_file__(common_name).exists():
+                    self._current_pk.pop(common_name, None)
+            for common_name in on_disk - set(self._index):
+                try:
+                    self._index_cert(common_name)
+                except FileNotFoundError:
+                    continue
+                self._current_certs[common_name] = self.__get_cert_file__(common_name)
+            private_mtime = self._private_dir.stat().st_mtime_ns
+            for f in self._private_dir.glob(GLOB_PRIVATE):
+                self._current_pk.setdefault(Path(f).stem, Path(f))
+            self._indexed_dir_mtime = mtime
+            self._save_index_manifest(private_mtime)
+
+    def _save_index_manifest(self, private_mtime: int):
+        """Write the index to the index manifest along with the state of the directories."""
+        manifest = {
+            "version": 1,
+            "from_combined": self._indexed_from_combined,
+            "certs_mtime_ns": self._indexed_dir_mtime,
+            "private_mtime_ns": private_mtime,
+            "keys": sorted(self._current_pk),
+            "certs": {cn: [entry[0], entry[2]] for cn, entry in self._index.items()}
+        }
+        _replace_file(self._index_manifest_file, json.dumps(manifest, separators=(",", ":")))
+
+    def _load_index_manifest(self) -> bool:
+        """
+        Load the index and the known keys and certificates from the index manifest.
+
+        The manifest is only used if neither the certs nor the private directory changed
+        since it was written, returns whether it was loaded.
+        """
+        try:
+            manifest = json.loads(self._index_manifest_file.read_text())
+            certs_mtime = self._certs_dir.stat().st_mtime_ns
+            private_mtime = self._private_dir.stat().st_mtime_ns
+        except (FileNotFoundError, ValueError):
+            return False
+        if manifest.get("version") != 1 or \
+                manifest.get("from_combined") != self._indexed_from_combined or \
+                manifest.get("certs_mtime_ns") != certs_mtime or \
+                manifest.get("private_mtime_ns") != private_mtime:
+            _log.debug(f"Not using out of date {self._index_manifest_file}")
+            return False
+
+        with self._index_lock:
+            for common_name in manifest["keys"]:
+                self._current_pk[common_name] = self.__get_key_file__(common_name)
+            for common_name, (fingerprint, sfdi) in manifest["certs"].items():
+                self._current_certs[common_name] = self.__get_cert_file__(common_name)
+                entry = (fingerprint, lfdi_from_fingerprint(fingerprint), sfdi)
+                self._index[common_name] = entry
+                self._by_lfdi[entry[1]] = common_name
+                self._by_sfdi[entry[2]] = common_name
+            self._indexed_dir_mtime = certs_mtime
+        return True
+
+    def verify_index(self) -> List[str]:
+        """
+        Check the index against the certificates on disk, reindexing the ones that changed.
+
+        Only one certificate is checked at a time while holding the index lock so lookups
+        aren't held up.  Returns the common names of the certificates that didn't match.
+        """
+        drifted = []
+        on_disk = {Path(f).stem for f in self._certs_dir.glob(GLOB_CERT)}
+        for common_name in sorted(on_disk):
+            try:
+                if self._indexed_from_combined:
+                    fingerprint = self._read_fingerprint(common_name, True)
+                else:
+                    fingerprint = self.manifest(common_name)["fingerprint"]
+            except FileNotFoundError:
+                continue
+            with self._index_lock:
+                entry = self._index.get(common_name)
+                if entry is None or entry[0] != fingerprint:
+                    drifted.append(common_name)
+                    self._index_cert(common_name, fingerprint)
+                    self._current_certs[common_name] = self.__get_cert_file__(common_name)
+
+        with self._index_lock:
+            for common_name in set(self._index) - on_disk:
+                if not self.__get_cert_file__(common_name).exists():
+                    drifted.append(common_name)
+                    self._unindex_cert(common_name)
+                    self._current_certs.pop(common_name, None)
+            if drifted:
+                _log.warning(f"Certificate index was out of date for {len(drifted)} "
+                             f"certificates: {', '.join(drifted[:10])}")
+                # Rescan the directories, which also writes the corrected index manifest.
+                self._indexed_dir_mtime = None
+                self.refresh_index()
+        return drifted
+
+    def find_device_id_from_lfdi(self, lfdi: Lfdi) -> Optional[str]:
+        """Return the device id (common name) of the certificate with the passed lfdi."""
+        if isinstance(lfdi, bytes):
+            lfdi = lfdi.decode('ascii')
+        with self._index_lock:
+            device_id = self._by_lfdi.get(lfdi)
+            if device_id is None:
+                self.refresh_index()
+                device_id = self._by_lfdi.get(lfdi)
+        return device_id
+
     def get_common_name(self, device_id: str) -> x509:
         pem_data = Path(self.__get_cert_file__(device_id)).read_bytes()
         cert = x509.load_pem_x509_certificate(pem_data, default_backend())
@@ -235,19 +666,19 @@ class TLSRepository:
 
     @property
     def client_list(self) -> Dict[str, Dict[str, str]]:
-        # TODO: Use precalculated specs rather than this each time.
         specs: Dict[str, Dict[str, str]] = {}
-        for d in self._private_dir.glob(GLOB_PRIVATE):
+        self.refresh_index()
+        for common_name in self._current_pk:
             
-            paths = self.get_file_pair(d.stem)
+            paths = self.get_file_pair(common_name)
             
-            specs[d.stem] = {'common_name': d.stem,
-                             'path': ','.join(paths),
-                             'device': False}
+            specs[common_name] = {'common_name': common_name,
+                                  'path': ','.join(paths),
+                                  'device': False}
             
-            if ':' not in d.stem or 'admin' != d.stem:
-                specs[d.stem]['lFID'] = self.lfdi(d.stem)
-                specs[d.stem]['device'] = True
+            if ':' not in common_name or 'admin' != common_name:
+                specs[common_name]['lFID'] = self.lfdi(common_name)
+                specs[common_name]['device'] = True
                          
         return specs
 
@@ -281,22 +712,20 @@ class TLSRepository:
 
     def find_device_id_from_sfdi(self, sfdi: int) -> Optional[str]:
         """
-        Searches the certificate paths for a device id that maps to the sfdi passed into the method.
+        Returns the device id (common name) of the certificate that maps to the sfdi passed into
+        the method.
         Args:
             sfdi:
 
         Returns:
 
         """
-        device_id = None
         _log.debug(f"Attempting to find sfid: {sfdi}")
-        for d in self._certs_dir.glob(GLOB_CERT):
-            try:
-                if sfdi == self.sfdi(d.stem):
-                    device_id = d.stem
-                    break
-            except FileNotFoundError:
-                pass
+        with self._index_lock:
+            device_id = self._by_sfdi.get(sfdi)
+            if device_id is None:
+                self.refresh_index()
+                device_id = self._by_sfdi.get(sfdi)
         return device_id
 
     def __get_cert_file__(self, common_name: str) -> Path:
@@ -308,6 +737,9 @@ class TLSRepository:
     def __get_combined_file__(self, common_name: str) -> Path:
         return self._combined_dir.joinpath(f"{common_name}-combined.{PRIVATE_EXTENTION}")
 
+    def __get_manifest_file__(self, common_name: str) -> Path:
+        return self._manifest_dir.joinpath(f"{common_name}.json")
+
 
 def _main():
     parser = argparse.ArgumentParser()
@@ -1,12 +1,9 @@
 from __future__ import annotations
 
 import atexit
-import http
 import logging
 import ssl
 import threading
-import xml.dom.minidom
-from http.client import HTTPSConnection
 from os import PathLike
 from pathlib import Path
 from threading import Timer
@@ -18,6 +15,8 @@ import xsdata
 import ieee_2030_5.models as m
 import ieee_2030_5.utils as utils
 import ieee_2030_5.utils.tls_wrapper as tls
+from ieee_2030_5.client.transport import Transport, TransportResponse
+from ieee_2030_5.utils.tls_sessions import ClientSessionCache, HandshakeStats, tune_ssl_context
 
 _log = logging.getLogger(__name__)
 _log_req_resp = logging.getLogger(__name__ + ".request")
@@ -33,7 +32,11 @@ class IEEE2030_5_Client:
                  keyfile: PathLike,
                  certfile: PathLike,
                  server_ssl_port: Optional[int] = 443,
-                 debug: bool = True):
+                 debug: bool = True,
+                 session_cache: Optional[ClientSessionCache] = None,
+                 pool_size: int = 4,
+                 retries: int = 2,
+                 timeout: Optional[float] = 30.0):
 
         cafile = cafile if isinstance(cafile, PathLike) else Path(cafile)
         keyfile = keyfile if isinstance(keyfile, PathLike) else Path(keyfile)
@@ -55,10 +58,22 @@ class IEEE2030_5_Client:
         # Loads client information from the passed cert and key files. For
         # client side validation.
         self._ssl_context.load_cert_chain(certfile=certfile, keyfile=keyfile)
-
-        self._http_conn = HTTPSConnection(host=server_hostname,
-                                          port=server_ssl_port,
-                                          context=self._ssl_context)
+        # Same curve as the server so there's no extra round trip to agree on one, the cipher
+        # list is left to the server.
+        tune_ssl_context(self._ssl_context, ciphers=None)
+
+        # Sessions are resumed when reconnecting, they are tied to the client's certificate.
+        self.session_cache = session_cache if session_cache is not None else ClientSessionCache()
+        self.handshake_stats = HandshakeStats()
+        self._transport = Transport(server_hostname,
+                                    server_ssl_port,
+                                    context=self._ssl_context,
+                                    sessions=self.session_cache,
+                                    session_key=(server_hostname, server_ssl_port, str(certfile)),
+                                    stats=self.handshake_stats,
+                                    pool_size=pool_size,
+                                    retries=retries,
+                                    timeout=timeout)
         self._device_cap: Optional[m.DeviceCapability] = None
         self._mup: Optional[m.MirrorUsagePointList] = None
         self._upt: Optional[m.UsagePointList] = None
@@ -74,10 +89,13 @@ class IEEE2030_5_Client:
         IEEE2030_5_Client.clients.add(self)
 
     @property
-    def http_conn(self) -> HTTPSConnection:
-        if self._http_conn.sock is None:
-            self._http_conn.connect()
-        return self._http_conn
+    def transport(self) -> Transport:
+        return self._transport
+
+    @property
+    def _trace(self) -> bool:
+        """Whether requests and responses are logged, formatting them is left out otherwise."""
+        return self._debug and _log_req_resp.isEnabledFor(logging.DEBUG)
 
     def register_end_device(self) -> str:
         lfid = utils.get_lfdi_from_cert(self._cert)
@@ -205,7 +223,6 @@ class IEEE2030_5_Client:
             return self.__get_request__(endpoint, body, headers=headers)
 
         if method.upper() == 'POST':
-            print("Doing post")
             return self.__post__(endpoint, body, headers=headers)
 
     def create_mirror_usage_point(self, mirror_usage_point: m.MirrorUsagePoint) -> Tuple[int, str]:
@@ -222,84 +239,54 @@ class IEEE2030_5_Client:
     def post(self, url: str, data: Any, headers: Optional[Dict[str, str]] = None):
         response = self.__post__(url, data, headers=headers)
 
-    def __post__(self, url: str, data=None, headers: Optional[Dict[str, str]] = None):
+    def __post__(self,
+                 url: str,
+                 data=None,
+                 headers: Optional[Dict[str, str]] = None) -> TransportResponse:
         if not headers:
             headers = {'Content-Type': 'text/xml'}
 
-        self.http_conn.request(method="POST", headers=headers, url=url, body=data)
-        response = self._http_conn.getresponse()
-        # response_data = response.read().decode("utf-8")
+        if self._trace:
+            _log_req_resp.debug(f"----> POST REQUEST\nurl: {url}\nbody: {data}")
+
+        response = self._transport.request("POST", url, body=data, headers=headers)
+        if response.data and self._trace:
+            _log_req_resp.debug(f"<---- POST RESPONSE\n{response.data.decode('utf-8')}")
 
         return response
 
     def __get_request__(self, url: str, body=None, headers: dict = None):
-        if headers is None:
-            headers = {"Connection": "keep-alive", "keep-alive": "timeout=30, max=1000"}
-
-        if self._debug:
-            print(f"----> GET REQUEST")
-            print(f"url: {url} body: {body}")
-        self.http_conn.request(method="GET", url=url, body=body, headers=headers)
-        response = self._http_conn.getresponse()
-        response_data = response.read().decode("utf-8")
-        print(response.headers)
-
-        response_obj = None
-        try:
-            response_obj = utils.xml_to_dataclass(response_data)
-            resp_xml = xml.dom.minidom.parseString(response_data)
-            if resp_xml and self._debug:
-                print(f"<---- GET RESPONSE")
-                print(f"{response_data}")    # toprettyxml()}")
+        if self._trace:
+            _log_req_resp.debug(f"----> GET REQUEST\nurl: {url} body: {body}")
 
-        except xsdata.exceptions.ParserError as ex:
-            if self._debug:
-                print(f"<---- GET RESPONSE")
-                print(f"{response_data}")
-            response_obj = response_data
+        response = self._transport.request("GET", url, body=body, headers=headers)
+        response_data = response.data.decode("utf-8")
+        if self._trace:
+            _log_req_resp.debug(f"<---- GET RESPONSE\n{response.headers}{response_data}")
 
-        return response_obj
+        try:
+            return utils.xml_to_dataclass(response_data)
+        except xsdata.exceptions.ParserError:
+            return response_data
 
     def __close__(self):
-        self._http_conn.close()
+        self._transport.close()
         self._ssl_context = None
-        self._http_conn = None
 
     def put(self, url: str, data: Any, headers: Optional[Dict[str, str]] = None):
         response = self.__put__(url, data, headers=headers)
 
-    def __put__(self, url: str, data: Any, headers: Optional[Dict[str, str]] = None):
+    def __put__(self,
+                url: str,
+                data: Any,
+                headers: Optional[Dict[str, str]] = None) -> TransportResponse:
         if not headers:
             headers = {'Content-Type': 'text/xml'}
 
-        if self._debug:
+        if self._trace:
             _log_req_resp.debug(f"----> PUT REQUEST\nurl: {url}\nbody: {data}")
 
-        try:
-            self.http_conn.request(method="PUT", headers=headers, url=url, body=data)
-        except http.client.CannotSendRequest as ex:
-            self.http_conn.close()
-            _log.debug("Reconnecting to server")
-            self.http_conn.request(method="PUT", headers=headers, url=url, body=data)
-
-        response = self._http_conn.getresponse()
-        return response
-
-    def __post__(self, url: str, data=None, headers: Optional[Dict[str, str]] = None):
-        if not headers:
-            headers = {'Content-Type': 'text/xml'}
-
-        if self._debug:
-            _log_req_resp.debug(f"----> POST REQUEST\nurl: {url}\nbody: {data}")
-
-        self.http_conn.request(method="POST", headers=headers, url=url, body=data)
-        response = self._http_conn.getresponse()
-        response_data = response.read().decode("utf-8")
-        # response_data = response.read().decode("utf-8")
-        if response_data and self._debug:
-            _log_req_resp.debug(f"<---- POST RESPONSE\n{response_data}")
-
-        return response
+        return self._transport.request("PUT", url, body=data, headers=headers)
 
 
 # noinspection PyTypeChecker
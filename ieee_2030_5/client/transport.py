@@ -0,0 +1,237 @@
+"""
+HTTPS transport of the 2030.5 client.
+
+A Transport keeps a bounded pool of keep-alive connections to one server so a client can be
+used from more than one thread (e.g. a poll timer and the simulation) and long running
+clients don't pay for a new TLS connection on every request.  Responses are read completely
+before their connection goes back to the pool.
+
+Connections the server closed while they were idle (its keep-alive timeout) are the common
+failure of a pooled connection, a request that fails on a reused connection before any of the
+response was received is sent again on a new connection whatever its method.  Otherwise only
+idempotent requests (GET, PUT, DELETE, HEAD) are retried, a POST may already have been
+processed by the server.
+"""
+from __future__ import annotations
+
+import http.client
+import logging
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from http.client import HTTPMessage, HTTPSConnection
+from typing import Any, Dict, List, Optional, Tuple
+
+from ieee_2030_5.utils.tls_sessions import ClientSessionCache, HandshakeStats
+
+_log = logging.getLogger(__name__)
+
+__all__ = ["ResumingHTTPSConnection", "Transport", "TransportResponse", "PoolTimeout"]
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+
+
+class PoolTimeout(Exception):
+    """No connection of the pool became available in time."""
+
+
+class ResumingHTTPSConnection(HTTPSConnection):
+    """
+    HTTPSConnection that resumes the last TLS session it had with the server when it
+    (re)connects.
+
+    :param sessions: Where the sessions are kept between connections.
+    :param session_key: The key of the sessions with this server in sessions.
+    :param stats: Counts the handshakes of the connection.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 context: ssl.SSLContext,
+                 sessions: ClientSessionCache,
+                 session_key: Any,
+                 stats: HandshakeStats,
+                 timeout: Optional[float] = None):
+        super().__init__(host=host, port=port, context=context, timeout=timeout)
+        self._sessions = sessions
+        self._session_key = session_key
+        self._stats = stats
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host if self._tunnel_host else self.host
+        self.sock = self._context.wrap_socket(self.sock,
+                                              server_hostname=server_hostname,
+                                              session=self._sessions.get(self._session_key))
+        self._stats.record(self.sock.session_reused)
+
+    def getresponse(self):
+        # getresponse lets go of the socket when the server closes the connection.
+        sock = self.sock
+        response = super().getresponse()
+        # TLS 1.3 servers send the session ticket after the handshake so the session can only
+        # be kept once something has been read.
+        if sock is not None:
+            self._sessions.put(self._session_key, sock.session)
+        return response
+
+
+@dataclass
+class TransportResponse:
+    """A response read completely from the server."""
+    status: int
+    reason: str
+    headers: HTTPMessage
+    data: bytes
+
+    def read(self) -> bytes:
+        return self.data
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name, default)
+
+
+class _PooledConnection:
+
+    def __init__(self, connection: ResumingHTTPSConnection):
+        self.connection = connection
+        self.requests = 0
+        self.idle_since = time.monotonic()
+
+
+class Transport:
+    """
+    Sends requests to one server over a bounded pool of keep-alive connections.
+
+    :param pool_size: The most connections open to the server at once, requests wait for a
+                      connection once they are all in use.
+    :param retries: How many times a failed request is sent again, see the module docstring.
+    :param timeout: Socket timeout of the connections.
+    :param pool_timeout: Seconds a request waits for a connection, None waits forever.
+    :param max_idle: Connections idle for longer than this are closed rather than reused, it
+                     should be shorter than the keep-alive timeout of the server.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 context: ssl.SSLContext,
+                 sessions: ClientSessionCache,
+                 session_key: Any,
+                 stats: HandshakeStats,
+                 pool_size: int = 4,
+                 retries: int = 2,
+                 timeout: Optional[float] = 30.0,
+                 pool_timeout: Optional[float] = 60.0,
+                 max_idle: float = 4.0):
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.pool_timeout = pool_timeout
+        self.max_idle = max_idle
+        self._context = context
+        self._sessions = sessions
+        self._session_key = session_key
+        self._stats = stats
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(pool_size)
+        # Most recently used last so the connection least likely to have timed out is reused.
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.connections_opened = 0
+
+    def request(self,
+                method: str,
+                url: str,
+                body: Optional[Any] = None,
+                headers: Optional[Dict[str, str]] = None) -> TransportResponse:
+        """Send a request and read its response, retrying as described in the module."""
+        method = method.upper()
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        headers = headers or {}
+        attempt = 0
+        while True:
+            pooled = self._acquire()
+            reused = pooled.requests > 0
+            reusable = False
+            try:
+                response, reusable = self._send(pooled.connection, method, url, body, headers)
+                pooled.requests += 1
+                return response
+            except (http.client.HTTPException, OSError) as ex:
+                retry = attempt < self.retries and self._can_retry(method, reused, ex)
+                _log.debug(f"{method} {url} failed on a {'reused' if reused else 'new'} "
+                           f"connection ({ex!r}){', retrying' if retry else ''}")
+                if not retry:
+                    raise
+                attempt += 1
+            finally:
+                self._release(pooled, reusable)
+
+    @staticmethod
+    def _can_retry(method: str, reused: bool, ex: Exception) -> bool:
+        if method in IDEMPOTENT_METHODS:
+            return True
+        # The server closed the idle connection before seeing the request.
+        return reused and isinstance(
+            ex, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                 http.client.CannotSendRequest))
+
+    @staticmethod
+    def _send(connection: ResumingHTTPSConnection, method: str, url: str, body: Optional[Any],
+              headers: Dict[str, str]) -> Tuple[TransportResponse, bool]:
+        connection.request(method, url, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        # http.client drops the socket of a response that closes the connection.
+        reusable = not response.will_close and connection.sock is not None
+        return TransportResponse(response.status, response.reason, response.headers,
+                                 data), reusable
+
+    def _acquire(self) -> _PooledConnection:
+        if self._closed:
+            raise http.client.CannotSendRequest("Transport is closed")
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeout(f"No connection to {self.host}:{self.port} available after "
+                              f"{self.pool_timeout}s")
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                pooled = self._idle.pop()
+                if now - pooled.idle_since < self.max_idle:
+                    return pooled
+                pooled.connection.close()
+        self.connections_opened += 1
+        return _PooledConnection(
+            ResumingHTTPSConnection(self.host,
+                                    self.port,
+                                    context=self._context,
+                                    sessions=self._sessions,
+                                    session_key=self._session_key,
+                                    stats=self._stats,
+                                    timeout=self._timeout))
+
+    def _release(self, pooled: _PooledConnection, reusable: bool):
+        if reusable and not self._closed:
+            pooled.idle_since = time.monotonic()
+            with self._lock:
+                self._idle.append(pooled)
+        else:
+            pooled.connection.close()
+        self._slots.release()
+
+    @property
+    def idle_connections(self) -> int:
+        return len(self._idle)
+
+    def close(self):
+        """Close the idle connections, connections in use are closed when released."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.connection.close()
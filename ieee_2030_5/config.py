@@ -23,6 +23,7 @@ import ieee_2030_5.models as m
 from ieee_2030_5.certs import TLSRepository
 from ieee_2030_5.server.exceptions import NotFoundError
 from ieee_2030_5.types_ import Lfdi
+from ieee_2030_5.utils.tls_sessions import DEFAULT_CIPHERS, DEFAULT_ECDH_CURVE
 
 _log = logging.getLogger(__name__)
 
@@ -206,11 +207,37 @@ class ServerConfiguration:
 
     cleanse_storage: bool = True
     storage_path: str = None
+    # Storage engine for the adapters, None (in memory only) or "sqlite".
+    storage_backend: str | None = None
+    # Seconds between background writes of changed resources and the number of changed
+    # resources that triggers an early write.
+    storage_flush_interval: float = 1.0
+    storage_flush_max_pending: int = 1000
 
     log_event_list_poll_rate: int = 900
     device_capability_poll_rate: int = 900
     mirror_usage_point_post_rate: int = 300
     end_device_list_poll_rate: int = 86400    # daily check-in
+    # Limits on the readings kept per UsagePoint reading list, None keeps everything.
+    reading_retention_count: int | None = None
+    reading_retention_seconds: int | None = None
+
+    # Used by the --production server, see flask_server.PooledWSGIServer.
+    server_workers: int = 32
+    server_accept_backlog: int = 1024
+    server_keepalive_timeout: float = 5.0
+    # Used by the --asyncio server, None keeps idle connections open until the client closes them.
+    async_keepalive_timeout: float | None = 300.0
+    # Size of the cache of serialized GET responses, 0 disables it.
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    # Largest single response kept in the response cache.
+    response_cache_max_entry_bytes: int = 1024 * 1024
+    # Cipher and curve preferences and session resumption of the server's TLS, see
+    # utils.tls_sessions.tune_ssl_context.  None leaves OpenSSL's defaults.
+    tls_ciphers: str | None = DEFAULT_CIPHERS
+    tls_ecdh_curve: str | None = DEFAULT_ECDH_CURVE
+    tls_session_tickets: bool = True
+    tls_tickets_per_handshake: int = 2
 
     generate_admin_cert: bool = False
     lfdi_client: str | None = None
@@ -322,8 +349,8 @@ class ServerConfiguration:
         #     self.field_bus_def = MessageBusDefinition.load(self.field_bus_def)
 
     def get_device_pin(self, lfdi: Lfdi, tls_repo: TLSRepository) -> int:
+        device_id = tls_repo.find_device_id_from_lfdi(lfdi)
         for d in self.devices:
-            test_lfdi = tls_repo.lfdi(d.id)
-            if test_lfdi == int(lfdi):
+            if d.id == device_id:
                 return d.pin
         raise NotFoundError(f"The device_id: {lfdi} was not found.")
@@ -0,0 +1,154 @@
+"""
+Tracks the active DERControls of each DERProgram.
+
+Within a DERProgram an active control supersedes the active controls it overlaps with that
+have an older creationTime.  Controls overlap when they set at least one of the same modes
+(opModConnect, opModMaxLimW etc.) in their DERControlBase.  Because superseded controls are
+removed from the active set no two active controls of a program share a mode, so finding
+the controls a starting control overlaps with is a dictionary lookup per mode it sets.  For
+the same reason the active set holds at most one control per mode, keeping it ordered with
+insort is linear in the size of that small set rather than in the number of controls.
+
+Across DERPrograms the control from the program with the lowest primacy value is the one in
+effect for a mode, see :func:`effective_controls`.
+"""
+from __future__ import annotations
+
+import itertools
+from bisect import bisect_left, insort
+from dataclasses import fields
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import ieee_2030_5.models as m
+
+# EventStatus.currentStatus values
+ACTIVE = 1
+SUPERSEDED = 4
+
+# DERControlBase fields that modify how a control is applied rather than being a mode.
+_NOT_MODES = {"rampTms"}
+
+
+def control_modes(control: m.DERControl) -> Set[str]:
+    """Return the DERControlBase modes set by control."""
+    base = control.DERControlBase
+    if base is None:
+        return set()
+    return {
+        f.name
+        for f in fields(base) if f.name not in _NOT_MODES and getattr(base, f.name) is not None
+    }
+
+
+def _newer(control: m.DERControl, other: m.DERControl) -> bool:
+    return (control.creationTime or 0) > (other.creationTime or 0)
+
+
+class ActiveControlEngine:
+    """
+    The active controls of one DERProgram.
+
+    :param primacy: The primacy of the program, lower values take precedence over the
+                    controls of other programs.
+    """
+
+    def __init__(self, primacy: int = 0):
+        self.primacy = primacy
+        # Active controls ordered as a DERControlList is, by interval start then most
+        # recently created first.
+        self._ordered: List[Tuple[int, int, int]] = []
+        self._entries: Dict[str, Tuple[int, int, int]] = {}
+        self._controls: Dict[int, m.DERControl] = {}
+        self._modes: Dict[str, Set[str]] = {}
+        # mode -> mRID of the active control setting it
+        self._by_mode: Dict[str, str] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, mrid: str) -> bool:
+        return mrid in self._entries
+
+    @property
+    def active(self) -> List[m.DERControl]:
+        return [self._controls[entry[2]] for entry in self._ordered]
+
+    def control_for_mode(self, mode: str) -> Optional[m.DERControl]:
+        mrid = self._by_mode.get(mode)
+        return self._control(mrid) if mrid is not None else None
+
+    def mode_controls(self) -> Iterator[Tuple[str, m.DERControl]]:
+        """Yield each mode set by an active control along with that control."""
+        for mode, mrid in self._by_mode.items():
+            yield mode, self._control(mrid)
+
+    def _control(self, mrid: str) -> m.DERControl:
+        return self._controls[self._entries[mrid][2]]
+
+    def start(self, control: m.DERControl, time_now: Optional[int] = None) -> List[m.DERControl]:
+        """
+        Add control to the active set superseding the older active controls it overlaps.
+
+        If an active control it overlaps with is newer, control itself is superseded and
+        not added.  Returns the controls that were superseded.
+        """
+        if control.mRID in self._entries:
+            return []
+        modes = control_modes(control)
+        overlapping = {self._by_mode[mode] for mode in modes if mode in self._by_mode}
+        for mrid in overlapping:
+            if not _newer(control, self._control(mrid)):
+                self._set_status(control, SUPERSEDED, time_now)
+                return [control]
+
+        superseded = [self._remove(mrid) for mrid in overlapping]
+        for old in superseded:
+            self._set_status(old, SUPERSEDED, time_now)
+
+        entry = (control.interval.start, -(control.creationTime or 0), next(self._sequence))
+        insort(self._ordered, entry)
+        self._entries[control.mRID] = entry
+        self._controls[entry[2]] = control
+        self._modes[control.mRID] = modes
+        for mode in modes:
+            self._by_mode[mode] = control.mRID
+        return superseded
+
+    def end(self, control: m.DERControl) -> bool:
+        """Remove control from the active set, returns False if it wasn't active."""
+        if control.mRID not in self._entries:
+            return False
+        self._remove(control.mRID)
+        return True
+
+    def _remove(self, mrid: str) -> m.DERControl:
+        entry = self._entries.pop(mrid)
+        del self._ordered[bisect_left(self._ordered, entry)]
+        for mode in self._modes.pop(mrid):
+            if self._by_mode.get(mode) == mrid:
+                del self._by_mode[mode]
+        return self._controls.pop(entry[2])
+
+    @staticmethod
+    def _set_status(control: m.DERControl, status: int, time_now: Optional[int]):
+        if control.EventStatus is None:
+            control.EventStatus = m.EventStatus()
+        control.EventStatus.currentStatus = status
+        if time_now is not None:
+            control.EventStatus.dateTime = time_now
+
+
+def effective_controls(engines: Iterable[ActiveControlEngine]) -> Dict[str, m.DERControl]:
+    """
+    Resolve the control in effect for each mode across the programs of an FSA.  The program
+    with the lowest primacy wins, within the same primacy the most recently created control.
+    """
+    effective: Dict[str, Tuple[int, m.DERControl]] = {}
+    for engine in engines:
+        for mode, control in engine.mode_controls():
+            current = effective.get(mode)
+            if current is None or engine.primacy < current[0] or \
+                    (engine.primacy == current[0] and _newer(control, current[1])):
+                effective[mode] = (engine.primacy, control)
+    return {mode: control for mode, (_, control) in effective.items()}
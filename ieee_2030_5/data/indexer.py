@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import pickle
 from copy import deepcopy
 from dataclasses import dataclass, field
@@ -8,26 +9,42 @@ import logging
 from datetime import datetime
 from email.utils import format_datetime
 from typing import Dict, Optional, List
+from ieee_2030_5.data.prefix_index import PrefixIndex
+from ieee_2030_5.data.response_cache import response_cache
 from ieee_2030_5.models.sep import Link
-from ieee_2030_5.persistance.points import set_point, get_point
+from ieee_2030_5.persistance.points import get_points, import_legacy_points, set_point
 
-__all__: List[str] = ["get_href", "add_href", "get_href_all_names", "get_href_filtered"]
+__all__: List[str] = [
+    "get_href", "add_href", "get_href_all_names", "get_href_filtered", "load_hrefs",
+    "content_hash", "get_href_index"
+]
 
 _log = logging.getLogger(__name__)
 
 
+def content_hash(item: object) -> str:
+    """Hash of the content of item, changes whenever any field of item (recursively) does."""
+    return _pickled_hash(pickle.dumps(item))
+
+
+def _pickled_hash(pickled: bytes) -> str:
+    """content_hash of an item from its pickled bytes."""
+    return hashlib.blake2b(pickled, digest_size=16).hexdigest()
+
+
 @dataclass
 class Index:
     href: str
     item: object
     added: str    # Optional[Union[datetime | str]]
     last_written: str    # Optional[Union[datetime | str]]
-    last_hash: Optional[int]
+    last_hash: Optional[str]
 
 
 @dataclass
 class Indexer:
     __items__: Dict = field(default=None)
+    __hrefs__: PrefixIndex = field(default_factory=PrefixIndex)
 
     def init(self):
         if self.__items__ is None:
@@ -41,39 +58,77 @@ class Indexer:
     def add(self, href: str, item: dataclass):
         self.init()
 
-        # TODO: Verify that this method actually works with a new object.
         # If using a link, we need the true href to cache the object.
         if isinstance(href, Link):
             href = href.href
-        # cached = self.__items__.get(href)
-        # if cached and cached.item == item:
-        #     _log.debug(f"Item already cached {href}")
-        # else:
-        added = format_datetime(datetime.utcnow())
-        serialized_item = pickle.dumps(
-            item)    # serialize_dataclass(item, serialization_type=SerializeType.JSON)
-        obj = Index(href, item, added=added, last_written=added, last_hash=hash(serialized_item))
-        # serialized_obj = serialize_dataclass(obj, serialization_type=SerializeType.JSON)
-
-        # note storing Index object.
-        set_point(href, pickle.dumps(
-            obj))    # serialize_dataclass(obj, serialization_type=SerializeType.JSON))
+
+        # The item is pickled once, for its hash and for the points store.
+        pickled = pickle.dumps(item)
+        item_hash = _pickled_hash(pickled)
+        cached = self.__items__.get(href)
+        if cached is not None and cached.last_hash == item_hash:
+            # Content hasn't changed so there is nothing to write.
+            cached.item = item
+            return
+
+        now = format_datetime(datetime.utcnow())
+        added = cached.added if cached is not None else now
+        obj = Index(href, item, added=added, last_written=now, last_hash=item_hash)
+
+        set_point(href, pickle.dumps((added, now, item_hash, pickled)))
         self.__items__[href] = obj
+        self.__hrefs__.add(href)
+        response_cache.invalidate(href)
 
     def get(self, href) -> dataclass:
         self.init()
         # If using a link, we need the true href to cache the object.
         if isinstance(href, Link):
             href = href.href
-        if href in self.__items__:
-            index = pickle.loads(get_point(href))    # pickle.loads(get_point(href))
-            # index = pickle.loads(self.__items__.get(href))
-            # index = deserialize_dataclass(data, SerializeType.JSON)
-            data = index.item
-        else:
-            data = None
+        index = self.__items__.get(href)
+        return index.item if index is not None else None
 
-        return data
+    def index(self, href) -> Optional[Index]:
+        self.init()
+        if isinstance(href, Link):
+            href = href.href
+        return self.__items__.get(href)
+
+    def load(self) -> int:
+        """Load every href from the points store, used when the server is warm started."""
+        self.init()
+        import_legacy_points()
+        for href, value in get_points():
+            record = pickle.loads(value)
+            if isinstance(record, Index):
+                # Imported from the per href files, the Index was stored as a whole.
+                index = Index(href,
+                              record.item,
+                              added=record.added,
+                              last_written=record.last_written,
+                              last_hash=content_hash(record.item))
+            else:
+                added, last_written, last_hash, serialized_item = record
+                index = Index(href,
+                              pickle.loads(serialized_item),
+                              added=added,
+                              last_written=last_written,
+                              last_hash=last_hash)
+            self.__items__[href] = index
+            self.__hrefs__.add(href)
+        return len(self.__items__)
+
+    def filtered(self, href_prefix: str = "", suffix: Optional[str] = None) -> List[dataclass]:
+        self.init()
+        if suffix is not None:
+            hrefs = [
+                href for href in self.__hrefs__.with_suffix(suffix) if href.startswith(href_prefix)
+            ]
+        else:
+            hrefs = self.__hrefs__.with_prefix(href_prefix)
+        return [
+            self.__items__[href].item for href in hrefs if self.__items__[href].item is not None
+        ]
 
     def get_all(self) -> List:
         return deepcopy([x.item for x in self.__items__.values()])
@@ -86,18 +141,27 @@ def add_href(href: str, item: dataclass):
     __indexer__.add(href, item)
 
 
+def load_hrefs() -> int:
+    return __indexer__.load()
+
+
 def get_href(href: str) -> dataclass:
     return __indexer__.get(href)
 
 
-def get_href_filtered(href_prefix: str) -> List[dataclass] | []:
+def get_href_index(href: str) -> Optional[Index]:
+    """Return the Index (hash and time last written) stored for href."""
+    return __indexer__.index(href)
+
+
+def get_href_filtered(href_prefix: str, suffix: Optional[str] = None) -> List[dataclass] | []:
+    """Return the items with hrefs starting with href_prefix, optionally restricted to the
+    hrefs whose last segment is suffix (e.g. ``ders``).
+    """
     if __indexer__.__items__ is None:
         return []
 
-    return [
-        v.item for k, v in __indexer__.__items__.items()
-        if k.startswith(href_prefix) and v.item is not None
-    ]
+    return __indexer__.filtered(href_prefix, suffix)
 
 
 def get_href_all_names():
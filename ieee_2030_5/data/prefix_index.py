@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List
+
+import ieee_2030_5.hrefs as hrefs
+
+
+class PrefixIndex:
+    """
+    Sorted index over hrefs supporting prefix and sub-resource (last segment) queries.
+
+    Keys are kept in a sorted list so a prefix query is a binary search followed by a walk
+    over the matching keys.  The last segment of each href (e.g. ``ders`` for
+    ``/edev_0_der_0_ders``) is kept in a dictionary for sub-resource type queries.
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self._sorted: List[str] = []
+        self._by_segment: Dict[str, Dict[str, None]] = {}
+        for key in keys:
+            self.add(key)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def __contains__(self, key: str) -> bool:
+        pos = bisect_left(self._sorted, key)
+        return pos < len(self._sorted) and self._sorted[pos] == key
+
+    @staticmethod
+    def _last_segment(key: str) -> str:
+        return key.rsplit(hrefs.SEP, 1)[-1]
+
+    def add(self, key: str):
+        if key in self:
+            return
+        insort(self._sorted, key)
+        self._by_segment.setdefault(self._last_segment(key), {})[key] = None
+
+    def discard(self, key: str):
+        pos = bisect_left(self._sorted, key)
+        if pos < len(self._sorted) and self._sorted[pos] == key:
+            del self._sorted[pos]
+            segment = self._last_segment(key)
+            self._by_segment[segment].pop(key, None)
+            if not self._by_segment[segment]:
+                del self._by_segment[segment]
+
+    def clear(self):
+        self._sorted.clear()
+        self._by_segment.clear()
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        """Return the keys starting with prefix in sorted order."""
+        matches = []
+        pos = bisect_left(self._sorted, prefix)
+        while pos < len(self._sorted) and self._sorted[pos].startswith(prefix):
+            matches.append(self._sorted[pos])
+            pos += 1
+        return matches
+
+    def with_suffix(self, segment: str) -> List[str]:
+        """Return the keys whose last segment is segment (e.g. ``ders``)."""
+        return list(self._by_segment.get(segment, ()))
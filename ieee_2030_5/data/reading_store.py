@@ -0,0 +1,271 @@
+"""
+Columnar storage for Reading resources.
+
+A ReadingSeries keeps the fields of each Reading in contiguous typed arrays rather than as
+individual dataclass instances.  It implements the mapping interface the
+ResourceListAdapter uses for its list containers, so a reading list can be switched over to
+it without changing the adapter.  Readings are only materialized into ``m.Reading`` objects
+when an item is accessed (e.g. when a list is serialized for a GET).
+
+Aggregates are computed over whole columns with NumPy when it is installed, otherwise with a
+loop over the rows.  While the readings are stored in start time order (the usual case for
+mirrored readings) only the rows of the queried time window are read.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ieee_2030_5.hrefs as hrefs
+import ieee_2030_5.models as m
+
+# Marks a missing value in the signed 64 bit columns.
+_MISSING = -2**63
+
+_INT_COLUMNS = ("start", "duration", "value", "touTier", "consumptionBlock", "subscribable")
+
+
+@dataclass
+class ReadingAggregate:
+    """Aggregate of the readings with timePeriod.start in [start, start + interval)."""
+    start: int
+    count: int
+    min: int
+    max: int
+    mean: float
+
+
+def combine_aggregates(aggregates: Iterable[ReadingAggregate]) -> Optional[ReadingAggregate]:
+    """Combine aggregates (e.g. of the same interval of several series) into one, None if
+    there are none.  The start of the combined aggregate is the earliest start.
+    """
+    combined = None
+    for aggregate in aggregates:
+        if combined is None:
+            combined = ReadingAggregate(aggregate.start, aggregate.count, aggregate.min,
+                                        aggregate.max, aggregate.mean)
+            continue
+        count = combined.count + aggregate.count
+        combined.mean = (combined.mean * combined.count + aggregate.mean * aggregate.count) / count
+        combined.count = count
+        combined.start = min(combined.start, aggregate.start)
+        combined.min = min(combined.min, aggregate.min)
+        combined.max = max(combined.max, aggregate.max)
+    return combined
+
+
+class ReadingSeries(MutableMapping):
+    """
+    Mapping of list key to Reading stored column by column.
+
+    Each item read is a new Reading built from the columns, changes made to it are not seen
+    by the series until it is stored again (``series[key] = reading``).
+
+    :param list_uri: The reading list the series backs, used to build the item hrefs.
+    :param uom: The uom of the ReadingType the readings are reported in.
+    :param power_of_ten_multiplier: The powerOfTenMultiplier of the ReadingType.
+    """
+
+    def __init__(self,
+                 list_uri: str,
+                 uom: Optional[int] = None,
+                 power_of_ten_multiplier: Optional[int] = None):
+        self.list_uri = list_uri
+        self.uom = uom
+        self.power_of_ten_multiplier = power_of_ten_multiplier
+        self._columns: Dict[str, array] = {name: array("q") for name in _INT_COLUMNS}
+        # qualityFlags is hexBinary, its byte length is kept so it round trips.
+        self._quality = array("i")
+        self._quality_len = array("B")
+        self._local_ids: List[Optional[object]] = []
+        self._keys = array("q")
+        # key -> row, insertion ordered like the dict containers it replaces.
+        self._rows: Dict[int, int] = {}
+        # Only hrefs that don't follow the list_uri_key scheme are kept.
+        self._hrefs: Dict[int, Optional[str]] = {}
+        # Whether the rows are in start order, so a time window is a contiguous run of rows.
+        self._ordered = True
+
+    def _href(self, key: int) -> str:
+        return hrefs.SEP.join([self.list_uri, str(key)])
+
+    def _write_row(self, row: int, key: int, reading: m.Reading):
+        period = reading.timePeriod
+        values = dict(start=period.start if period is not None else None,
+                      duration=period.duration if period is not None else None,
+                      value=reading.value,
+                      touTier=reading.touTier,
+                      consumptionBlock=reading.consumptionBlock,
+                      subscribable=reading.subscribable)
+        for name, value in values.items():
+            self._columns[name][row] = _MISSING if value is None else int(value)
+        if reading.qualityFlags is None:
+            self._quality[row] = -1
+            self._quality_len[row] = 0
+        else:
+            self._quality[row] = int.from_bytes(reading.qualityFlags, "big")
+            self._quality_len[row] = len(reading.qualityFlags)
+        self._local_ids[row] = reading.localID
+        self._keys[row] = key
+        if reading.href == self._href(key):
+            self._hrefs.pop(key, None)
+        else:
+            self._hrefs[key] = reading.href
+
+    def __setitem__(self, key: int, reading: m.Reading):
+        if not isinstance(reading, m.Reading):
+            raise TypeError(f"Only Reading objects can be stored in a ReadingSeries not {reading}")
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            for column in self._columns.values():
+                column.append(_MISSING)
+            self._quality.append(-1)
+            self._quality_len.append(0)
+            self._local_ids.append(None)
+            self._keys.append(key)
+            self._rows[key] = row
+        self._write_row(row, key, reading)
+        if self._ordered:
+            starts = self._columns["start"]
+            self._ordered = (row == 0 or starts[row - 1] <= starts[row]) and \
+                (row == len(starts) - 1 or starts[row] <= starts[row + 1])
+
+    def __getitem__(self, key: int) -> m.Reading:
+        """A new Reading with the values of key, see the class docstring."""
+        row = self._rows[key]
+        values = {
+            name: None if column[row] == _MISSING else column[row]
+            for name, column in self._columns.items()
+        }
+        time_period = None
+        if values["start"] is not None or values["duration"] is not None:
+            time_period = m.DateTimeInterval(start=values["start"], duration=values["duration"])
+        quality = None
+        if self._quality[row] != -1:
+            quality = self._quality[row].to_bytes(self._quality_len[row], "big")
+        return m.Reading(href=self._hrefs.get(key, self._href(key)),
+                         localID=self._local_ids[row],
+                         subscribable=values["subscribable"],
+                         timePeriod=time_period,
+                         value=values["value"],
+                         touTier=values["touTier"],
+                         consumptionBlock=values["consumptionBlock"],
+                         qualityFlags=quality)
+
+    def __delitem__(self, key: int):
+        # Move the last row into the deleted row so the columns stay contiguous.
+        row = self._rows.pop(key)
+        self._hrefs.pop(key, None)
+        last = len(self._keys) - 1
+        arrays = [*self._columns.values(), self._quality, self._quality_len, self._keys]
+        if row != last:
+            self._ordered = False
+            for column in arrays:
+                column[row] = column[last]
+            self._local_ids[row] = self._local_ids[last]
+            self._rows[self._keys[row]] = row
+        for column in arrays:
+            del column[last]
+        del self._local_ids[last]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def clear(self):
+        for column in (*self._columns.values(), self._quality, self._quality_len, self._keys):
+            del column[:]
+        self._local_ids.clear()
+        self._rows.clear()
+        self._hrefs.clear()
+        self._ordered = True
+
+    def _window(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """The rows that can start in [start, end), all of them unless the rows are ordered."""
+        starts = self._columns["start"]
+        if not self._ordered:
+            return 0, len(starts)
+        # A missing start is the smallest value so those rows come first.
+        return (0 if start is None else bisect_left(starts, start),
+                len(starts) if end is None else bisect_left(starts, end))
+
+    def aggregate(self,
+                  interval: int,
+                  start: Optional[int] = None,
+                  end: Optional[int] = None) -> List[ReadingAggregate]:
+        """
+        Return the min, max and mean value of the readings per interval seconds, ordered by
+        interval start.  Readings without a value or start time are ignored.
+
+        :param start: Ignore readings starting before start.
+        :param end: Ignore readings starting at or after end.
+        """
+        first, last = self._window(start, end)
+        if np is not None:
+            return self._aggregate_columns(interval, start, end, first, last)
+
+        buckets: Dict[int, List] = {}
+        for reading_start, value in zip(self._columns["start"][first:last],
+                                        self._columns["value"][first:last]):
+            if reading_start == _MISSING or value == _MISSING:
+                continue
+            if (start is not None and reading_start < start) or \
+                    (end is not None and reading_start >= end):
+                continue
+            bucket = reading_start - reading_start % interval
+            stats = buckets.get(bucket)
+            if stats is None:
+                buckets[bucket] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] = min(stats[1], value)
+                stats[2] = max(stats[2], value)
+                stats[3] += value
+        return [
+            ReadingAggregate(start=bucket, count=count, min=low, max=high, mean=total / count)
+            for bucket, (count, low, high, total) in sorted(buckets.items())
+        ]
+
+    def _aggregate_columns(self, interval: int, start: Optional[int], end: Optional[int],
+                           first: int, last: int) -> List[ReadingAggregate]:
+        # Copies of the rows of the window, a view would stop the arrays from growing while it
+        # exists.
+        starts = np.array(self._columns["start"][first:last], dtype=np.int64)
+        values = np.array(self._columns["value"][first:last], dtype=np.int64)
+        keep = (starts != _MISSING) & (values != _MISSING)
+        if start is not None:
+            keep &= starts >= start
+        if end is not None:
+            keep &= starts < end
+        starts, values = starts[keep], values[keep]
+        if not len(starts):
+            return []
+
+        buckets = starts - starts % interval
+        order = np.argsort(buckets, kind="stable")
+        buckets, values = buckets[order], values[order]
+        bucket_starts, first, counts = np.unique(buckets, return_index=True, return_counts=True)
+        lows = np.minimum.reduceat(values, first)
+        highs = np.maximum.reduceat(values, first)
+        # Reading values are Int48 so the sums of a bucket of up to 2**15 readings are exact.
+        totals = np.add.reduceat(values, first)
+        return [
+            ReadingAggregate(start=bucket, count=count, min=low, max=high, mean=total / count)
+            for bucket, count, low, high, total in zip(bucket_starts.tolist(), counts.tolist(),
+                                                       lows.tolist(), highs.tolist(),
+                                                       totals.tolist())
+        ]
@@ -0,0 +1,112 @@
+"""
+Cache of serialized XML responses.
+
+Serializing a resource with xsdata walks the whole dataclass tree, which for resources that
+rarely change (DeviceCapability, EndDevice, DERProgram lists, DefaultDERControl) is repeated
+on every poll.  The cache stores the encoded bytes of a response under the href, the query
+parameters (paging) and the content hash of the resource, so a changed resource is never
+served from the cache.  Entries are evicted least recently used first once the cache holds
+more than max_bytes and are dropped when the store reports the href was modified.
+
+Responses that would only churn the cache aren't kept: resources that change on every
+request (VOLATILE_HREFS, e.g. /tm), paged views of lists (any query string) and responses
+larger than max_entry_bytes.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import ieee_2030_5.hrefs as hrefs
+
+_Key = Tuple[str, str, str]
+
+# Resources that are different on every request.
+VOLATILE_HREFS = frozenset((hrefs.DEFAULT_TIME_ROOT, ))
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses keyed by (href, query parameters, content hash).
+
+    :param max_bytes: The total size of the cached responses to keep, 0 disables the cache.
+    :param max_entry_bytes: Responses larger than this aren't cached.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[_Key, bytes] = OrderedDict()
+        self._by_href: Dict[str, Set[_Key]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def cacheable(href: str, params: str) -> bool:
+        """Whether responses for href with the query string params are cached at all."""
+        return not params and href not in VOLATILE_HREFS
+
+    def get(self, href: str, params: str, version: str) -> Optional[bytes]:
+        if not self.cacheable(href, params):
+            return None
+        key = (href, params, version)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, href: str, params: str, version: str, body: bytes):
+        if len(body) > min(self.max_bytes, self.max_entry_bytes) or \
+                not self.cacheable(href, params):
+            return
+        key = (href, params, version)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = body
+            self._by_href.setdefault(href, set()).add(key)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, href: str):
+        """Drop the responses cached for href."""
+        with self._lock:
+            for key in list(self._by_href.get(href, ())):
+                self._discard(key)
+
+    def invalidate_list(self, list_uri: str):
+        """Drop the responses cached for list_uri and the items of the list."""
+        prefix = list_uri + hrefs.SEP
+        with self._lock:
+            for href in [h for h in self._by_href if h == list_uri or h.startswith(prefix)]:
+                for key in list(self._by_href[href]):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_href.clear()
+            self.size = 0
+
+    def _discard(self, key: _Key):
+        body = self._entries.pop(key, None)
+        if body is None:
+            return
+        self.size -= len(body)
+        keys = self._by_href[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_href[key[0]]
+
+
+response_cache = ResponseCache()
@@ -3,13 +3,16 @@ import itertools
 import json
 import logging
 import os
+import signal
 import ssl
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import fields
 from functools import lru_cache
 from pathlib import Path
 from queue import Queue
+from typing import Any, Callable, Dict, Optional
 
 import OpenSSL
 import werkzeug.exceptions
@@ -19,8 +22,9 @@ from flask_session import Session
 from werkzeug.serving import BaseWSGIServer, make_server
 
 from ieee_2030_5.utils import dataclass_to_xml
+from ieee_2030_5.utils.tls_sessions import HandshakeStats, tune_ssl_context
 
-__all__ = ["build_server"]
+__all__ = ["build_server", "run_production_server"]
 
 import ieee_2030_5.adapters as adpt
 import ieee_2030_5.hrefs as hrefs
@@ -67,6 +71,8 @@ class PeerCertWSGIRequestHandler(werkzeug.serving.WSGIRequestHandler):
     config: ServerConfiguration
     tlsrepo: TLSRepository
     reqresponse: Queue()
+    # tlsrepo.index_version the cached identities were derived with.
+    _identities_version: Optional[int] = None
 
     @staticmethod
     @lru_cache
@@ -77,64 +83,106 @@ class PeerCertWSGIRequestHandler(werkzeug.serving.WSGIRequestHandler):
                                         initial=0)
         return next(a_filter) > 0
 
-    def make_environ(self):
+    @classmethod
+    def _x509_environ(cls, x509: OpenSSL.crypto.X509) -> Dict[str, Any]:
+        environ = {}
+        environ['ieee_2030_5_peercert'] = x509
+        environ['ieee_2030_5_serial_number'] = x509.get_serial_number()
+        if cls.config.lfdi_mode == "lfdi_mode_from_file":
+            _log.debug("Using hash from combined file.")
+            pth = cls.tlsrepo.__get_combined_file__(x509.get_subject().CN)
+            sha256hash = hashlib.sha256(pth.read_text().encode('utf-8')).hexdigest()
+            environ['ieee_2030_5_lfdi'] = lfdi_from_fingerprint(sha256hash)
+        else:
+            environ['ieee_2030_5_lfdi'] = lfdi_from_fingerprint(
+                x509.digest("sha256").decode('ascii'))
+        environ['ieee_2030_5_sfdi'] = sfdi_from_lfdi(environ['ieee_2030_5_lfdi'])
+
+        _log.debug(
+            f"Environment lfdi: {environ['ieee_2030_5_lfdi']} sfdi: {environ['ieee_2030_5_sfdi']}")
+        return environ
+
+    @classmethod
+    @lru_cache(maxsize=4096)
+    def identity_from_cert(cls, x509_binary: bytes) -> Dict[str, Any]:
         """
-        The superclass method develops the environ hash that eventually
-        forms part of the Flask request object.
+        Derive the environ entries identifying the client from its DER encoded certificate.
 
-        We allow the superclass method to run first, then we insert the
-        peer certificate into the hash. That exposes it to us later in
-        the request variable that Flask provides
+        The result is cached by certificate so the parsing, hashing and device lookup are only
+        done the first time a certificate is seen.  Failures are not cached and the cache is
+        cleared by peer_environ once a certificate leaves the index of tlsrepo.
         """
-        _log.debug("Making environment")
-        environ = super(PeerCertWSGIRequestHandler, self).make_environ()
+        x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_ASN1, x509_binary)
+        environ = cls._x509_environ(x509)
+        # TODO Currently if we are in full file mode there isn't a way to verify that the
+        # device is known.
+        if cls.config.lfdi_mode == "lfdi_mode_from_cert_fingerprint":
+            found_device_id = cls.tlsrepo.find_device_id_from_sfdi(environ['ieee_2030_5_sfdi'])
+            assert found_device_id, "Unknown device found."
+        return environ
+
+    @classmethod
+    def configure(cls, config: ServerConfiguration, tlsrepo: TLSRepository):
+        cls.config = config
+        cls.tlsrepo = tlsrepo
+        cls.identity_from_cert.cache_clear()
+        cls._identities_version = tlsrepo.index_version
+
+    @classmethod
+    def peer_environ(cls,
+                     path_info: str,
+                     get_peer_cert: Callable[[], bytes],
+                     connection_cache: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the environ entries identifying the client (ieee_2030_5_lfdi, ieee_2030_5_sfdi
+        etc.) for a request to path_info.
+
+        :param get_peer_cert: Returns the DER encoded certificate of the connected peer, only
+                              called when the identity is derived from the peer certificate.
+        :param connection_cache: Dictionary living as long as the connection, when passed the
+                                 identity is kept in it for the following requests.
+        """
+        environ = {}
 
         # Assume browser is being hit with things that start with /admin allow
         # a pass through from web (should be protected via auth but not right now)
-        if PeerCertWSGIRequestHandler.is_admin(
-                environ['PATH_INFO']) and not self.config.generate_admin_cert:
+        if cls.is_admin(path_info) and not cls.config.generate_admin_cert:
             raise werkzeug.exceptions.Forbidden()
 
         try:
             # Short circuit the connection from the client and utilize http rather
             # than x509 certificates.
-            if self.config.lfdi_client:
-                environ['ieee_2030_5_lfdi'] = self.config.lfdi_client
-                environ['ieee_2030_5_sfdi'] = sfdi_from_lfdi(self.config.lfdi_client)
+            if cls.config.lfdi_client:
+                environ['ieee_2030_5_lfdi'] = cls.config.lfdi_client
+                environ['ieee_2030_5_sfdi'] = sfdi_from_lfdi(cls.config.lfdi_client)
                 return environ
 
             # For admin use the admin peer even though it's not what is sent in to the client.
             # This allows admin to login from any api, though not necessarily secure this
             # allows a way to have the admin be boxed off.
-            if PeerCertWSGIRequestHandler.is_admin(environ['PATH_INFO']):
-                cert, key = self.tlsrepo.get_file_pair("admin")
+            if cls.is_admin(path_info):
+                cert, key = cls.tlsrepo.get_file_pair("admin")
                 x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cert)
-            else:
-                x509_binary = self.connection.getpeercert(True)
-                x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_ASN1, x509_binary)
-            environ['ieee_2030_5_peercert'] = x509
-            environ['ieee_2030_5_serial_number'] = x509.get_serial_number()
-            if PeerCertWSGIRequestHandler.config.lfdi_mode == "lfdi_mode_from_file":
-                _log.debug("Using hash from combined file.")
-                pth = PeerCertWSGIRequestHandler.tlsrepo.__get_combined_file__(
-                    x509.get_subject().CN)
-                sha256hash = hashlib.sha256(pth.read_text().encode('utf-8')).hexdigest()
-                environ['ieee_2030_5_lfdi'] = lfdi_from_fingerprint(sha256hash)
-            else:
-                environ['ieee_2030_5_lfdi'] = lfdi_from_fingerprint(
-                    x509.digest("sha256").decode('ascii'))
-            environ['ieee_2030_5_sfdi'] = sfdi_from_lfdi(environ['ieee_2030_5_lfdi'])
-
-            _log.debug(
-                f"Environment lfdi: {environ['ieee_2030_5_lfdi']} sfdi: {environ['ieee_2030_5_sfdi']}"
-            )
-            if not PeerCertWSGIRequestHandler.is_admin(environ['PATH_INFO']):
-                # TODO Currently if we are in full file mode there isn't a way to verify that the
-                # device is known.
-                if PeerCertWSGIRequestHandler.config.lfdi_mode == "lfdi_mode_from_cert_fingerprint":
-                    found_device_id = self.tlsrepo.find_device_id_from_sfdi(
-                        environ['ieee_2030_5_sfdi'])
-                    assert found_device_id, "Unknown device found."
+                environ.update(cls._x509_environ(x509))
+                return environ
+
+            # Identities derived before a certificate was removed or replaced may no longer
+            # belong to a known device.
+            version = cls.tlsrepo.index_version
+            if version != cls._identities_version:
+                cls.identity_from_cert.cache_clear()
+                cls._identities_version = version
+
+            identity = None
+            if connection_cache is not None and \
+                    connection_cache.get('identity_version') == version:
+                identity = connection_cache.get('identity')
+            if identity is None:
+                identity = cls.identity_from_cert(get_peer_cert())
+                if connection_cache is not None:
+                    connection_cache['identity'] = identity
+                    connection_cache['identity_version'] = version
+            environ.update(identity)
 
         except OpenSSL.crypto.Error:
             # Only if we have a debug_device do we want to expose this device through the admin page.
@@ -149,6 +197,26 @@ class PeerCertWSGIRequestHandler(werkzeug.serving.WSGIRequestHandler):
 
         return environ
 
+    def make_environ(self):
+        """
+        The superclass method develops the environ hash that eventually
+        forms part of the Flask request object.
+
+        We allow the superclass method to run first, then we insert the
+        peer certificate into the hash. That exposes it to us later in
+        the request variable that Flask provides
+        """
+        _log.debug("Making environment")
+        environ = super(PeerCertWSGIRequestHandler, self).make_environ()
+        # A handler instance serves a single connection so keep-alive requests reuse the
+        # identity of the first request.
+        if not hasattr(self, "_connection_cache"):
+            self._connection_cache = {}
+        environ.update(
+            self.peer_environ(environ['PATH_INFO'], lambda: self.connection.getpeercert(True),
+                              self._connection_cache))
+        return environ
+
 
 # based on
 # https://stackoverflow.com/questions/19459236/how-to-handle-413-request-entity-too-large-in-python-flask-server#:~:text=server%20MAY%20close%20the%20connection,client%20from%20continuing%20the%20request.&text=time%20the%20client%20MAY%20try,you%20the%20Broken%20pipe%20error.&text=Great%20than%20the%20application%20is%20acting%20correct.
@@ -194,7 +262,8 @@ def after_request(response: Response) -> Response:
     return response
 
 
-def __build_ssl_context__(tlsrepo: TLSRepository) -> ssl.SSLContext:
+def __build_ssl_context__(tlsrepo: TLSRepository,
+                          config: Optional[ServerConfiguration] = None) -> ssl.SSLContext:
     # to establish an SSL socket we need the private key and certificate that
     # we want to serve to users.
     server_key_file = str(tlsrepo.server_key_file)
@@ -221,6 +290,17 @@ def __build_ssl_context__(tlsrepo: TLSRepository) -> ssl.SSLContext:
     # change this to ssl.CERT_REQUIRED during deployment.
     # TODO if required we have to have one all the time on the server.
     ssl_context.verify_mode = ssl.CERT_OPTIONAL    # ssl.CERT_REQUIRED
+
+    # Devices that reconnect for every poll resume their session rather than doing a full
+    # handshake each time.
+    if config is None:
+        tune_ssl_context(ssl_context)
+    else:
+        tune_ssl_context(ssl_context,
+                         ciphers=config.tls_ciphers,
+                         ecdh_curve=config.tls_ecdh_curve,
+                         session_tickets=config.tls_session_tickets,
+                         tickets_per_handshake=config.tls_tickets_per_handshake)
     return ssl_context
 
 
@@ -354,7 +434,7 @@ def __build_app__(config: ServerConfiguration, tlsrepo: TLSRepository) -> Flask:
             return render_template("admin/resource_list.html",
                                    resource_urls=all_resources,
                                    href_shown=resource,
-                                   object=dataclass_to_xml(obj))
+                                   object=dataclass_to_xml(obj, pretty_print=True))
         else:
             return render_template("admin/resource_list.html", resource_urls=all_resources)
 
@@ -400,7 +480,7 @@ def run_server(config: ServerConfiguration, tlsrepo: TLSRepository, **kwargs):
     # If lfd_client is specified then we are running in http mode so we don'
     # establish an sslcontext.
     if not config.lfdi_client:
-        ssl_context = __build_ssl_context__(tlsrepo)
+        ssl_context = __build_ssl_context__(tlsrepo, config)
 
     try:
         host, port = config.server_hostname.split(":")
@@ -409,8 +489,7 @@ def run_server(config: ServerConfiguration, tlsrepo: TLSRepository, **kwargs):
         host = config.server_hostname
         port = 8443
 
-    PeerCertWSGIRequestHandler.config = config
-    PeerCertWSGIRequestHandler.tlsrepo = tlsrepo
+    PeerCertWSGIRequestHandler.configure(config, tlsrepo)
 
     run_app(app=app,
             host=host,
@@ -420,10 +499,130 @@ def run_server(config: ServerConfiguration, tlsrepo: TLSRepository, **kwargs):
             **kwargs)
 
 
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server that handles the accepted connections on a bounded pool of worker threads.
+
+    The TLS handshake is done on the worker rather than in the accept loop so a slow client
+    can't hold up the other connections.  Connections accepted while every worker is busy
+    wait (up to ``workers`` of them) for a free worker, after that they are left in the
+    listen backlog.  On shutdown the listening socket is closed and the requests in
+    progress are allowed to complete.
+
+    :param workers: Number of worker threads.
+    :param backlog: Size of the listen backlog.
+    :param handshake_timeout: Seconds a client has to complete the TLS handshake.
+
+    The TLS handshakes, full and resumed, are counted in handshake_stats.
+    """
+    multithread = True
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 app: Flask,
+                 workers: int = 32,
+                 backlog: int = 1024,
+                 handshake_timeout: float = 10.0,
+                 **kwargs):
+        self.request_queue_size = backlog
+        self._handshake_timeout = handshake_timeout
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="2030.5-worker")
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._stopping = threading.Event()
+        self.handshake_stats = HandshakeStats()
+        super().__init__(host, port, app, **kwargs)
+        if self.ssl_context is not None:
+            self.socket.do_handshake_on_connect = False
+
+    def process_request(self, request, client_address):
+        while not self._slots.acquire(timeout=0.5):
+            if self._stopping.is_set():
+                self.shutdown_request(request)
+                return
+        self._workers.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            if isinstance(request, ssl.SSLSocket):
+                request.settimeout(self._handshake_timeout)
+                try:
+                    request.do_handshake()
+                except (ssl.SSLError, OSError) as ex:
+                    self.handshake_stats.record_failure()
+                    _log.debug(f"TLS handshake with {client_address} failed: {ex}")
+                    return
+                self.handshake_stats.record(request.session_reused)
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        super().shutdown()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._workers.shutdown(wait=True)
+
+
+def run_production_server(config: ServerConfiguration, tlsrepo: TLSRepository):
+    """
+    Serve the 2030.5 server on a PooledWSGIServer until SIGINT or SIGTERM is received.
+    """
+    global server_config, tls_repository
+    server_config = config
+    tls_repository = tlsrepo
+
+    app = __build_app__(config, tlsrepo)
+
+    ssl_context = None
+    if not config.lfdi_client:
+        ssl_context = __build_ssl_context__(tlsrepo, config)
+
+    try:
+        host, port = config.server_hostname.split(":")
+    except ValueError:
+        # host and port not available
+        host = config.server_hostname
+        port = 8443
+
+    PeerCertWSGIRequestHandler.configure(config, tlsrepo)
+    # Idle keep-alive connections give up their worker after this many seconds.
+    PeerCertWSGIRequestHandler.timeout = config.server_keepalive_timeout
+
+    server = PooledWSGIServer(host,
+                              int(port),
+                              app,
+                              workers=config.server_workers,
+                              backlog=config.server_accept_backlog,
+                              handler=PeerCertWSGIRequestHandler,
+                              ssl_context=ssl_context)
+
+    def _stop(signum, frame):
+        _log.info(f"Received signal {signum}, shutting down server")
+        # shutdown blocks until serve_forever exits so it can't be called from its thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    _log.info(f"Serving on {host}:{server.port} with {config.server_workers} workers")
+    try:
+        server.serve_forever()
+    finally:
+        # Closes the listening socket and waits for the requests in progress.
+        server.server_close()
+    if ssl_context is not None:
+        _log.info(f"TLS handshakes: {server.handshake_stats.snapshot()}")
+
+
 def build_server(config: ServerConfiguration, tlsrepo: TLSRepository, **kwargs) -> BaseWSGIServer:
 
     app = __build_app__(config, tlsrepo)
-    ssl_context = __build_ssl_context__(tlsrepo)
+    ssl_context = __build_ssl_context__(tlsrepo, config)
 
     try:
         host, port = config.server_hostname.split(":")
@@ -432,8 +631,7 @@ def build_server(config: ServerConfiguration, tlsrepo: TLSRepository, **kwargs)
         host = config.server_hostname
         port = 8443
 
-    PeerCertWSGIRequestHandler.config = config
-    PeerCertWSGIRequestHandler.tlsrepo = tlsrepo
+    PeerCertWSGIRequestHandler.configure(config, tlsrepo)
 
     return make_server(app=app,
                        host=host,
@@ -96,6 +96,50 @@ class HrefParser:
             return None
 
 
+# Stands in for the indexes of an href in HrefKey.shape
+INDEX = "#"
+
+
+class HrefKey(NamedTuple):
+    """
+    An href split into its parts, with the indexes converted to int.
+
+    Ex: /edev_3_der_0_ders has parts ("edev", 3, "der", 0, "ders") and the shape
+    ("edev", "#", "der", "#", "ders") that identifies the type of resource.
+    """
+    parts: tuple
+    shape: tuple
+
+    @property
+    def root(self) -> str:
+        return self.parts[0]
+
+    @property
+    def indices(self) -> tuple:
+        return tuple(part for part in self.parts if isinstance(part, int))
+
+    def has_index(self) -> bool:
+        return len(self.parts) > 1
+
+    def count(self) -> int:
+        return len(self.parts)
+
+    def join(self, how_many: int) -> str:
+        return "/" + SEP.join([str(x) for x in self.parts[:how_many]])
+
+    def at(self, index: int) -> Union[str, int, None]:
+        try:
+            return self.parts[index]
+        except IndexError:
+            return None
+
+
+def parse_href(href: str) -> HrefKey:
+    """Split href into an HrefKey."""
+    parts = tuple(int(part) if part.isdecimal() else part for part in href.lstrip("/").split(SEP))
+    return HrefKey(parts, tuple(INDEX if isinstance(part, int) else part for part in parts))
+
+
 class HrefEventParser(HrefParser):
 
     @property
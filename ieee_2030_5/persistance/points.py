@@ -1,15 +1,157 @@
 """
 Provides a key/value store interface for setting retrieving points from a datastore.
 
-This implementation just uses pickledb for loading a json datastore.  After
-each set the data will be written to disk.
+The points are kept in a single append-only file.  Each set appends a record to the end of
+the file and the last record for a key wins.  Writes are buffered and fsync'd in batches of
+``sync_every`` records, or when :func:`sync_points` is called (always at exit).
+
+Points used to be kept in a file per key (a simplekv FilesystemStore) in the same directory,
+:func:`import_legacy_points` moves them into the log.
 """
 import atexit
+import logging
+import os
+import shutil
+import struct
+import threading
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_log = logging.getLogger(__name__)
+
+_header = struct.Struct("<II")
+
+
+class AppendOnlyLog:
+    """
+    A key/value log file.
+
+    Each record is an 8 byte header holding the key and value lengths followed by the
+    utf-8 key and the value bytes.  A partially written record at the end of the file
+    (e.g. after a crash) is ignored and truncated on the next open.
+
+    :param path: The file to store the records in.
+    :param sync_every: Number of appended records that triggers a flush and fsync.
+    """
+
+    def __init__(self, path: Path, sync_every: int = 256):
+        self._path = Path(path)
+        self._sync_every = sync_every
+        self._unsynced = 0
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._records = 0
+        self._file = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _open(self):
+        if self._file is not None and not self._file.closed and self._path.exists():
+            return
+        if self._file is not None and not self._file.closed:
+            # The file was removed from under us (cleansed storage) so start over.
+            self._file.close()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._path, "a+b")
+        self._offsets, self._records, valid_length = self._scan()
+        if valid_length != self._file.seek(0, os.SEEK_END):
+            _log.warning(f"Truncating partial record at the end of {self._path}")
+            self._file.truncate(valid_length)
+        self._file.seek(0, os.SEEK_END)
+        if self._records > 1000 and self._records > 2 * len(self._offsets):
+            self.compact()
+
+    def _scan(self) -> Tuple[Dict[str, Tuple[int, int]], int, int]:
+        offsets: Dict[str, Tuple[int, int]] = {}
+        records = 0
+        self._file.seek(0)
+        position = 0
+        while True:
+            header = self._file.read(_header.size)
+            if len(header) < _header.size:
+                break
+            key_len, value_len = _header.unpack(header)
+            key = self._file.read(key_len)
+            value_position = position + _header.size + key_len
+            if len(key) < key_len or self._file.seek(value_len, os.SEEK_CUR) > os.fstat(
+                    self._file.fileno()).st_size:
+                break
+            offsets[key.decode("utf-8")] = (value_position, value_len)
+            records += 1
+            position = value_position + value_len
+        return offsets, records, position
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._open()
+            encoded = key.encode("utf-8")
+            position = self._file.tell()
+            self._file.write(_header.pack(len(encoded), len(value)) + encoded + value)
+            self._offsets[key] = (position + _header.size + len(encoded), len(value))
+            self._records += 1
+            self._unsynced += 1
+            if self._unsynced >= self._sync_every:
+                self.sync()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._open()
+            if key not in self._offsets:
+                return None
+            position, length = self._offsets[key]
+            self._file.flush()
+            self._file.seek(position)
+            value = self._file.read(length)
+            self._file.seek(0, os.SEEK_END)
+            return value
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._open()
+            return list(self._offsets.keys())
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        for key in self.keys():
+            yield key, self.get(key)
+
+    def sync(self):
+        with self._lock:
+            if self._file is None or self._file.closed or not self._unsynced:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
 
-from simplekv.fs import FilesystemStore
+    def compact(self):
+        """Rewrite the file keeping only the last record of each key."""
+        with self._lock:
+            self._open()
+            live = list(self.items())
+            tmp = self._path.with_suffix(".compact")
+            with open(tmp, "wb") as f:
+                for key, value in live:
+                    encoded = key.encode("utf-8")
+                    f.write(_header.pack(len(encoded), len(value)) + encoded + value)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self._path)
+            self._file = None
+            self._unsynced = 0
+            self._open()
 
-db = FilesystemStore(Path("~/.ieee_2030_5_data").expanduser().resolve())
+    def close(self):
+        with self._lock:
+            self.sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+db = AppendOnlyLog(Path("~/.ieee_2030_5_data").expanduser().resolve() / "points.log")
+atexit.register(db.close)
 
 
 def set_point(key: str, value: bytes):
@@ -20,22 +162,73 @@ def set_point(key: str, value: bytes):
         set_point("_e55a4c7a-c006-4596-b658-e23bc771b5cb.angle", -156.38295096513662)
         set_point("known_mrids": ["_4da919f1-762f-4755-b674-5faccf3faec6"])
     """
-    k = key.replace('/', '^^^^')
-    db.put(k, value)
+    db.put(key, value)
 
 
 def get_point(key):
     """
     Retrieve a point from the key/value store.  If the key doesn't exist returns None.
     """
-    k = key.replace('/', '^^^^')
-    return db.get(k)
+    return db.get(key)
 
 
 def get_hrefs():
     return db.keys()
 
 
+def get_points() -> Iterator[Tuple[str, bytes]]:
+    """
+    Iterate over the latest value of every point in the store.
+    """
+    return db.items()
+
+
+def sync_points():
+    """
+    Flush and fsync any buffered points to disk.
+    """
+    db.sync()
+
+
+def import_legacy_points(log: Optional[AppendOnlyLog] = None) -> int:
+    """
+    Import the points of the file per key store that was kept in the directory of the log.
+
+    Each file holds the value of the key its name encodes ('/' was stored as '^^^^').  Keys
+    already in the log were written since and are kept.  Once the log is synced the files
+    are moved to a legacy directory beside it so they are only imported once.
+
+    :return: The number of points imported.
+    """
+    log = log or db
+    directory = log.path.parent
+    if not directory.is_dir():
+        return 0
+    own_files = {log.path.name, log.path.with_suffix(".compact").name}
+    legacy = [
+        path for path in directory.iterdir() if path.is_file() and path.name not in own_files
+    ]
+    if not legacy:
+        return 0
+
+    existing = set(log.keys())
+    imported = 0
+    for path in legacy:
+        key = path.name.replace("^^^^", "/")
+        if key not in existing:
+            log.put(key, path.read_bytes())
+            imported += 1
+    log.sync()
+
+    backup = directory / "legacy"
+    backup.mkdir(exist_ok=True)
+    for path in legacy:
+        shutil.move(str(path), str(backup / path.name))
+    _log.info(f"Imported {imported} points from {len(legacy)} files into {log.path}, the files "
+              f"were moved to {backup}")
+    return imported
+
+
 if __name__ == '__main__':
 
     set_point("foo", b"bar")
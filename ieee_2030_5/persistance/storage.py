@@ -0,0 +1,161 @@
+"""
+Storage engines used by the adapters to persist their resources.
+
+Each record is an opaque ``bytes`` value addressed by a namespace and a key.  The adapters
+decide what the namespaces and keys mean (see ``ieee_2030_5.adapters``); the engines only
+need to support incremental per-record writes, deletes and a full scan on warm restart.
+
+Two engines are provided:
+
+ - NullStorage keeps nothing and is the default so that the server behaves as an in-memory
+   server unless a durable engine is configured.
+ - SqliteStorage keeps the records in a single sqlite file.  Writes are batched into a
+   single transaction that is committed either when ``batch_size`` writes are pending or
+   when :meth:`SqliteStorage.commit` is called.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator, List, Protocol, Tuple, Union
+
+_log = logging.getLogger(__name__)
+
+
+class StorageBackend(Protocol):
+
+    def put(self, namespace: str, key: str, value: bytes) -> None:
+        pass
+
+    def delete(self, namespace: str, key: str) -> None:
+        pass
+
+    def delete_namespace(self, namespace: str) -> None:
+        pass
+
+    def namespaces(self) -> List[str]:
+        pass
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, bytes]]:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class NullStorage:
+    """Storage engine that does not store anything."""
+
+    def put(self, namespace: str, key: str, value: bytes) -> None:
+        pass
+
+    def delete(self, namespace: str, key: str) -> None:
+        pass
+
+    def delete_namespace(self, namespace: str) -> None:
+        pass
+
+    def namespaces(self) -> List[str]:
+        return []
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, bytes]]:
+        return iter(())
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStorage:
+    """
+    Storage engine backed by a single sqlite database file.
+
+    :param path: The database file, parent directories are created as needed.
+    :param batch_size: Number of pending writes that triggers an automatic commit.
+    """
+
+    def __init__(self, path: Union[str, Path], batch_size: int = 500):
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records ("
+                           "namespace TEXT NOT NULL, "
+                           "key TEXT NOT NULL, "
+                           "value BLOB NOT NULL, "
+                           "PRIMARY KEY (namespace, key))")
+        self._conn.commit()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self.commit()
+
+    def put(self, namespace: str, key: str, value: bytes) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO records (namespace, key, value) "
+                               "VALUES (?, ?, ?)", (namespace, key, value))
+            self._written()
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM records WHERE namespace = ? AND key = ?",
+                               (namespace, key))
+            self._written()
+
+    def delete_namespace(self, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM records WHERE namespace = ?", (namespace, ))
+            self._written()
+
+    def namespaces(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT namespace FROM records").fetchall()
+        return [row[0] for row in rows]
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, bytes]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM records WHERE namespace = ?",
+                                      (namespace, )).fetchall()
+        return iter(rows)
+
+    def commit(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                _log.debug(f"Committed {self._pending} writes to {self._path}")
+                self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.commit()
+            self._conn.close()
+
+
+def create_storage(backend: str | None, storage_path: Union[str, Path]) -> StorageBackend:
+    """
+    Create a storage engine from the server configuration values.
+
+    :param backend: One of None/"none" or "sqlite".
+    :param storage_path: Directory the engine should store its files in.
+    """
+    if backend in (None, "none"):
+        return NullStorage()
+    if backend == "sqlite":
+        return SqliteStorage(Path(storage_path) / "adapters.sqlite")
+    raise ValueError(f"Unknown storage backend {backend}")
@@ -0,0 +1,150 @@
+"""
+Write-behind queue used to move persistence off of the request path.
+
+Writes are recorded under a key and coalesced, so an object that is changed many times
+between flushes is only written once.  A daemon thread flushes the queue every
+``flush_interval`` seconds, or as soon as ``max_pending`` keys are waiting.  A value that
+fails to be written stays queued for the next flush unless a newer value replaces it.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_log = logging.getLogger(__name__)
+
+
+class WriteBehindQueue(threading.Thread):
+    """
+    Coalescing write-behind queue.
+
+    :param write: Called from the flushing thread with each pending value.
+    :param commit: Called after each flush that wrote at least one value.
+    :param flush_interval: Seconds between background flushes.
+    :param max_pending: Number of pending keys that triggers an immediate flush.
+    """
+
+    def __init__(self,
+                 write: Callable[[Any], None],
+                 commit: Callable[[], None],
+                 flush_interval: float = 1.0,
+                 max_pending: int = 1000):
+        super().__init__(daemon=True, name="write-behind")
+        self._write = write
+        self._commit = commit
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: Dict[Hashable, Any] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+        self._flushes = 0
+        self._flushed_items = 0
+        self._failed_items = 0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+        self._max_backlog = 0
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return dict(backlog=self.backlog,
+                    max_backlog=self._max_backlog,
+                    flushes=self._flushes,
+                    flushed_items=self._flushed_items,
+                    failed_items=self._failed_items,
+                    last_flush_seconds=self._last_flush_seconds,
+                    max_flush_seconds=self._max_flush_seconds)
+
+    def put(self,
+            key: Hashable,
+            value: Any,
+            supersedes: Optional[Callable[[Hashable], bool]] = None):
+        """
+        Queue value under key replacing any value already pending for the key.  Values are
+        written in the order they were last queued.
+
+        :param supersedes: When passed, pending keys for which it returns True are dropped
+                           before value is queued (e.g. writes to a list that is being cleared).
+        """
+        with self._pending_lock:
+            if supersedes is not None:
+                for pending_key in [k for k in self._pending if supersedes(k)]:
+                    del self._pending[pending_key]
+            self._pending.pop(key, None)
+            self._pending[key] = value
+            backlog = len(self._pending)
+            self._max_backlog = max(self._max_backlog, backlog)
+        if backlog >= self._max_pending:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """
+        Write everything pending.  Returns the number of values written, the values that
+        failed are queued again and counted in the failed_items stat.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            start = time.perf_counter()
+            failed: Dict[Hashable, Any] = {}
+            for key, value in pending.items():
+                try:
+                    self._write(value)
+                except Exception:
+                    _log.exception(f"Write-behind failed to write {value}")
+                    failed[key] = value
+            if len(failed) < len(pending):
+                try:
+                    self._commit()
+                except Exception:
+                    _log.exception(f"Write-behind failed to commit {len(pending)} items")
+                    failed = pending
+            elapsed = time.perf_counter() - start
+
+            if failed:
+                self._requeue(failed)
+            written = len(pending) - len(failed)
+            self._flushes += 1
+            self._flushed_items += written
+            self._failed_items += len(failed)
+            self._last_flush_seconds = elapsed
+            self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+            _log.debug(f"Write-behind flushed {written} items ({len(failed)} failed) in "
+                       f"{elapsed:.4f}s backlog {self.backlog}")
+            return written
+
+    def _requeue(self, failed: Dict[Hashable, Any]):
+        with self._pending_lock:
+            # Failed values were queued before anything pending now so they are written
+            # first, values queued since for the same key replace them.
+            requeued = {key: value for key, value in failed.items() if key not in self._pending}
+            requeued.update(self._pending)
+            self._pending = requeued
+            self._max_backlog = max(self._max_backlog, len(requeued))
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Stop the flushing thread after writing everything pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+        if self._pending:
+            _log.error(f"Write-behind stopped with {len(self._pending)} items it failed to write")
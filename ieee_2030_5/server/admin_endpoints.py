@@ -1,5 +1,6 @@
 import json
 import logging
+from dataclasses import asdict
 from pathlib import Path
 from typing import Optional
 
@@ -12,6 +13,7 @@ from ieee_2030_5.data.indexer import add_href, get_href
 import ieee_2030_5.hrefs as hrefs
 import ieee_2030_5.models as m
 from ieee_2030_5.certs import TLSRepository
+from ieee_2030_5.data.reading_store import ReadingSeries
 from ieee_2030_5.config import ServerConfiguration
 from ieee_2030_5.server.server_constructs import create_device_capability
 from ieee_2030_5.utils import (dataclass_to_xml, get_lfdi_from_cert, get_sfdi_from_lfdi,
@@ -37,6 +39,7 @@ class AdminEndpoints:
         #        app.add_url_rule("/admin/ders/<int:edev_index>", view_func=self._admin_ders)
 
         app.add_url_rule("/admin/resources", view_func=self._admin_resources)
+        app.add_url_rule("/admin/readings", view_func=self._admin_reading_aggregates)
         # COMPLETE
         app.add_url_rule("/admin/edev/<int:edevid>/fsa/<int:fsaid>/derp",
                          view_func=self._admin_edev_fsa_derp)
@@ -103,6 +106,36 @@ class AdminEndpoints:
 
         return Response(json.dumps(data), status=200)
 
+    def _admin_reading_aggregates(self) -> Response:
+        """
+        Min, max and mean of a UsagePoint reading list per interval, e.g.
+        /admin/readings?href=/upt_0_mr_0_r&interval=900
+        """
+        headers = {'CONTENT-TYPE': "application/json"}
+        href = request.args.get("href")
+        if not href or adpt.ListAdapter.get_type(href) is not m.Reading:
+            return Response(json.dumps({"error": f"Invalid reading list {href}"}),
+                            status=400,
+                            headers=headers)
+
+        series = adpt.ListAdapter.get_reading_series(href)
+        if series is None:
+            # Aggregate a copy rather than converting the list on a GET.
+            series = ReadingSeries(href)
+            if adpt.ListAdapter.list_size(href):
+                for key, reading in enumerate(adpt.ListAdapter.get_list(href)):
+                    series[key] = reading
+        start = request.args.get("start", type=int)
+        end = request.args.get("end", type=int)
+        aggregates = series.aggregate(request.args.get("interval", 900, type=int), start, end)
+        data = {
+            "href": href,
+            "uom": series.uom,
+            "powerOfTenMultiplier": series.power_of_ten_multiplier,
+            "intervals": [asdict(x) for x in aggregates]
+        }
+        return Response(json.dumps(data), headers=headers)
+
     def _admin_certs(self) -> Response:
         headers = {'CONTENT-TYPE': "application/json"}
         tls_repo: TLSRepository = g.TLS_REPOSITORY
@@ -1,6 +1,8 @@
 from __future__ import annotations
 import logging
 from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, Callable, Optional
 
 import werkzeug
@@ -8,7 +10,10 @@ from flask import request, Response
 
 from ieee_2030_5.certs import TLSRepository
 from ieee_2030_5.config import ServerConfiguration
+from ieee_2030_5.data.indexer import content_hash, get_href_index
+from ieee_2030_5.data.response_cache import response_cache
 from ieee_2030_5.models import DeviceCategoryType
+import ieee_2030_5.hrefs as hrefs
 import ieee_2030_5.server.server_endpoints as eps
 
 from ieee_2030_5.types_ import SEP_XML
@@ -69,6 +74,11 @@ class RequestOp(ServerOperation):
     def server_config(self) -> ServerConfiguration:
         return self._server_endpoints.config
 
+    @property
+    def href(self) -> hrefs.HrefKey:
+        """The parsed path of the request."""
+        return hrefs.parse_href(request.path)
+
     @property
     def lfdi(self):
         return request.environ["ieee_2030_5_lfdi"] # self._tls_repository.lfdi(request.environ['ieee_2030_5_subject'])
@@ -97,5 +107,58 @@ class RequestOp(ServerOperation):
 
         return pth
 
+    @staticmethod
+    def last_modified(obj: dataclass, etag: str) -> Optional[datetime]:
+        """
+        The time obj was last written to the store, None if obj isn't stored under its href
+        or has been changed since it was written.
+        """
+        index = get_href_index(getattr(obj, "href", None))
+        if index is None or index.last_hash != etag:
+            return None
+        return parsedate_to_datetime(index.last_written).replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def etag(obj: dataclass) -> str:
+        """
+        The content hash of obj.  For a resource stored under its href the hash the store
+        computed when it was written is used.  Anything else, e.g. the resources the adapters
+        hold which are changed in place, is hashed every time.
+        """
+        index = get_href_index(getattr(obj, "href", None))
+        if index is not None and index.item is obj:
+            return index.last_hash
+        return content_hash(obj)
+
     def build_response_from_dataclass(self, obj: dataclass) -> Response:
-        return Response(dataclass_to_xml(obj), headers=self._headers)
+        """
+        Serialize obj as the response, with an ETag of its content hash, see etag.
+
+        A GET whose If-None-Match matches the ETag, or whose If-Modified-Since isn't older
+        than the time obj was last written, gets a 304 without obj being serialized.  Other
+        responses are served from the response cache when obj hasn't changed since it was
+        last serialized for the same path, paged views and volatile resources such as /tm
+        are always serialized.
+        """
+        etag = self.etag(obj)
+        last_modified = self.last_modified(obj, etag)
+        not_modified = False
+        if request.method in ('GET', 'HEAD'):
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified is not None:
+                not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            params = request.query_string.decode('latin-1')
+            body = response_cache.get(request.path, params, etag)
+            if body is None:
+                body = dataclass_to_xml(obj).encode('utf-8')
+                response_cache.put(request.path, params, etag, body)
+            response = Response(body, headers=self._headers)
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        return response
@@ -1,9 +1,10 @@
 from dataclasses import asdict
-from typing import Optional
+from typing import Optional, Tuple
 from pprint import pformat
 
 from flask import Response, request
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import BadRequest, NotFound
+from xsdata.exceptions import ParserError
 
 import ieee_2030_5.adapters as adpt
 from ieee_2030_5.data.indexer import add_href, get_href
@@ -22,6 +23,14 @@ class DERRequests(RequestOp):
     Class supporting end devices and any of the subordinate calls to it.
     """
 
+    PUT_TYPES = {
+        hrefs.DER_SETTINGS: m.DERSettings,
+        hrefs.DER_STATUS: m.DERStatus,
+        hrefs.DER_CAPABILITY: m.DERCapability,
+        hrefs.DER_AVAILABILITY: m.DERAvailability,
+        hrefs.DER_PROGRAM: m.DERProgram,
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -31,18 +40,17 @@ class DERRequests(RequestOp):
         if not request.path.startswith(hrefs.DEFAULT_DER_ROOT):
             raise ValueError(f"Invalid path for {self.__class__} {request.path}")
 
-        parser = hrefs.HrefParser(request.path)
+        parser = self.href
 
-        clstype = {
-            hrefs.DER_SETTINGS: m.DERSettings,
-            hrefs.DER_STATUS: m.DERStatus,
-            hrefs.DER_CAPABILITY: m.DERCapability,
-            hrefs.DER_AVAILABILITY: m.DERAvailability,
-            hrefs.DER_PROGRAM: m.DERProgram,
-        }
+        clstype = self.PUT_TYPES.get(parser.at(2))
+        if clstype is None:
+            raise BadRequest(f"Can't PUT to {request.path}")
 
-        data = request.get_data(as_text=True)
-        data = xml_to_dataclass(data, clstype[parser.at(2)])
+        # The type is known from the path so the parser doesn't have to look it up.
+        try:
+            data = xml_to_dataclass(request.get_data(as_text=True), clstype)
+        except ParserError as ex:
+            raise BadRequest(str(ex))
 
         # if request.path.endswith("ders") or request.path.endswith("derg"):
         #     print(f"----------------------DER PUT {request.path} {data}")
@@ -64,7 +72,7 @@ class DERRequests(RequestOp):
 
         if value is None:
 
-            parser = hrefs.HrefParser(request.path)
+            parser = self.href
 
             subpaths = {
                 hrefs.DER_SETTINGS: m.DERSettings(href=request.path),
@@ -95,49 +103,59 @@ class DERProgramRequests(RequestOp):
     Class supporting end devices and any of the subordinate calls to it.
     """
 
+    # HrefKey.shape -> method serving the GETs of hrefs of that shape, see HrefRouter.
+    GET_BY_SHAPE = {
+        (hrefs.DER_PROGRAM, ): "get_program_list",
+        (hrefs.DER_PROGRAM, hrefs.INDEX): "get_program",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DERC): "get_list",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DERCURVE): "get_list",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DDERC): "get_default_control",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DERC, hrefs.INDEX): "get_list_item",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DERCA, hrefs.INDEX): "get_list_item",
+        (hrefs.DER_PROGRAM, hrefs.INDEX, hrefs.DERCURVE, hrefs.INDEX): "get_list_item",
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-    def get(self) -> Response:
-
+    @staticmethod
+    def _paging() -> Tuple[int, int, int]:
         _log.debug(f"Processing get request for: {request.path} with args: {[x for x in request.args.keys()]}")
-        start = int(request.args.get('s', 0))
-        after = int(request.args.get('a', 0))
-        limit = int(request.args.get('l', 1))
-
-        parsed = hrefs.HrefParser(request.path)
-
-        if not parsed.has_index():
-            retval = adpt.ListAdapter.get_resource_list(hrefs.DEFAULT_DERP_ROOT, start, after,
-                                                        limit)
-        elif parsed.count() == 2:
-            retval = adpt.ListAdapter.get(hrefs.DEFAULT_DERP_ROOT, parsed.at(1))
-        elif parsed.count() == 4:
-            _log.debug("Retrieving DER Control list")
-            # Retrieve the list of controls from storage
-            dercl = get_href(parsed.join(3))
-            assert isinstance(dercl, m.DERControlList)
-            # The index that we want to get the control from.
-            retval = dercl.DERControl[parsed.at(3)]
-        elif parsed.at(2) == hrefs.DERC:
-            _log.debug(f"Retrieving DERC")
-            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-            if hasattr(retval, 'mRID'):
-                retval = adpt.GlobalmRIDs.get_item(retval.mRID)
-        elif parsed.at(2) == hrefs.DDERC:
-            _log.debug(f"Retrieving DDERC")
-            retval = adpt.ListAdapter.get_single(request.path)
-            if hasattr(retval, 'mRID'):
-                retval = adpt.GlobalmRIDs.get_item(retval.mRID)
-        elif parsed.at(2) == hrefs.DERCURVE:
-            _log.debug(f"Retrieving DC")
-            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-        # elif parsed.at(2) == hrefs.DDERC:
-        #     retval = adpt.DERControlAdapter.fetch_at(parsed.at(3))
-        else:
-            retval = get_href(request.path)
+        return (int(request.args.get('s', 0)), int(request.args.get('a', 0)),
+                int(request.args.get('l', 1)))
 
+    def _respond(self, retval) -> Response:
         if not retval:
             raise NotFound(f"{request.path}")
 
         return self.build_response_from_dataclass(retval)
+
+    def get_program_list(self) -> Response:
+        start, after, limit = self._paging()
+        return self._respond(
+            adpt.ListAdapter.get_resource_list(hrefs.DEFAULT_DERP_ROOT, start, after, limit))
+
+    def get_program(self) -> Response:
+        return self._respond(adpt.ListAdapter.get(hrefs.DEFAULT_DERP_ROOT, self.href.at(1)))
+
+    def get_list(self) -> Response:
+        """The DERControl or DERCurve list of a program."""
+        start, after, limit = self._paging()
+        return self._respond(
+            adpt.ListAdapter.get_resource_list(request.path, start, after, limit))
+
+    def get_default_control(self) -> Response:
+        _log.debug(f"Retrieving DDERC")
+        retval = adpt.ListAdapter.get_single(request.path)
+        if hasattr(retval, 'mRID'):
+            retval = adpt.GlobalmRIDs.get_item(retval.mRID)
+        return self._respond(retval)
+
+    def get_list_item(self) -> Response:
+        _log.debug("Retrieving DER Control")
+        parsed = self.href
+        # The index that we want to get the control from in the list of controls.
+        return self._respond(adpt.ListAdapter.get(parsed.join(3), parsed.at(3)))
+
+    def get(self) -> Response:
+        return self._respond(get_href(request.path))
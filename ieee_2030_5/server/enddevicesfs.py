@@ -1,5 +1,5 @@
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 
 import werkzeug.exceptions
 from flask import Response, request
@@ -21,6 +21,14 @@ class EDevRequests(RequestOp):
     Class supporting end devices and any of the subordinate calls to it.
     """
 
+    # HrefKey.shape -> method serving the GETs of hrefs of that shape, see HrefRouter.
+    GET_BY_SHAPE = {
+        (hrefs.EDEV, ): "get_end_device_list",
+        (hrefs.EDEV, hrefs.INDEX, hrefs.DER): "get_list",
+        (hrefs.EDEV, hrefs.INDEX, hrefs.END_DEVICE_LOG_EVENT_LIST): "get_list",
+        (hrefs.EDEV, hrefs.INDEX, hrefs.END_DEVICE_FSA): "get_list",
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -79,49 +87,39 @@ class EDevRequests(RequestOp):
 
         return Response(status=status, headers={'Location': ed_href})
 
+    @staticmethod
+    def _paging() -> Tuple[int, int, int]:
+        return (int(request.args.get("s", 0)), int(request.args.get("a", 0)),
+                int(request.args.get("l", 1)))
+
+    def get_end_device_list(self) -> Response:
+        """The EndDeviceList of /edev holds only the client's own end device."""
+        ed = adpt.EndDeviceAdapter.fetch_by_property('lFDI', self.lfdi)
+        retval = m.EndDeviceList(href=request.path, all=1, results=1, EndDevice=[ed])
+        return self.build_response_from_dataclass(retval)
+
+    def get_list(self) -> Response:
+        """The DER, LogEvent and FunctionSetAssignments lists of an end device."""
+        start, after, limit = self._paging()
+        retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
+        return self.build_response_from_dataclass(retval)
+
     def get(self) -> Response:
         """
-        Supports the get request for end_devices(EDev) and end_device_list_link.
+        Supports the get request for the resources of an end device.
 
         Paths:
-            /edev
-            /edev/0
-            /edev/0/di
-            /edev/0/rg
-            /edev/0/der
+            /edev_0
+            /edev_0_di
+            /edev_0_rg
+            /edev_0_der_0
 
         """
-        # TODO start implementing these.
-        start = int(request.args.get("s", 0))
-        limit = int(request.args.get("l", 1))
-        after = int(request.args.get("a", 0))
-
-        edev_href = hrefs.HrefParser(request.path)
-
-        ed = adpt.EndDeviceAdapter.fetch_by_property('lFDI', self.lfdi)
-
-        # /edev_0_dstat
-        if request.path == ed.DERListLink.href:
-            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-        elif request.path == ed.LogEventListLink.href:
-            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-        elif request.path == ed.FunctionSetAssignmentsListLink.href:
-            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-        elif edev_href.count() > 2:
-            if retval := get_href(request.path):
-                pass
-            else:
-                retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-        elif not edev_href.has_index():
-            retval = m.EndDeviceList(href=request.path, all=1, results=1, EndDevice=[ed])
+        start, after, limit = self._paging()
+        if retval := get_href(request.path):
+            pass
         else:
-            if retval := get_href(request.path):
-                pass
-            else:
-                retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
-
-        # if adpt.ListAdapter.has_list(request.path):
-        #     retval = adpt.ListAdapter.get_resource_list(request.path)
+            retval = adpt.ListAdapter.get_resource_list(request.path, start, after, limit)
 
         return self.build_response_from_dataclass(retval)
 
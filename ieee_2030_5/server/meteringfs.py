@@ -8,7 +8,9 @@ from dataclasses import dataclass
 from typing import Dict, List, Optional
 
 from flask import Response, request
+from lxml.etree import XMLSyntaxError
 from werkzeug.exceptions import BadRequest
+from xsdata.exceptions import ParserError
 
 import ieee_2030_5.adapters as adpt
 import ieee_2030_5.hrefs as hrefs
@@ -16,7 +18,8 @@ import ieee_2030_5.models as m
 from ieee_2030_5.data.indexer import get_href
 from ieee_2030_5.server.base_request import RequestOp
 from ieee_2030_5.server.uuid_handler import UUIDHandler
-from ieee_2030_5.utils import dataclass_to_xml, xml_to_dataclass
+from ieee_2030_5.utils import stream_mirror_readings
+from ieee_2030_5.utils.xml_stream import STREAMED_ROOTS
 
 
 class Error(Exception):
@@ -29,71 +32,58 @@ class ResponseStatus:
     status: str
 
 
-class UsagePointRequest(RequestOp):
+_UPT_MR = (hrefs.UTP, hrefs.INDEX, "mr", hrefs.INDEX)
+_UPT_RS = _UPT_MR + ("rs", hrefs.INDEX)
 
-    def get(self) -> Response:
 
+class UsagePointRequest(RequestOp):
+
+    # HrefKey.shape -> method serving the GETs of hrefs of that shape, see HrefRouter.
+    GET_BY_SHAPE = {
+        _UPT_MR: "get_item",
+        _UPT_MR + ("rt", ): "get_reading_type",
+        _UPT_MR + ("rs", ): "get_ordered_list",
+        _UPT_RS: "get_item",
+        _UPT_MR + ("r", ): "get_ordered_list",
+        _UPT_MR + ("r", hrefs.INDEX): "get_item",
+        _UPT_RS + ("r", ): "get_ordered_list",
+        _UPT_RS + ("r", hrefs.INDEX): "get_item",
+    }
+
+    @staticmethod
+    def _get_resource_list(sort_by: List[str] = []) -> m.List_type:
         start = int(request.args.get("s", 0))
         limit = int(request.args.get("l", 1))
         after = int(request.args.get("a", 0))
-        parsed = hrefs.ParsedUsagePointHref(request.path)
-
-        handled = False
-        sort_by = []
-        reversed = True
-
-        if parsed.has_reading_list():
-            sort_by = "timePeriod.start"
-            if handled := parsed.reading_index is not None:
-                obj = adpt.ListAdapter.get(parsed.last_list(), parsed.reading_index)
-
-        elif parsed.has_reading_set_list():
-            sort_by = "timePeriod.start"
-            if handled := parsed.reading_set_index is not None:
-                obj = adpt.ListAdapter.get(parsed.last_list(), parsed.reading_set_index)
-
-        elif parsed.has_meter_reading_list():
-            if handled := parsed.has_reading_type():
-                obj = get_href(request.path)
-            elif handled := parsed.meter_reading_index is not None:
-                obj = adpt.ListAdapter.get(parsed.last_list(), parsed.meter_reading_index)
-        else:
-            obj = adpt.ListAdapter.get_resource_list(request.path,
-                                                     start=start,
-                                                     limit=limit,
-                                                     after=after,
-                                                     reverse=reversed)
-
-        if not handled:
-            obj = adpt.ListAdapter.get_resource_list(request.path,
-                                                     start=start,
-                                                     limit=limit,
-                                                     after=after,
-                                                     sort_by=sort_by,
-                                                     reverse=reversed)
-        # # /upt
-        # if not parsed.has_usage_point_index():
-        #     obj = adpt.UsagePointAdapter.fetch_all(m.UsagePointList(request.path),
-        #                                            start=start,
-        #                                            limit=limit,
-        #                                            after=after)
-        # elif parsed.has_meter_reading_list() and not parsed.meter_reading_index:
-        #     obj = adpt.MirrorUsagePointAdapter.fetch_all(m.MeterReadingList(request.path),
-        #                                                  start=start,
-        #                                                  limit=limit,
-        #                                                  after=after)
-
-        # else:
-        #     obj = adpt.UsagePointAdapter.fetch(parsed.usage_point_index)
-
-        # if parsed.has_extra():
-        #     obj = get_href(request.path)
-
+        return adpt.ListAdapter.get_resource_list(request.path,
+                                                  start=start,
+                                                  limit=limit,
+                                                  after=after,
+                                                  sort_by=sort_by,
+                                                  reverse=True)
+
+    def get_item(self) -> Response:
+        """A meter reading, reading set or reading by its index in its list."""
+        parsed = self.href
+        obj = adpt.ListAdapter.get(parsed.join(parsed.count() - 1), parsed.at(-1))
         return self.build_response_from_dataclass(obj)
 
+    def get_reading_type(self) -> Response:
+        return self.build_response_from_dataclass(get_href(request.path))
+
+    def get_ordered_list(self) -> Response:
+        """Reading set and reading lists, newest first."""
+        return self.build_response_from_dataclass(self._get_resource_list("timePeriod.start"))
+
+    def get(self) -> Response:
+        return self.build_response_from_dataclass(self._get_resource_list())
+
 
 class MirrorUsagePointRequest(RequestOp):
 
+    # HrefKey.shape -> method serving the GETs of hrefs of that shape, see HrefRouter.
+    GET_BY_SHAPE = {(hrefs.MUP, ): "get_list"}
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -103,45 +93,58 @@ class MirrorUsagePointRequest(RequestOp):
         if not pth_info.startswith(hrefs.DEFAULT_MUP_ROOT):
             raise ValueError(f"Invalid path for {self.__class__} {request.path}")
 
-        mup_href = hrefs.ParsedUsagePointHref(request.path)
+        # /mup_0
+        mup = adpt.ListAdapter.get(hrefs.DEFAULT_MUP_ROOT, self.href.at(1))
 
-        if not mup_href.has_usage_point_index():
-            # /mup
-            try:
-                mup: m.MirrorUsagePointList = adpt.ListAdapter.get_resource_list(request.path)
-            except KeyError:
-                adpt.ListAdapter.initialize_uri(request.path, m.MirrorUsagePoint)
+        return self.build_response_from_dataclass(mup)
+
+    def get_list(self) -> Response:
+        # /mup
+        try:
             mup: m.MirrorUsagePointList = adpt.ListAdapter.get_resource_list(request.path)
-            # Because our resource_list doesn't include other properties than the list we set
-            # them here before returning.
-            mup.pollRate = self.server_config.mirror_usage_point_post_rate
-        else:
-            # /mup_0
-            mup = adpt.ListAdapter.get(hrefs.DEFAULT_MUP_ROOT, mup_href.usage_point_index)
+        except KeyError:
+            adpt.ListAdapter.initialize_uri(request.path, m.MirrorUsagePoint)
+        mup: m.MirrorUsagePointList = adpt.ListAdapter.get_resource_list(request.path)
+        # Because our resource_list doesn't include other properties than the list we set
+        # them here before returning.
+        mup.pollRate = self.server_config.mirror_usage_point_post_rate
 
         return self.build_response_from_dataclass(mup)
 
     def post(self) -> Response:
-        xml = request.data.decode('utf-8')
-        data = xml_to_dataclass(request.data.decode('utf-8'))
-        data_type = type(data)
-        if data_type not in (m.MirrorUsagePoint, m.MirrorReadingSet, m.MirrorMeterReading):
-            raise BadRequest()
+        try:
+            stream = stream_mirror_readings(request.stream)
+        except XMLSyntaxError as ex:
+            raise BadRequest(str(ex))
 
         pth_info = request.path
         pths = pth_info.split(hrefs.SEP)
-        if len(pths) == 1 and data_type is not m.MirrorUsagePoint:
+        if len(pths) == 1 and stream.root_tag != "MirrorUsagePoint":
             # Check to make sure not a new mRID
             raise BadRequest("Must post MirrorUsagePoint to top level only")
 
-        # Creating a new mup
-        if data_type == m.MirrorUsagePoint:
-            if data.postRate is None:
-                data.postRate = self.server_config.mirror_usage_point_post_rate
-            result = adpt.create_mirror_usage_point(mup=data)
-            #result = adpt.MirrorUsagePointAdapter.create(mup=data)
-        else:
-            result = adpt.create_or_update_meter_reading(mup_href=request.path, mmr_input=data)
+        retention = None
+        if self.server_config.reading_retention_count is not None or \
+                self.server_config.reading_retention_seconds is not None:
+            retention = adpt.ReadingRetention(
+                max_count=self.server_config.reading_retention_count,
+                max_age=self.server_config.reading_retention_seconds)
+
+        try:
+            if stream.root_tag in STREAMED_ROOTS:
+                # Readings are stored as they are parsed so large bodies (e.g. bulk uploads
+                # of historical readings) aren't held in memory.
+                result = adpt.ingest_mirror_readings(request.path, stream, retention=retention)
+            elif stream.root_tag == "MirrorUsagePoint":
+                data = stream.parse_document(m.MirrorUsagePoint)
+                if data.postRate is None:
+                    data.postRate = self.server_config.mirror_usage_point_post_rate
+                result = adpt.create_mirror_usage_point(mup=data)
+                #result = adpt.MirrorUsagePointAdapter.create(mup=data)
+            else:
+                raise BadRequest()
+        except (XMLSyntaxError, ParserError, ValueError) as ex:
+            raise BadRequest(str(ex))
 
         if result.success:
             status = '204' if result.was_update == True else '201'
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import logging
+from typing import Dict, Tuple
+
 from blinker import Signal
 
 # from ieee_2030_5.adapters import BaseAdapter
 from ieee_2030_5.certs import TLSRepository, lfdi_from_fingerprint
 from ieee_2030_5.config import ServerConfiguration, DeviceConfiguration
+from ieee_2030_5.data.active_controls import ACTIVE, ActiveControlEngine
 from ieee_2030_5.data.indexer import add_href, get_href
 
 _log = logging.getLogger(__name__)
@@ -18,8 +21,12 @@ import ieee_2030_5.models as m
 def create_device_capability(end_device_index: int, device_cfg: DeviceConfiguration) -> m.DeviceCapability:
     """Create a device capability objecct for the passed device index
 
-    This function does not verify that there is a device at the passed index.
+    This function does not verify that there is a device at the passed index.  The device
+    capability already stored for the index (e.g. after a warm restart) is returned as is.
     """
+    if end_device_index < adpt.DeviceCapabilityAdapter.size():
+        return adpt.DeviceCapabilityAdapter.fetch(end_device_index)
+
     dcap_href = hrefs.DeviceCapabilityHref(end_device_index)
     device_capability = m.DeviceCapability()
     device_capability = dcap_href.fill_hrefs(device_capability)
@@ -87,10 +94,43 @@ def add_enddevice(device: m.EndDevice) -> m.EndDevice:
     return device
 
 
+# DERProgram href -> the engine tracking the program's active controls.
+_active_control_engines: Dict[str, ActiveControlEngine] = {}
+
+
+def get_active_control_engine(program: m.DERProgram) -> ActiveControlEngine:
+    """Return the engine tracking the active controls of the passed program."""
+    engine = _active_control_engines.get(program.href)
+    if engine is None:
+        engine = _active_control_engines[program.href] = ActiveControlEngine(program.primacy or 0)
+    return engine
+
+
+def _program_and_control(event: m.Event) -> Tuple[m.DERProgram, m.DERControl]:
+    href_parser = hrefs.HrefEventParser(event.href)
+
+    program = adpt.ListAdapter.get(hrefs.DEFAULT_DERP_ROOT, href_parser.program_index)
+    control = adpt.ListAdapter.get_item_by_prop(program.DERControlListLink.href, "mRID",
+                                                event.mRID)
+    control.EventStatus = event.EventStatus
+    return program, control
+
+
+def _store_active_controls(program: m.DERProgram, engine: ActiveControlEngine):
+    active = engine.active
+    add_href(
+        program.ActiveDERControlListLink.href,
+        m.DERControlList(href=program.ActiveDERControlListLink.href,
+                         DERControl=active,
+                         all=len(active),
+                         results=len(active)))
+
+
 def update_active_der_event_started(event: m.Event):
     """Event triggered when a DERControl event starts
 
-    Find the control and copy it to the ActiveDERControlList
+    Add the control to the program's active controls superseding the active controls it
+    overlaps with and store the resulting ActiveDERControlList.
 
     :param event: The control event
     :type event: m.Event
@@ -98,70 +138,99 @@ def update_active_der_event_started(event: m.Event):
 
     assert type(event) == m.DERControl
 
-    href_parser = hrefs.HrefEventParser(event.href)
-
-    program = adpt.ListAdapter.get(hrefs.DEFAULT_DERP_ROOT, href_parser.program_index)
-
-    control_list: m.DERControlList = adpt.ListAdapter.get_resource_list(
-        program.DERControlListLink.href)
-    control = next(filter(lambda x: x.mRID == event.mRID, control_list.DERControl))
-    control.EventStatus = event.EventStatus
+    program, control = _program_and_control(event)
     assert control.EventStatus.currentStatus == 1
-    adpt.ListAdapter.append(program.ActiveDERControlListLink.href, control)
 
-    add_href(control.href, control)
-    add_href(event.href, event)
-    add_href(control_list.href, control_list)
+    engine = get_active_control_engine(program)
+    for superseded in engine.start(control, control.EventStatus.dateTime):
+        _log.debug(f"{superseded.href} superseded by {control.href}")
 
-    activel: m.DERControlList = get_href(program.ActiveDERControlListLink.href)
-
-    try:
-        # TODO: if found deal with supersceded eventing.
-        next(filter(lambda x: x.mRID == event.mRID, activel.DERControl))
-    except StopIteration:
-        activel.DERControl.append(event)
-        add_href(program.ActiveDERControlListLink.href, activel)
+    _store_active_controls(program, engine)
 
 
 def update_active_der_event_ended(event: m.Event):
     """Event triggered when a DERControl event ends
 
-    Search over the ActiveDERControlListLink for the event that has been triggered
-    and remove it from the list.
+    Remove the control from the program's active controls and store the resulting
+    ActiveDERControlList.
 
     :param event: The control event
     :type event: m.Event
     """
     assert type(event) == m.DERControl
 
-    href_parser = hrefs.HrefEventParser(event.href)
+    program, control = _program_and_control(event)
 
-    program = adpt.ListAdapter.get(hrefs.DEFAULT_DERP_ROOT, href_parser.program_index)
+    engine = get_active_control_engine(program)
+    if engine.end(control):
+        _store_active_controls(program, engine)
 
-    control_list: m.DERControlList = adpt.ListAdapter.get_resource_list(
-        program.DERControlListLink.href)
-    control = next(filter(lambda x: x.mRID == event.mRID, control_list.DERControl))
-    control.EventStatus = event.EventStatus
-    add_href(control.href, control)
-    add_href(event.href, event)
-    add_href(control_list.href, control_list)
 
-    activel: m.DERControlList = get_href(program.ActiveDERControlListLink.href)
+adpt.TimeAdapter.event_started.connect(update_active_der_event_started)
+adpt.TimeAdapter.event_ended.connect(update_active_der_event_ended)
 
-    remove = []
-    for index, ctl in enumerate(activel.DERControl):
-        if ctl.mRID == event.mRID:
-            if event.EventStatus.currentStatus != 1:
-                remove.insert(0, index)
+# EventStatus.currentStatus of the stored controls that still have transitions to make,
+# i.e. not cancelled, superseded or complete.
+_SCHEDULABLE_STATUSES = (None, 0, ACTIVE)
 
-    for x in remove:
-        activel.DERControl.pop(x)
 
-    add_href(program.ActiveDERControlListLink.href, activel)
+def restore_der_controls() -> int:
+    """Track the DERControls loaded from storage again after a warm restart.
 
+    The controls that were active when the server stopped are added back to the active
+    control engine of their program before they are handed to the TimeAdapter.  The
+    TimeAdapter only signals transitions, so this way a control that is still active ends
+    on time and one that ended while the server was down ends as soon as it is added.
 
-adpt.TimeAdapter.event_started.connect(update_active_der_event_started)
-adpt.TimeAdapter.event_ended.connect(update_active_der_event_ended)
+    :return: The number of controls added to the TimeAdapter.
+    """
+    restored = 0
+    programs = {}
+    if adpt.ListAdapter.list_size(hrefs.DEFAULT_DERP_ROOT):
+        for program in adpt.ListAdapter.get_list(hrefs.DEFAULT_DERP_ROOT):
+            programs.setdefault(program.href, program)
+
+    for program in programs.values():
+        if program.DERControlListLink is None or \
+                not adpt.ListAdapter.list_size(program.DERControlListLink.href):
+            continue
+        controls = [
+            control for control in adpt.ListAdapter.get_list(program.DERControlListLink.href)
+            if control.EventStatus is None or
+            control.EventStatus.currentStatus in _SCHEDULABLE_STATUSES
+        ]
+        active = [
+            control for control in controls
+            if control.EventStatus is not None and control.EventStatus.currentStatus == ACTIVE
+        ]
+        if active:
+            engine = get_active_control_engine(program)
+            for control in sorted(active, key=lambda c: c.creationTime or 0):
+                engine.start(control, control.EventStatus.dateTime)
+            _store_active_controls(program, engine)
+
+        for control in controls:
+            adpt.TimeAdapter.add_event(control)
+            restored += 1
+
+    if restored:
+        _log.info(f"Restored {restored} scheduled DERControls")
+    return restored
+
+
+def _stored_program(program: m.DERProgram) -> m.DERProgram | None:
+    """The program stored under the DERProgram root matching program by mRID, or by
+    description when the program has no mRID.
+    """
+    prop, value = ("mRID", program.mRID)
+    if not value:
+        prop, value = ("description", program.description)
+    if value is None:
+        return None
+    try:
+        return adpt.ListAdapter.get_item_by_prop(hrefs.DEFAULT_DERP_ROOT, prop, value)
+    except adpt.NotFoundError:
+        return None
 
 def create_der_program_and_control(default_der_program: m.DERProgram,
                                    default_der_control: m.DefaultDERControl,
@@ -220,7 +289,9 @@ def initialize_2030_5(config: ServerConfiguration, tlsrepo: TLSRepository):
       </DER>
     </DERList
 
-
+    Anything already stored (a warm restart) is reconciled with the configuration rather
+    than created again: programs are matched by mRID or description, curves and devices by
+    href, and only the ones missing from the store are added.
     """
     _log.debug("Initializing 2030.5")
     _log.debug("Adding server level urls to cache")
@@ -229,12 +300,23 @@ def initialize_2030_5(config: ServerConfiguration, tlsrepo: TLSRepository):
 
     if config.cleanse_storage:
         adpt.clear_all_adapters()
+        _active_control_engines.clear()
 
     programs_by_description = {}
 
     adpt.ListAdapter.initialize_uri(hrefs.DEFAULT_DERP_ROOT, m.DERProgram)
 
-    if config.default_program:
+    if config.default_program and (stored := _stored_program(config.default_program)):
+        # Later configuration objects are created from the stored default program.
+        config.default_program = stored
+        if config.default_der_control and get_href(stored.DefaultDERControlLink.href):
+            config.default_der_control = get_href(stored.DefaultDERControlLink.href)
+        elif config.default_der_control:
+            config.default_der_control.mRID = adpt.GlobalmRIDs.new_mrid()
+            config.default_der_control.href = stored.DefaultDERControlLink.href
+            add_href(stored.DefaultDERControlLink.href, config.default_der_control)
+
+    elif config.default_program:
 
         index = adpt.ListAdapter.list_size(hrefs.DEFAULT_DERP_ROOT)
 
@@ -270,6 +352,11 @@ def initialize_2030_5(config: ServerConfiguration, tlsrepo: TLSRepository):
         # Pop off default_der_control if specified.
         default_der_control = program_cfg.pop("DefaultDERControl", None)
         program = m.DERProgram(**program_cfg)
+        if default_der_control is not None:
+            program_cfg["DefaultDERControl"] = default_der_control
+        if stored := _stored_program(program):
+            programs_by_description[stored.description] = stored
+            continue
         if not program.mRID:
             program.mRID = adpt.GlobalmRIDs.new_mrid()
         program = program_hrefs.fill_hrefs(program)
@@ -326,11 +413,19 @@ def initialize_2030_5(config: ServerConfiguration, tlsrepo: TLSRepository):
         curve = m.DERCurve(href=hrefs.SEP.join([hrefs.DEFAULT_CURVE_ROOT,
                                                 str(index)]),
                            **curve_cfg)
+        try:
+            adpt.ListAdapter.get_item_by_prop(hrefs.DEFAULT_CURVE_ROOT, "href", curve.href)
+            continue
+        except adpt.NotFoundError:
+            pass
         if not curve.mRID:
             curve.mRID = adpt.GlobalmRIDs.new_mrid()
         adpt.ListAdapter.append(hrefs.DEFAULT_CURVE_ROOT, curve)
 
-    der_global_count = 0
+    # DERs of the devices already stored keep their hrefs.
+    der_global_count = sum(
+        adpt.ListAdapter.list_size(hrefs.EndDeviceHref(index).der_list)
+        for index in range(adpt.EndDeviceAdapter.size()))
 
     for index, cfg_device in enumerate(config.devices):
 
@@ -344,6 +439,7 @@ def initialize_2030_5(config: ServerConfiguration, tlsrepo: TLSRepository):
             end_device.sFDI = tlsrepo.sfdi(cfg_device.id)
             end_device.postRate = cfg_device.post_rate
             adpt.EndDeviceAdapter.put(index, end_device)
+            adpt.GlobalmRIDs.add_item_with_mrid(cfg_device.id, end_device)
         else:
             _log.debug(f"Adding end device {cfg_device.id} to server")
             end_device = m.EndDevice(lFDI=tlsrepo.lfdi(cfg_device.id),
@@ -4,7 +4,7 @@ import json
 import logging
 from datetime import datetime, timedelta
 from http.client import BAD_REQUEST
-from typing import Optional
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 
 import pytz
 import tzlocal
@@ -19,6 +19,7 @@ import ieee_2030_5.models as m
 from ieee_2030_5.certs import TLSRepository
 from ieee_2030_5.config import ServerConfiguration
 from ieee_2030_5.data.indexer import get_href, get_href_filtered
+from ieee_2030_5.data.response_cache import response_cache
 from ieee_2030_5.server.base_request import RequestOp
 from ieee_2030_5.server.dcapfs import Dcap
 from ieee_2030_5.server.derfs import DERProgramRequests, DERRequests
@@ -28,7 +29,7 @@ from ieee_2030_5.server.meteringfs import (MirrorUsagePointRequest, UsagePointRe
 from ieee_2030_5.server.timefs import TimeRequest
 from ieee_2030_5.server.uuid_handler import UUIDHandler
 from ieee_2030_5.types_ import TimeOffsetType, format_time
-from ieee_2030_5.utils import dataclass_to_xml, xml_to_dataclass
+from ieee_2030_5.utils import dataclass_to_xml, warm_xml_parsers, xml_to_dataclass
 
 _log = logging.getLogger(__name__)
 
@@ -71,6 +72,54 @@ class RegexConverter(BaseConverter):
         _log.debug(f"regex is {self.regex}")
 
 
+class HrefRouter:
+    """
+    Dispatches the requests for hrefs below the roots of the function sets (/edev_0_der_0,
+    /mup_1, ...) by the root and shape (see hrefs.HrefKey) of the href rather than by trying
+    a url rule per function set.
+
+    A view added for a shape serves the requests of its methods for the hrefs of that shape,
+    any other request below the root goes to the view added for the root.
+    """
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, Optional[tuple]],
+                           Tuple[Callable[[str], Response], FrozenSet[str]]] = {}
+
+    @property
+    def methods(self) -> Set[str]:
+        return {method for _, methods in self._routes.values() for method in methods}
+
+    @property
+    def rule(self) -> str:
+        """The url rule matching the hrefs of all the roots that were added."""
+        roots = "|".join(sorted({root for root, _ in self._routes}, key=len, reverse=True))
+        return f"/<regex('({roots})({hrefs.SEP}{hrefs.MATCH_REG})?'):path>"
+
+    def add(self,
+            root: str,
+            view_func: Callable[[str], Response],
+            methods: List[str],
+            shape: Optional[tuple] = None):
+        self._routes[(root, shape)] = (view_func, frozenset(methods))
+
+    @staticmethod
+    def _allows(methods: FrozenSet[str]) -> bool:
+        return request.method in methods or (request.method == "HEAD" and "GET" in methods)
+
+    def dispatch(self, path: str) -> Response:
+        key = hrefs.parse_href(path)
+        route = self._routes.get((key.root, key.shape))
+        if route is None or not self._allows(route[1]):
+            route = self._routes.get((key.root, None))
+        if route is None:
+            raise werkzeug.exceptions.NotFound()
+        view_func, methods = route
+        if not self._allows(methods):
+            raise werkzeug.exceptions.MethodNotAllowed(valid_methods=sorted(methods))
+        return view_func(path)
+
+
 class ServerEndpoints:
 
     def __init__(self, app: Flask, tls_repo: TLSRepository, config: ServerConfiguration):
@@ -78,6 +127,9 @@ class ServerEndpoints:
         self.config = config
         self.tls_repo = tls_repo
         self.mimetype = "text/xml"
+        response_cache.max_bytes = config.response_cache_max_bytes
+        response_cache.max_entry_bytes = config.response_cache_max_entry_bytes
+        warm_xml_parsers()
         self.app: Flask = app
         self.app.url_map.converters['regex'] = RegexConverter
 
@@ -94,32 +146,26 @@ class ServerEndpoints:
 
         # All the energy devices
         #app.add_url_rule(f"/{hrefs.EDEV}", methods=["GET", "POST", "PUT"], view_func=self._edev)
-        app.add_url_rule(f"/<regex('{hrefs.EDEV}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._edev,
-                         methods=["GET", "PUT", "POST"])
-        # This rule must be before der
-        app.add_url_rule(f"/<regex('{hrefs.DER_PROGRAM}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._derp,
-                         methods=["GET"])
-        app.add_url_rule(f"/<regex('{hrefs.DER}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._der,
-                         methods=["GET", "PUT"])
-        app.add_url_rule(f"/<regex('{hrefs.MUP}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._mup,
-                         methods=["GET", "POST"])
-        app.add_url_rule(f"/<regex('{hrefs.UTP}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._upt,
-                         methods=["GET", "POST"])
-        app.add_url_rule(f"/<regex('{hrefs.CURVE}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._curves,
-                         methods=["GET"])
-
-        app.add_url_rule(f"/<regex('{hrefs.FSA}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._fsa,
-                         methods=["GET"])
-        app.add_url_rule(f"/<regex('{hrefs.LOG}{hrefs.MATCH_REG}'):path>",
-                         view_func=self._log,
-                         methods=["GET", "POST"])
+        # The function sets below share a single rule, the router picks the view by the root
+        # of the href.
+        self.router = HrefRouter()
+        self.router.add(hrefs.EDEV, self._edev, ["GET", "PUT", "POST"])
+        self._add_shapes(hrefs.EDEV, EDevRequests)
+        self.router.add(hrefs.DER_PROGRAM, self._derp, ["GET"])
+        self._add_shapes(hrefs.DER_PROGRAM, DERProgramRequests)
+        self.router.add(hrefs.DER, self._der, ["GET", "PUT"])
+        self.router.add(hrefs.MUP, self._mup, ["GET", "POST"])
+        self._add_shapes(hrefs.MUP, MirrorUsagePointRequest)
+        self.router.add(hrefs.UTP, self._upt, ["GET", "POST"])
+        self._add_shapes(hrefs.UTP, UsagePointRequest)
+        self.router.add(hrefs.CURVE, self._curves, ["GET"])
+        self.router.add(hrefs.FSA, self._fsa, ["GET"])
+        self.router.add(hrefs.LOG, self._log, ["GET", "POST"])
+        _log.debug(f"Adding rule: {self.router.rule} methods: {sorted(self.router.methods)}")
+        app.add_url_rule(self.router.rule,
+                         endpoint="hrefs",
+                         view_func=self.router.dispatch,
+                         methods=sorted(self.router.methods))
         # rulers = (
         #     (hrefs.der_urls, self._der),
         #     #(hrefs.edev_urls, self._edev),
@@ -155,6 +201,15 @@ class ServerEndpoints:
         #     self.add_endpoint(hrefs.edev + f"/{index}", view_func=self._edev)
         #     self.add_endpoint(hrefs.mup + f"/{index}", view_func=self._mup)
 
+    def _add_shapes(self, root: str, op_class: type):
+        """Route the GETs of the shapes in op_class.GET_BY_SHAPE to the method named there."""
+        for shape, handler in op_class.GET_BY_SHAPE.items():
+
+            def view(path: str, handler: str = handler) -> Response:
+                return getattr(op_class(server_endpoints=self), handler)()
+
+            self.router.add(root, view, ["GET"], shape)
+
     def _log(self, path):
         return
 
@@ -177,7 +232,6 @@ class ServerEndpoints:
     def _mup(self, path) -> Response:
         return MirrorUsagePointRequest(server_endpoints=self).execute()
 
-    # Needs to be before der
     def _derp(self, path) -> Response:
         return DERProgramRequests(server_endpoints=self).execute()
 
@@ -2,25 +2,30 @@ import base64
 import uuid
 from dataclasses import dataclass, fields
 from pathlib import Path
-from typing import Optional, Type
+from typing import BinaryIO, Optional, Type
 
-from xsdata.formats.dataclass.context import XmlContext
 from xsdata.formats.dataclass.parsers.config import ParserConfig
-from xsdata.formats.dataclass.parsers.xml import XmlParser
 from xsdata.formats.dataclass.serializers import XmlSerializer
 from xsdata.formats.dataclass.serializers.config import SerializerConfig
 from xsdata.formats.dataclass.parsers.handlers import LxmlEventHandler
 
 from ieee_2030_5.models.sep import EndDevice, EndDeviceList
+from ieee_2030_5.utils.xml_parsers import ParserPool, SepXmlContext
+from ieee_2030_5.utils.xml_stream import MirrorReadingStream
+from ieee_2030_5.utils.xml_writer import CompactXmlWriter
 
-__xml_context__ = XmlContext()
+__xml_context__ = SepXmlContext()
 __parser_config__ = ParserConfig(fail_on_unknown_attributes=True, fail_on_unknown_properties=True)
-__xml_parser__ = XmlParser(config=__parser_config__,
-                           context=__xml_context__,
-                           handler=LxmlEventHandler)
+__xml_parsers__ = ParserPool(config=__parser_config__,
+                             context=__xml_context__,
+                             handler=LxmlEventHandler)
 __config__ = SerializerConfig(xml_declaration=False, pretty_print=True)
 __serializer__ = XmlSerializer(config=__config__)
 __ns_map__ = {None: "urn:ieee:std:2030.5:ns"}
+__compact_serializer__ = XmlSerializer(config=SerializerConfig(xml_declaration=False),
+                                       context=__xml_context__)
+__compact_writer__ = CompactXmlWriter(
+    __xml_context__, lambda obj: __compact_serializer__.render(obj, ns_map=__ns_map__))
 
 import ieee_2030_5.types_ as t
 import ieee_2030_5.utils as tls
@@ -52,19 +57,32 @@ class CADoesNotExist(Exception):
         return "The CA certificate does not exist!"
 
 
-def serialize_dataclass(obj: dataclass) -> str:
+def serialize_dataclass(obj: dataclass, pretty_print: bool = False) -> str:
     """
     Serializes a dataclass that was created via xsdata to an xml string for
     returning to a client.
+
+    The compact form is written by the precompiled CompactXmlWriter, pretty_print
+    is meant for showing the xml to people.
     """
-    return __serializer__.render(obj, ns_map=__ns_map__)
+    if pretty_print:
+        return __serializer__.render(obj, ns_map=__ns_map__)
+    return __compact_writer__.render(obj)
+
+
+def warm_xml_parsers():
+    """Build the metadata of the 2030.5 models up front rather than on the first request."""
+    __xml_context__.warm()
 
 
 def xml_to_dataclass(xml: str, type: Optional[Type] = None) -> dataclass:
     """
     Parse the xml passed and return result from loaded classes.
+
+    When the expected type is known pass it so the root element doesn't have to be looked up,
+    a ParserError is raised if the xml is of another type.
     """
-    parsed = __xml_parser__.from_string(xml, type)
+    parsed = __xml_parsers__.from_string(xml, type)
 
     # The xml parser from string seems to double decode the lfDI which
     # probably means I am doing something wrong.  However, this fixes
@@ -80,8 +98,15 @@ def xml_to_dataclass(xml: str, type: Optional[Type] = None) -> dataclass:
     return parsed
 
 
-def dataclass_to_xml(dc: dataclass) -> str:
-    return serialize_dataclass(dc)
+def stream_mirror_readings(source: BinaryIO) -> MirrorReadingStream:
+    """
+    Start parsing a mirror metering body from source incrementally, see MirrorReadingStream.
+    """
+    return MirrorReadingStream(source, __xml_parsers__.parser)
+
+
+def dataclass_to_xml(dc: dataclass, pretty_print: bool = False) -> str:
+    return serialize_dataclass(dc, pretty_print)
 
 
 def get_lfdi_from_cert(path: Path) -> t.Lfdi:
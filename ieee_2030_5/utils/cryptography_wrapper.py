@@ -1,5 +1,6 @@
 import datetime
 from pathlib import Path
+from typing import Tuple
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import ec
@@ -217,6 +218,51 @@ class CryptographyWrapper(TLSWrap):
             cert.public_bytes(serialization.Encoding.PEM)
         )
 
+    @staticmethod
+    def tls_create_signed_credentials(common_name: str,
+                                      ca_key: ec.EllipticCurvePrivateKey,
+                                      ca_cert: x509.Certificate,
+                                      serial_number: int,
+                                      days: int = 365) -> Tuple[bytes, x509.Certificate]:
+        """
+        Create a private key and a certificate for it signed by the ca, in memory.
+
+        The certificate matches the ones signed with ``openssl ca`` using the repository's
+        openssl.cnf (subject /C=US/CN=common_name, sha256, valid for days).
+
+        Args:
+            common_name:
+            ca_key:
+            ca_cert:
+            serial_number:
+            days:
+
+        Returns:
+            The PEM encoded private key and the certificate.
+        """
+        pk = ec.generate_private_key(ec.SECP256R1())
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = x509.CertificateBuilder().subject_name(
+                    x509.Name([
+                        x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
+                        x509.NameAttribute(NameOID.COMMON_NAME, common_name.split(":")[0])
+                    ])
+                ).issuer_name(
+                    ca_cert.subject
+                ).public_key(
+                    pk.public_key()
+                ).serial_number(
+                    serial_number
+                ).not_valid_before(
+                    now
+                ).not_valid_after(
+                    now + datetime.timedelta(days=days)
+                ).sign(ca_key, hashes.SHA256())
+        key_pem = pk.private_bytes(encoding=serialization.Encoding.PEM,
+                                   format=serialization.PrivateFormat.TraditionalOpenSSL,
+                                   encryption_algorithm=serialization.NoEncryption())
+        return key_pem, cert
+
     @staticmethod
     def tls_get_fingerprint_from_cert(cert_file: Path, algorithm: str = "sha256"):
         """
@@ -0,0 +1,151 @@
+"""
+TLS session resumption for the server and the client.
+
+Devices that reconnect for every poll pay for a full mutual TLS handshake (certificate
+verification and an ECDHE key exchange on both sides) every time unless the session is
+resumed.  The server hands out session tickets so resuming doesn't need a server side cache,
+the client keeps the sessions it can resume in a ClientSessionCache.  HandshakeStats counts the
+handshakes of either side and how many of them were resumed.
+"""
+from __future__ import annotations
+
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+# IEEE 2030.5 requires TLS_ECDHE_ECDSA_WITH_AES_128_CCM_8, the GCM suites follow for peers
+# that don't support CCM_8.  Only applies up to TLS 1.2, TLS 1.3 has its own suites.
+DEFAULT_CIPHERS = ":".join([
+    "ECDHE-ECDSA-AES128-CCM8",
+    "ECDHE-ECDSA-AES128-GCM-SHA256",
+    "ECDHE-ECDSA-AES256-GCM-SHA384",
+    "ECDHE-ECDSA-CHACHA20-POLY1305",
+])
+# secp256r1, the curve 2030.5 requires for ECDHE.
+DEFAULT_ECDH_CURVE = "prime256v1"
+
+
+def tune_ssl_context(context: ssl.SSLContext,
+                     ciphers: Optional[str] = DEFAULT_CIPHERS,
+                     ecdh_curve: Optional[str] = DEFAULT_ECDH_CURVE,
+                     session_tickets: bool = True,
+                     tickets_per_handshake: int = 2) -> ssl.SSLContext:
+    """
+    Set the cipher and curve preferences and session resumption of context.
+
+    :param ciphers: OpenSSL cipher list in order of preference, the server's order is used.
+                    None leaves the default list.
+    :param ecdh_curve: The curve used for ECDHE, None leaves the default curves.
+    :param session_tickets: Allow sessions to be resumed with session tickets.
+    :param tickets_per_handshake: The number of TLS 1.3 tickets a server sends after a
+                                  handshake, 0 to turn off TLS 1.3 resumption.
+    """
+    if ciphers:
+        context.set_ciphers(ciphers)
+    if ecdh_curve:
+        context.set_ecdh_curve(ecdh_curve)
+    context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE
+    if session_tickets:
+        context.options &= ~ssl.OP_NO_TICKET
+    else:
+        context.options |= ssl.OP_NO_TICKET
+    if context.protocol == ssl.PROTOCOL_TLS_SERVER:
+        context.num_tickets = tickets_per_handshake if session_tickets else 0
+    return context
+
+
+class HandshakeStats:
+    """Thread safe counts of completed (full or resumed) and failed TLS handshakes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.full = 0
+            self.resumed = 0
+            self.failed = 0
+            self._started = time.monotonic()
+
+    def record(self, resumed: bool):
+        with self._lock:
+            if resumed:
+                self.resumed += 1
+            else:
+                self.full += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    @property
+    def handshakes(self) -> int:
+        return self.full + self.resumed
+
+    @property
+    def resumption_ratio(self) -> float:
+        """The fraction of the completed handshakes that resumed a session."""
+        handshakes = self.handshakes
+        return self.resumed / handshakes if handshakes else 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """The counts along with the resumption ratio and handshakes per second since reset."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            handshakes = self.full + self.resumed
+            return dict(handshakes=handshakes,
+                        full=self.full,
+                        resumed=self.resumed,
+                        failed=self.failed,
+                        resumption_ratio=self.resumed / handshakes if handshakes else 0.0,
+                        handshakes_per_second=handshakes / elapsed if elapsed else 0.0)
+
+
+class ClientSessionCache:
+    """
+    The most recently used TLS sessions of a client, by server.
+
+    Sessions are tied to the certificate the client authenticated with so the key should
+    identify it as well as the server when a cache is shared by clients.
+
+    :param size: The number of sessions kept, the least recently used are dropped first.
+    :param lifetime: Seconds a session is resumed for, the server's lifetime of the session
+                     is used when it's shorter.
+    """
+
+    def __init__(self, size: int = 256, lifetime: float = 3600.0):
+        self.size = size
+        self.lifetime = lifetime
+        self._sessions: OrderedDict[Hashable, ssl.SSLSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[ssl.SSLSession]:
+        """The session to resume with the server of key, None if there isn't a valid one."""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if session.time + min(self.lifetime, session.timeout) <= time.time():
+                del self._sessions[key]
+                return None
+            self._sessions.move_to_end(key)
+            return session
+
+    def put(self, key: Hashable, session: Optional[ssl.SSLSession]):
+        if session is None or self.size <= 0:
+            return
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.size:
+                self._sessions.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
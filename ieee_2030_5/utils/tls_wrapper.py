@@ -1,5 +1,9 @@
 import subprocess
 from pathlib import Path
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+
 from ieee_2030_5.utils import TLSWrap
 import logging
 
@@ -93,17 +97,13 @@ class OpensslWrapper(TLSWrap):
 
     @staticmethod
     def tls_get_fingerprint_from_cert(cert_file: Path, algorithm: str = "sha256") -> str:
-        OpensslWrapper.__set_cnf_from_cert_path___(cert_file)
-        if algorithm == "sha256":
-            algorithm = "-sha256"
-        else:
+        # Same output as openssl x509 -noout -fingerprint -sha256 without starting a process
+        # for every certificate.
+        if algorithm != "sha256":
             raise NotImplementedError()
 
-        cmd = ["openssl", "x509", "-in", str(cert_file), "-noout", "-fingerprint", algorithm]
-        ret_value = subprocess.check_output(cmd, text=True)
-        if "=" in ret_value:
-            ret_value = ret_value.split("=")[1].strip()
-        return ret_value
+        cert = x509.load_pem_x509_certificate(Path(cert_file).read_bytes())
+        return cert.fingerprint(hashes.SHA256()).hex(":").upper()
 
     @staticmethod
     def tls_create_pkcs23_pem_and_cert(private_key_file: Path, cert_file: Path,
@@ -0,0 +1,118 @@
+"""
+Thread safe parsing of the 2030.5 models.
+
+An xsdata XmlParser keeps state while parsing (the prefix map of the document) so a single
+parser can't be shared by the threads of the server.  The XmlContext can be, once the metadata
+of the classes has been built, but its lookup of the root class rebuilds its type index
+whenever a module has been imported since the last lookup, which is both slow and not safe
+while another thread is reading it.
+
+SepXmlContext resolves the 2030.5 types from an index built once, and ParserPool hands each
+thread its own parser over the shared context.  Callers that know the type of the document
+(e.g. the PUT of a DER resource) pass it to skip the lookup, the root element is still checked
+against it.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import is_dataclass
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Type
+
+from xsdata.exceptions import ParserError
+from xsdata.formats.dataclass.context import XmlContext
+from xsdata.formats.dataclass.parsers.config import ParserConfig
+from xsdata.formats.dataclass.parsers.handlers import LxmlEventHandler
+from xsdata.formats.dataclass.parsers.mixins import XmlHandler, XmlNode
+from xsdata.formats.dataclass.parsers.utils import ParserUtils
+from xsdata.formats.dataclass.parsers.xml import XmlParser
+
+import ieee_2030_5.models.sep as sep
+
+
+class SepXmlContext(XmlContext):
+    """
+    XmlContext that finds the classes of the 2030.5 models without scanning the loaded modules.
+
+    The metadata of every class of the models is built once, by warm or on the first lookup.
+    Types that aren't part of the models are looked up by the XmlContext.
+    """
+
+    def __init__(self, models: ModuleType = sep, **kwargs):
+        super().__init__(**kwargs)
+        self._models = models
+        self._sep_types: Optional[Dict[str, Type]] = None
+        self._warm_lock = threading.Lock()
+
+    def warm(self) -> Dict[str, Type]:
+        """Build the metadata of all the model classes and the index of their qualified names."""
+        with self._warm_lock:
+            if self._sep_types is None:
+                types: Dict[str, Type] = {}
+                ambiguous = set()
+                for clazz in vars(self._models).values():
+                    if not isinstance(clazz, type) or not is_dataclass(clazz):
+                        continue
+                    meta = self.build(clazz)
+                    for qname in {meta.qname, meta.target_qname} - {None}:
+                        if types.setdefault(qname, clazz) is not clazz:
+                            ambiguous.add(qname)
+                for qname in ambiguous:
+                    del types[qname]
+                self._sep_types = types
+        return self._sep_types
+
+    def find_types(self, qname: str) -> List[Type]:
+        sep_types = self._sep_types if self._sep_types is not None else self.warm()
+        clazz = sep_types.get(qname)
+        if clazz is not None:
+            return [clazz]
+        return super().find_types(qname)
+
+
+class CheckedRootXmlParser(XmlParser):
+    """XmlParser that fails when the root element doesn't match the class it was told to parse."""
+
+    def start(self, clazz: Optional[Type], queue: List[XmlNode], objects: List, qname: str,
+              attrs: Dict, ns_map: Dict):
+        if not queue and clazz is not None and ParserUtils.xsi_type(attrs, ns_map) is None:
+            expected = self.context.build(clazz).qname
+            if expected != qname:
+                raise ParserError(f"Expected root element {expected} not {qname}")
+        super().start(clazz, queue, objects, qname, attrs, ns_map)
+
+
+class ParserPool:
+    """
+    Provides an XmlParser per thread, all sharing one SepXmlContext.
+
+    :param config: The configuration of the parsers.
+    :param context: The context shared by the parsers, a SepXmlContext by default.
+    :param handler: The xsdata event handler the parsers use.
+    """
+
+    def __init__(self,
+                 config: ParserConfig,
+                 context: Optional[XmlContext] = None,
+                 handler: Type[XmlHandler] = LxmlEventHandler):
+        self.config = config
+        self.context = context if context is not None else SepXmlContext()
+        self.handler = handler
+        self._local = threading.local()
+
+    @property
+    def parser(self) -> CheckedRootXmlParser:
+        """The parser of the calling thread."""
+        try:
+            return self._local.parser
+        except AttributeError:
+            parser = self._local.parser = CheckedRootXmlParser(config=self.config,
+                                                               context=self.context,
+                                                               handler=self.handler)
+            return parser
+
+    def from_string(self, xml: str, clazz: Optional[Type] = None) -> Any:
+        return self.parser.from_string(xml, clazz)
+
+    def from_bytes(self, xml: bytes, clazz: Optional[Type] = None) -> Any:
+        return self.parser.from_bytes(xml, clazz)
@@ -0,0 +1,113 @@
+"""
+Incremental parsing of mirror metering bodies.
+
+A MirrorMeterReadingList, MirrorMeterReading or MirrorReadingSet body can hold a large
+number of readings (e.g. a bulk upload of historical data).  Rather than building the whole
+object tree, MirrorReadingStream walks the body with lxml's iterparse and yields each
+meter reading and reading set (without their readings) followed by their readings one at
+a time.  Elements are removed from the tree once they have been yielded so memory use
+doesn't depend on the size of the body.
+"""
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import IO, Any, Iterator, List, Optional, Tuple
+
+from lxml import etree
+from xsdata.formats.dataclass.parsers.xml import XmlParser
+
+import ieee_2030_5.models as m
+
+_CONTAINERS = {
+    "MirrorMeterReadingList": None,
+    "MirrorMeterReading": m.MirrorMeterReading,
+    "MirrorReadingSet": m.MirrorReadingSet
+}
+STREAMED_ROOTS = tuple(_CONTAINERS)
+
+
+class _Container:
+
+    def __init__(self, element: etree._Element):
+        self.element = element
+        self.name = etree.QName(element).localname
+        # List containers don't have a header to yield.
+        self.started = _CONTAINERS[self.name] is None
+
+
+class MirrorReadingStream:
+    """
+    Iterates over a mirror metering body as ``(kind, value)`` pairs.
+
+    kind is ``MirrorMeterReading`` or ``MirrorReadingSet`` with the object holding what came
+    before its first reading set or reading, ``Reading`` with a single reading of the last
+    started meter reading or reading set, or ``end`` when the last started meter reading or
+    reading set is complete, with the object holding everything but its reading sets and
+    readings.  The ReadingType of a MirrorMeterReading follows its readings so it's only
+    available at the end.
+
+    :param source: File like object the body is read from.
+    :param parser: The xsdata parser used for each object.
+    """
+
+    def __init__(self, source: IO[bytes], parser: XmlParser):
+        self._parser = parser
+        self._events = etree.iterparse(source,
+                                       events=("start", "end"),
+                                       resolve_entities=False,
+                                       no_network=True)
+        _, self._root = next(self._events)
+        self.root_tag = etree.QName(self._root).localname
+
+    def parse_document(self, clazz: Optional[type] = None) -> Any:
+        """Read the rest of the body and parse it as a whole, for bodies that aren't streamed."""
+        for _ in self._events:
+            pass
+        return self._parser.parse(self._root, clazz)
+
+    def _header(self, container: _Container, until: Optional[etree._Element] = None) -> Any:
+        element = container.element
+        header = etree.Element(element.tag, element.attrib, nsmap=element.nsmap)
+        # Children after until may already be in the tree (read ahead) but aren't complete.
+        for child in element:
+            if child is until:
+                break
+            header.append(deepcopy(child))
+        return self._parser.parse(header, _CONTAINERS[container.name])
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        if self.root_tag not in _CONTAINERS:
+            raise ValueError(f"{self.root_tag} can't be streamed")
+
+        containers: List[_Container] = [_Container(self._root)]
+        for event, element in self._events:
+            current = containers[-1]
+            if element.getparent() is not current.element and element is not current.element:
+                continue
+            name = etree.QName(element).localname
+
+            if event == "start":
+                if name not in _CONTAINERS and name != "Reading":
+                    continue
+                if not current.started:
+                    # Everything before the first reading set or reading is the header.
+                    current.started = True
+                    yield current.name, self._header(current, until=element)
+                if name in _CONTAINERS:
+                    containers.append(_Container(element))
+
+            elif element is current.element:
+                containers.pop()
+                if current.name != "MirrorMeterReadingList":
+                    # The readings and reading sets have been removed so what is left is the
+                    # whole header, including what came after the readings (ReadingType).
+                    header = self._header(current)
+                    if not current.started:
+                        yield current.name, header
+                    yield "end", header
+                if containers:
+                    containers[-1].element.remove(element)
+
+            elif name == "Reading":
+                yield "Reading", self._parser.parse(element, m.Reading)
+                current.element.remove(element)
@@ -0,0 +1,177 @@
+"""
+Compact XML writer for the 2030.5 models.
+
+xsdata's XmlSerializer looks up the metadata of every object and dispatches every value
+through its generic event machinery, on every call.  The writer here builds a plan per
+dataclass once (attribute and element order, tag names, value formats) from the same xsdata
+metadata and then writes straight to a list of strings.  The output is the same as the
+compact (not pretty printed) output of the XmlSerializer with the lxml writer.
+
+Models using features the plans don't cover (wildcards, compound elements, nillable or
+tokens fields, elements outside the 2030.5 namespace) are written by the fallback
+serializer instead.
+"""
+from __future__ import annotations
+
+from dataclasses import is_dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from xsdata.formats.converter import converter
+from xsdata.formats.dataclass.context import XmlContext
+from xsdata.utils.namespaces import split_qname
+
+SEP_NAMESPACE = "urn:ieee:std:2030.5:ns"
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+
+_TEXT_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+_ATTR_ESCAPES = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "\n": "&#10;",
+    "\r": "&#13;",
+    "\t": "&#9;"
+})
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Element(NamedTuple):
+    name: str
+    tag: str
+    format: Optional[str]
+    types: FrozenSet[type]
+    clazz: Optional[type]
+    list_element: bool
+
+
+class _Plan(NamedTuple):
+    tag: str
+    type_name: Optional[str]
+    # (field name, attribute name, format)
+    attributes: Tuple[Tuple[str, str, Optional[str]], ...]
+    elements: Tuple[_Element, ...]
+
+
+def _encode(value: Any, fmt: Optional[str]) -> str:
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type is int:
+        return str(value)
+    if value_type is bool:
+        return "true" if value else "false"
+    if value_type is bytes and fmt == "base16":
+        return value.hex().upper()
+    return converter.serialize(value, format=fmt)
+
+
+class CompactXmlWriter:
+    """
+    Writes 2030.5 dataclasses as compact XML using a precompiled plan per class.
+
+    :param context: The xsdata context to take the class metadata from.
+    :param fallback: Renders objects the plans don't support.
+    """
+
+    def __init__(self, context: XmlContext, fallback: Callable[[Any], str]):
+        self._context = context
+        self._fallback = fallback
+        self._plans: Dict[type, Optional[_Plan]] = {}
+
+    def render(self, obj: Any) -> str:
+        try:
+            out: List[str] = []
+            plan = self._plan(type(obj))
+            self._write(obj, plan, plan.tag, f' xmlns="{SEP_NAMESPACE}"', "", False, out)
+            return "".join(out)
+        except _Unsupported:
+            return self._fallback(obj)
+
+    def _plan(self, cls: type) -> _Plan:
+        try:
+            plan = self._plans[cls]
+        except KeyError:
+            plan = self._plans[cls] = self._build_plan(cls)
+        if plan is None:
+            raise _Unsupported(cls)
+        return plan
+
+    def _build_plan(self, cls: type) -> Optional[_Plan]:
+        meta = self._context.build(cls)
+        namespace, tag = split_qname(meta.qname)
+        if namespace != SEP_NAMESPACE or meta.nillable:
+            return None
+
+        type_name = None
+        if meta.target_qname:
+            namespace, type_name = split_qname(meta.target_qname)
+            if namespace != SEP_NAMESPACE:
+                type_name = None
+
+        attributes = []
+        for var in meta.get_attribute_vars():
+            namespace, name = split_qname(var.qname)
+            if not var.is_attribute or var.tokens or namespace:
+                return None
+            attributes.append((var.name, name, var.format))
+
+        elements = []
+        for var in meta.get_element_vars():
+            if not var.is_element or var.mixed or var.tokens or var.sequential or \
+                    var.nillable or var.wrapper or var.any_type:
+                return None
+            namespace, name = split_qname(var.qname)
+            if namespace != SEP_NAMESPACE:
+                return None
+            elements.append(
+                _Element(var.name, name, var.format, frozenset(var.types), var.clazz,
+                         bool(var.list_element)))
+
+        return _Plan(tag, type_name, tuple(attributes), tuple(elements))
+
+    def _write(self, obj: Any, plan: _Plan, tag: str, declarations: str, xsi_type: str,
+               xsi_declared: bool, out: List[str]):
+        out.append(f"<{tag}{declarations}")
+        for name, attribute, fmt in plan.attributes:
+            value = getattr(obj, name)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                raise _Unsupported(name)
+            out.append(f' {attribute}="{_encode(value, fmt).translate(_ATTR_ESCAPES)}"')
+        out.append(f"{xsi_type}>")
+        start = len(out)
+
+        for element in plan.elements:
+            value = getattr(obj, element.name)
+            if value is None:
+                continue
+            values = value if element.list_element and isinstance(value, list) else (value,)
+            for value in values:
+                if value is None:
+                    raise _Unsupported(element.name)
+                if not is_dataclass(value):
+                    text = _encode(value, element.format).translate(_TEXT_ESCAPES)
+                    out.append(f"<{element.tag}>{text}</{element.tag}>" if text else
+                               f"<{element.tag}/>")
+                    continue
+
+                child_plan = self._plan(type(value))
+                if type(value) in element.types:
+                    self._write(value, child_plan, element.tag, "", "", xsi_declared, out)
+                elif (element.clazz is None or isinstance(value, element.clazz)) and \
+                        child_plan.type_name is not None:
+                    declarations = "" if xsi_declared else f' xmlns:xsi="{XSI_NAMESPACE}"'
+                    self._write(value, child_plan, element.tag, declarations,
+                                f' xsi:type="{child_plan.type_name}"', True, out)
+                else:
+                    raise _Unsupported(element.name)
+
+        if len(out) == start:
+            out[-1] = f"{xsi_type}/>"
+        else:
+            out.append(f"</{tag}>")
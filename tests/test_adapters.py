@@ -1,9 +1,11 @@
 from dataclasses import dataclass
+import pickle
 import pytest
 
 import ieee_2030_5.hrefs as hrefs
 import ieee_2030_5.models as m
-from ieee_2030_5.adapters import Adapter, ResourceListAdapter, NotFoundError
+from ieee_2030_5.adapters import (ADAPTER_INDEXED_PROPERTIES, Adapter, NotFoundError,
+                                   ResourceListAdapter)
 import os
 
 
@@ -196,3 +198,488 @@ def test_generic_list(ignore_adapter_load):
     # foo_list[0].alpha = "d"
     # assert "d" == me.get(foo_href, 0).alpha
     # assert sorted_alpha[1].alpha != "d"
+
+
+def test_list_indexes_follow_mutations(ignore_adapter_load):
+    me = ResourceListAdapter()
+    href = "/r"
+    me.initialize_uri(href, m.Reading)
+    for i in range(5):
+        me.append(href, m.Reading(href=f"{href}_{i}", localID=i,
+                                  timePeriod=m.DateTimeInterval(start=100 - i)))
+
+    assert me.get_item_by_prop(href, "localID", 3).href == "/r_3"
+    assert me.get_item_by_prop(href, "href", "/r_4").localID == 4
+
+    me.add_index(href, "timePeriod.start")
+    assert me.get_item_by_prop(href, "timePeriod.start", 98).localID == 2
+
+    me.set(href, 3, m.Reading(href="/r_3", localID=30))
+    assert me.get_item_by_prop(href, "localID", 30).href == "/r_3"
+    with pytest.raises(NotFoundError):
+        me.get_item_by_prop(href, "localID", 3)
+
+    me.remove(href, 1)
+    with pytest.raises(NotFoundError):
+        me.get_item_by_prop(href, "href", "/r_1")
+
+    # In place mutation of an indexed value requires a reindex.
+    me.get(href, 0).localID = 7
+    me.reindex(href)
+    assert me.get_item_by_prop(href, "localID", 7).href == "/r_0"
+
+    # Or passing the item back through set.
+    moved = me.get(href, 2)
+    moved.href = "/moved"
+    with pytest.raises(NotFoundError):
+        me.get_item_by_prop(href, "href", "/r_2")
+    me.set(href, 2, moved)
+    assert me.get_item_by_prop(href, "href", "/moved").localID == 2
+
+    me.clear(href)
+    with pytest.raises(NotFoundError):
+        me.get_item_by_prop(href, "href", "/moved")
+    # Clearing a list also drops its type so it can hold another type.
+    assert me.get_type(href) is None
+    me.append(href, m.MirrorUsagePoint(href="/mup"))
+    assert me.get_type(href) is m.MirrorUsagePoint
+
+
+def test_list_index_miss_does_not_scan(ignore_adapter_load, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+
+    me = ResourceListAdapter()
+    href = "/r"
+    for i in range(1000):
+        me.append(href, m.Reading(href=f"{href}_{i}", localID=i))
+
+    reads = []
+    resolve = adpt.resolve_property
+    monkeypatch.setattr(adpt, "resolve_property",
+                        lambda obj, prop: reads.append(prop) or resolve(obj, prop))
+    for i in range(1000, 1100):
+        with pytest.raises(NotFoundError):
+            me.get_item_by_prop(href, "localID", i)
+    assert me.get_item_by_prop(href, "localID", 999).href == "/r_999"
+    # Only the item found through the index is read.
+    assert len(reads) == 1
+
+
+def test_adapter_indexes_follow_put(ignore_adapter_load):
+    me = Adapter[m.EndDevice](hrefs.get_enddevice_href(), generic_type=m.EndDevice)
+    eds = [m.EndDevice(lFDI=f"lfdi{i}", sFDI=i) for i in range(5)]
+    for ed in eds:
+        me.add(ed)
+
+    assert me.fetch_by_property("lFDI", "lfdi3") is eds[3]
+    assert me.fetch_by_property("sFDI", 4) is eds[4]
+    assert me.fetch_by_href(hrefs.get_enddevice_href(2)) is eds[2]
+    assert me.fetch_index(eds[1]) == 1
+
+    eds[3].lFDI = "changed"
+    me.put(3, eds[3])
+    assert me.fetch_by_property("lFDI", "lfdi3") is None
+    assert me.fetch_by_property("lFDI", "changed") is eds[3]
+
+    replacement = m.EndDevice(lFDI="replacement")
+    me.put(0, replacement)
+    assert me.fetch_index(replacement) == 0
+    assert me.fetch_by_property("lFDI", "lfdi0") is None
+
+    # Changed in place, found by the new value once put or reindexed.
+    eds[2].lFDI = "in place"
+    eds[4].href = "/edev_moved"
+    assert me.fetch_by_property("lFDI", "in place") is None
+    assert me.fetch_by_property("lFDI", "lfdi2") is None
+    me.put(2, eds[2])
+    me.reindex()
+    assert me.fetch_by_property("lFDI", "in place") is eds[2]
+    assert me.fetch_by_href("/edev_moved") is eds[4]
+
+    # Items sharing a value, the first one added is found until it's changed.
+    shared = [m.EndDevice(lFDI="shared") for _ in range(2)]
+    for ed in shared:
+        me.add(ed)
+    assert me.fetch_by_property("lFDI", "shared") is shared[0]
+    shared[0].lFDI = "unshared"
+    me.put(5, shared[0])
+    assert me.fetch_by_property("lFDI", "shared") is shared[1]
+
+    me.clear()
+    assert me.fetch_by_property("lFDI", "changed") is None
+
+
+def test_adapter_lookup_independent_of_size(ignore_adapter_load, monkeypatch):
+    reads = []
+    property_value = Adapter._property_value
+
+    def counted(obj, prop):
+        reads.append(prop)
+        return property_value(obj, prop)
+
+    monkeypatch.setattr(Adapter, "_property_value", staticmethod(counted))
+
+    me = Adapter[m.EndDevice](hrefs.get_enddevice_href(), generic_type=m.EndDevice)
+    for i in range(50_000):
+        me.add(m.EndDevice(lFDI=f"lfdi{i}"))
+
+    reads.clear()
+    for i in (0, 25_000, 49_999):
+        assert me.fetch_by_property("lFDI", f"lfdi{i}").lFDI == f"lfdi{i}"
+        assert me.fetch_by_href(hrefs.get_enddevice_href(i)).lFDI == f"lfdi{i}"
+    # Only the item found is read to check the index isn't stale, a scan would read them all.
+    assert len(reads) == 6
+
+    # Unknown values are answered by the index alone.
+    reads.clear()
+    for i in range(100):
+        assert me.fetch_by_property("lFDI", f"unknown{i}") is None
+    with pytest.raises(KeyError):
+        me.fetch_index(m.EndDevice(lFDI="unknown"), "lFDI")
+    assert reads == []
+
+    # Replacing an item reads only the item's own values.
+    me.put(0, m.EndDevice(lFDI="lfdi0", href=hrefs.get_enddevice_href(0)))
+    assert len(reads) == len(ADAPTER_INDEXED_PROPERTIES)
+
+
+def test_sqlite_storage_warm_restart(create_project_dir, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.persistance.storage import NullStorage, SqliteStorage
+
+    # Only persist the adapters created by this test.
+    monkeypatch.setattr(adpt, "_persisted_adapters", [])
+    path = create_project_dir / "adapters.sqlite"
+
+    def new_adapters():
+        ed_adapter = Adapter[m.EndDevice](hrefs.get_enddevice_href(), generic_type=m.EndDevice)
+        list_adapter = ResourceListAdapter()
+        adpt.do_load_event(ed_adapter)
+        adpt.do_load_event(list_adapter)
+        return ed_adapter, list_adapter
+
+    ed_adapter, list_adapter = new_adapters()
+    try:
+        adpt.set_storage(SqliteStorage(path, batch_size=3))
+        for i in range(3):
+            ed_adapter.add(m.EndDevice(lFDI=f"lfdi{i}"))
+        list_adapter.initialize_uri("/r", m.Reading)
+        for i in range(4):
+            list_adapter.append("/r", m.Reading(href=f"/r_{i}", localID=i))
+        list_adapter.remove("/r", 2)
+        list_adapter.set_single("/rt", m.ReadingType(href="/rt", uom=38))
+        adpt.get_storage().close()
+        adpt.set_storage(NullStorage())
+
+        adpt._persisted_adapters.clear()
+        ed_adapter, list_adapter = new_adapters()
+        assert adpt.set_storage(SqliteStorage(path)) == 3 + 3 + 1
+
+        assert ed_adapter.fetch_by_property("lFDI", "lfdi2").href == hrefs.get_enddevice_href(2)
+        assert ed_adapter.add(m.EndDevice()).href == hrefs.get_enddevice_href(3)
+        assert list_adapter.get_item_by_prop("/r", "localID", 3).href == "/r_3"
+        with pytest.raises(NotFoundError):
+            list_adapter.get("/r", 2)
+        assert list_adapter.get_type("/r") is m.Reading
+        assert list_adapter.get_single("/rt").uom == 38
+    finally:
+        adpt.get_storage().close()
+        adpt.set_storage(NullStorage())
+
+
+def test_reading_series_warm_restart(create_project_dir, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.data.reading_store import ReadingSeries
+    from ieee_2030_5.persistance.storage import NullStorage, SqliteStorage
+
+    monkeypatch.setattr(adpt, "_persisted_adapters", [])
+    path = create_project_dir / "adapters.sqlite"
+    list_adapter = ResourceListAdapter()
+    adpt.do_load_event(list_adapter)
+    try:
+        adpt.set_storage(SqliteStorage(path))
+        list_adapter.use_reading_series("/upt_0_mr_0_r", m.ReadingType(uom=38))
+        for i in range(12):
+            list_adapter.append_and_increment_href(
+                "/upt_0_mr_0_r", m.Reading(value=i, timePeriod=m.DateTimeInterval(start=i)))
+        adpt.get_storage().close()
+        adpt.set_storage(NullStorage())
+
+        adpt._persisted_adapters.clear()
+        list_adapter = ResourceListAdapter()
+        adpt.do_load_event(list_adapter)
+        adpt.set_storage(SqliteStorage(path))
+        series = list_adapter.use_reading_series("/upt_0_mr_0_r")
+        assert isinstance(series, ReadingSeries) and series.uom == 38
+        assert list(series) == list(range(12))
+        assert series.aggregate(100)[0].count == 12
+    finally:
+        adpt.get_storage().close()
+        adpt.set_storage(NullStorage())
+
+
+def test_write_behind_coalesces_changes(create_project_dir, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.persistance.storage import NullStorage, SqliteStorage
+
+    monkeypatch.setattr(adpt, "_persisted_adapters", [])
+    list_adapter = ResourceListAdapter()
+    adpt.do_load_event(list_adapter)
+    storage = SqliteStorage(create_project_dir / "adapters.sqlite")
+    adpt.set_storage(storage)
+    queue = adpt.enable_write_behind(flush_interval=60, max_pending=1000)
+    try:
+        list_adapter.initialize_uri("/r", m.Reading)
+        for i in range(3):
+            list_adapter.append("/r", m.Reading(href=f"/r_{i}", localID=i))
+        for value in range(10):
+            list_adapter.set("/r", 0, m.Reading(href="/r_0", localID=value))
+
+        # One type registration and three readings.
+        assert queue.backlog == 4
+        assert list(storage.items("ResourceListAdapter:list:/r")) == []
+
+        list_adapter.clear("/r")
+        list_adapter.append("/r", m.Reading(href="/r_0", localID=42))
+        adpt.flush()
+
+        assert queue.backlog == 0
+        assert queue.stats["flushed_items"] == 3
+        stored = dict(storage.items("ResourceListAdapter:list:/r"))
+        assert list(stored) == ["0"]
+        assert pickle.loads(stored["0"]).localID == 42
+        assert dict(storage.items("ResourceListAdapter:types"))
+    finally:
+        adpt.disable_write_behind()
+        storage.close()
+        adpt.set_storage(NullStorage())
+
+
+def test_write_behind_requeues_failed_writes():
+    from ieee_2030_5.persistance.write_behind import WriteBehindQueue
+
+    written, commits = [], []
+    failing = {"b"}
+
+    def write(value):
+        if value[0] in failing:
+            raise OSError("disk full")
+        written.append(value)
+
+    queue = WriteBehindQueue(write=write, commit=lambda: commits.append(len(written)))
+    for key in "abc":
+        queue.put(key, (key, 1))
+
+    assert queue.flush() == 2
+    assert written == [("a", 1), ("c", 1)] and commits == [2]
+    assert queue.backlog == 1
+    assert queue.stats["failed_items"] == 1 and queue.stats["flushed_items"] == 2
+
+    # The failed value is written once it succeeds, unless a newer one replaced it.
+    failing.clear()
+    assert queue.flush() == 1
+    assert written[-1] == ("b", 1)
+
+    failing.add("c")
+    queue.put("c", ("c", 2))
+    assert queue.flush() == 0 and commits == [2, 3]
+    queue.put("c", ("c", 3))
+    failing.clear()
+    assert queue.flush() == 1
+    assert written[-1] == ("c", 3) and queue.backlog == 0
+
+    # A key queued again is written after the keys queued since, e.g. a delete then a put.
+    for key, version in (("a", 2), ("b", 2), ("a", 3)):
+        queue.put(key, (key, version))
+    queue.flush()
+    assert written[-2:] == [("b", 2), ("a", 3)]
+
+
+def test_single_uris_by_prefix_and_suffix(ignore_adapter_load):
+    me = ResourceListAdapter()
+    me.set_single("/edev_0_der_0_ders", m.DERStatus())
+    me.set_single("/edev_0_der_0_dera", m.DERAvailability())
+    me.set_single("/edev_1_der_0_ders", m.DERStatus())
+
+    assert sorted(me.get_single_uris(suffix="ders")) == ["/edev_0_der_0_ders", "/edev_1_der_0_ders"]
+    assert me.get_single_uris(prefix="/edev_0") == ["/edev_0_der_0_dera", "/edev_0_der_0_ders"]
+    assert me.get_single_uris(prefix="/edev_1", suffix="ders") == ["/edev_1_der_0_ders"]
+
+
+def test_ordered_reading_window_and_retention(ignore_adapter_load):
+    from ieee_2030_5.adapters import ReadingRetention
+
+    me = ResourceListAdapter()
+    me.initialize_uri("/upt_0_mr_0_r", m.Reading)
+    me.add_ordered_index("/upt_0_mr_0_r", "timePeriod.start")
+    # Posted out of order, the list should still page newest first.
+    for start in (300, 100, 200, 0, 400):
+        reading = m.Reading(localID=start, timePeriod=m.DateTimeInterval(start=start, duration=100))
+        me.append_and_increment_href("/upt_0_mr_0_r", reading)
+
+    page = me.get_resource_list("/upt_0_mr_0_r", start=1, limit=2,
+                                sort_by="timePeriod.start", reverse=True)
+    assert page.all == 5
+    assert [r.timePeriod.start for r in page.Reading] == [300, 200]
+    assert [r.localID for r in me.get_range("/upt_0_mr_0_r", 100, 400)] == [100, 200, 300]
+    assert [r.localID for r in me.get_range("/upt_0_mr_0_r", step=200)] == [0, 200, 400]
+
+    me.set_retention("/upt_0_mr_0_r", ReadingRetention(max_count=3))
+    assert [r.localID for r in me.get_range("/upt_0_mr_0_r")] == [200, 300, 400]
+
+    # Keys aren't reused after the oldest readings are dropped.
+    added = me.append_and_increment_href(
+        "/upt_0_mr_0_r", m.Reading(localID=500, timePeriod=m.DateTimeInterval(start=500)))
+    assert added.href == "/upt_0_mr_0_r_5"
+    assert [r.localID for r in me.get_range("/upt_0_mr_0_r")] == [300, 400, 500]
+    assert me.get_item_by_prop("/upt_0_mr_0_r", "href", "/upt_0_mr_0_r_5") is added
+
+
+def test_max_age_retention_keeps_untimestamped_items(ignore_adapter_load):
+    import time
+
+    from ieee_2030_5.adapters import ReadingRetention
+
+    me = ResourceListAdapter()
+    now = int(time.time())
+    for local_id, start in ((0, None), (1, now - 7200), (2, now - 60), (3, None)):
+        period = m.DateTimeInterval(start=start) if start is not None else None
+        me.append_and_increment_href("/r", m.Reading(localID=local_id, timePeriod=period))
+
+    me.set_retention("/r", ReadingRetention(max_age=3600))
+    assert sorted(r.localID for r in me.get_list("/r")) == [0, 2, 3]
+
+    me.set_retention("/r", ReadingRetention(max_age=30))
+    assert sorted(r.localID for r in me.get_list("/r")) == [0, 3]
+
+
+def test_reading_series_backs_reading_list(ignore_adapter_load, monkeypatch):
+    import ieee_2030_5.data.reading_store as reading_store
+    from ieee_2030_5.data.reading_store import ReadingSeries
+
+    me = ResourceListAdapter()
+    me.initialize_uri("/upt_0_mr_0_r", m.Reading)
+    me.append_and_increment_href("/upt_0_mr_0_r",
+                                 m.Reading(localID=0, value=5,
+                                           timePeriod=m.DateTimeInterval(start=0, duration=60)))
+    series = me.use_reading_series("/upt_0_mr_0_r", m.ReadingType(uom=38))
+    me.add_ordered_index("/upt_0_mr_0_r", "timePeriod.start")
+    assert isinstance(series, ReadingSeries) and series.uom == 38
+
+    for start, value in ((900, 10), (60, 7), (1000, 20)):
+        me.append_and_increment_href(
+            "/upt_0_mr_0_r",
+            m.Reading(localID=start, value=value, qualityFlags=b"\x01",
+                      timePeriod=m.DateTimeInterval(start=start, duration=60)))
+
+    reading = me.get("/upt_0_mr_0_r", 2)
+    assert reading == m.Reading(href="/upt_0_mr_0_r_2", localID=60, value=7, qualityFlags=b"\x01",
+                                timePeriod=m.DateTimeInterval(start=60, duration=60))
+    assert me.get_item_by_prop("/upt_0_mr_0_r", "localID", 900).href == "/upt_0_mr_0_r_1"
+
+    me.remove("/upt_0_mr_0_r", 0)
+    page = me.get_resource_list("/upt_0_mr_0_r", sort_by="timePeriod.start", reverse=True)
+    assert [r.value for r in page.Reading] == [20, 10, 7]
+    assert [(a.start, a.count, a.min, a.max, a.mean) for a in series.aggregate(900)] == \
+        [(0, 1, 7, 7, 7), (900, 2, 10, 20, 15)]
+    assert [a.start for a in series.aggregate(50, start=60, end=1000)] == [50, 900]
+
+    # Readings read from the series are copies, changes are stored by setting them.
+    reading = me.get("/upt_0_mr_0_r", 3)
+    reading.value = 30
+    assert me.get("/upt_0_mr_0_r", 3).value == 20
+    me.set("/upt_0_mr_0_r", 3, reading)
+    assert me.get("/upt_0_mr_0_r", 3).value == 30
+
+    # Without NumPy the aggregates are the same.
+    columns = [series.aggregate(900), series.aggregate(50, start=60, end=1000)]
+    monkeypatch.setattr(reading_store, "np", None)
+    assert [series.aggregate(900), series.aggregate(50, start=60, end=1000)] == columns
+
+
+def test_reading_series_aggregates_window_rows():
+    from ieee_2030_5.data.reading_store import ReadingSeries
+
+    series = ReadingSeries("/upt_0_mr_0_r")
+    for key in range(10):
+        series[key] = m.Reading(value=key,
+                                timePeriod=m.DateTimeInterval(start=key * 10, duration=10))
+    # Rows stored in start order are bisected to the window.
+    assert series._window(20, 50) == (2, 5)
+    assert [(a.count, a.min, a.max) for a in series.aggregate(30, 20, 50)] == [(1, 2, 2),
+                                                                             (2, 3, 4)]
+
+    # A reading stored out of order falls back to all of the rows.
+    series[10] = m.Reading(value=10, timePeriod=m.DateTimeInterval(start=25, duration=10))
+    assert series._window(20, 50) == (0, 11)
+    assert [(a.count, a.min, a.max) for a in series.aggregate(30, 20, 50)] == [(2, 2, 10),
+                                                                             (2, 3, 4)]
+
+
+def test_ingest_streamed_mirror_readings(ignore_adapter_load):
+    import io
+
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.utils import dataclass_to_xml, stream_mirror_readings
+
+    mup = adpt.create_mirror_usage_point(
+        m.MirrorUsagePoint(mRID=bytes.fromhex("5509D69F8B3535950000000000001818"), deviceLFDI=b"\x18",
+                           roleFlags=b"\x0d", serviceCategoryKind=0, status=1)).an_object
+    upt_href = mup.href.replace("mup", "upt")
+
+    def readings(start):
+        return [
+            m.Reading(value=i, timePeriod=m.DateTimeInterval(start=i, duration=1))
+            for i in range(start, start + 100)
+        ]
+
+    mmr = m.MirrorMeterReading(mRID=bytes.fromhex("5509D69F8B3535950000000000001819"),
+                               MirrorReadingSet=[m.MirrorReadingSet(mRID=b"\x01", Reading=readings(0))],
+                               ReadingType=m.ReadingType(uom=38))
+    body = dataclass_to_xml(m.MirrorMeterReadingList(all=1, results=1, MirrorMeterReading=[mmr]))
+    result = adpt.ingest_mirror_readings(mup.href, stream_mirror_readings(io.BytesIO(body.encode())))
+    assert result.success and not result.was_update
+    assert adpt.ListAdapter.list_size(f"{upt_href}_mr_0_rs_0_r") == 100
+    assert adpt.ListAdapter.get_single(f"{upt_href}_mr_0_rt") == m.ReadingType(uom=38)
+    assert adpt.ListAdapter.get(f"{upt_href}_mr", 0).ReadingTypeLink.href == f"{upt_href}_mr_0_rt"
+
+    # A reading set posted to the existing mirror meter reading.
+    body = dataclass_to_xml(m.MirrorReadingSet(mRID=b"\x02", Reading=readings(100)))
+    result = adpt.ingest_mirror_readings(f"{mup.href}_mr_0",
+                                         stream_mirror_readings(io.BytesIO(body.encode())))
+    assert result.location == f"{upt_href}_mr_0_rs_1"
+    assert [r.value for r in adpt.ListAdapter.get_list(f"{upt_href}_mr_0_rs_1_r")][-1] == 199
+
+    # Both reading sets are aggregated for the meter reading.
+    aggregate = adpt.meter_reading_aggregates(b"\x18", 90, 110)[mmr.mRID.hex()]
+    assert (aggregate.start, aggregate.count, aggregate.min, aggregate.max) == (90, 20, 90, 109)
+    assert aggregate.mean == 99.5
+    assert adpt.meter_reading_aggregates("18", 90, 110) == {mmr.mRID.hex(): aggregate}
+
+    # The same meter reading posted as an object.
+    result = adpt.create_or_update_meter_reading(mup.href, mmr)
+    assert result.was_update
+    assert adpt.ListAdapter.list_size(f"{upt_href}_mr_0_rs_0_r") == 100
+
+
+def test_store_events_invalidate_cached_responses(ignore_adapter_load, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    from ieee_2030_5.data.response_cache import ResponseCache
+
+    cache = ResponseCache()
+    monkeypatch.setattr(adpt, "response_cache", cache)
+    lists = ResourceListAdapter()
+    for href in ("/derp_0", "/mup_0", "/edev_0"):
+        cache.put(href, "", "v1", b"<Resource/>")
+    lists.set_single("/derp_0", m.DERProgram(href="/derp_0"))
+    assert cache.get("/derp_0", "", "v1") is None and len(cache) == 2
+
+    # Items changed in place are stored without saying which, so any response may be stale.
+    lists.store()
+    assert len(cache) == 0
+
+    devices = Adapter[m.EndDevice](hrefs.get_enddevice_href(), generic_type=m.EndDevice)
+    for href in ("/mup_0", "/edev_0"):
+        cache.put(href, "", "v1", b"<Resource/>")
+    devices.store()
+    assert cache.get("/mup_0", "", "v1") is not None and len(cache) == 1
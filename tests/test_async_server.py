@@ -0,0 +1,225 @@
+import asyncio
+import http.client
+import ssl
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from flask import Flask, request
+from werkzeug.serving import generate_adhoc_ssl_context
+
+from ieee_2030_5.async_server import AsyncWSGIServer
+
+
+class _ServerThread(threading.Thread):
+
+    def __init__(self, server: AsyncWSGIServer):
+        super().__init__(daemon=True)
+        self.server = server
+        self.started = threading.Event()
+        self.loop = None
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.server.start())
+        self.started.set()
+        self.loop.run_forever()
+
+    def __enter__(self) -> AsyncWSGIServer:
+        self.start()
+        self.started.wait(5)
+        return self.server
+
+    def __exit__(self, *args):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(5)
+
+
+def test_async_server_dispatches_with_identity():
+    app = Flask(__name__)
+
+    @app.route("/dcap", methods=["GET", "POST"])
+    def dcap():
+        return f"{request.environ['ieee_2030_5_lfdi']} {request.get_data().decode()}"
+
+    seen_certs = []
+
+    def identity(path, get_peer_cert, connection_cache):
+        seen_certs.append(get_peer_cert())
+        connection_cache["requests"] = connection_cache.get("requests", 0) + 1
+        return {"ieee_2030_5_lfdi": f"lfdi{path}{connection_cache['requests']}"}
+
+    server = AsyncWSGIServer(app, "127.0.0.1", 0, ssl_context=generate_adhoc_ssl_context(),
+                             identity=identity)
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    with _ServerThread(server):
+        conn = http.client.HTTPSConnection("127.0.0.1", server.port, context=context)
+        conn.request("GET", "/dcap")
+        assert conn.getresponse().read() == b"lfdi/dcap1 "
+        # Same connection, chunked request body.
+        conn.request("POST", "/dcap", body=iter([b"<Reading/>"]), encode_chunked=True)
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.read() == b"lfdi/dcap2 <Reading/>"
+        assert server.max_connections == 1
+        conn.close()
+    # No client certificate was offered.
+    assert seen_certs == [None, None]
+
+
+_LOAD_CLIENT = """
+import asyncio, sys
+
+async def main(port, count):
+    async def connect():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        return reader, writer
+
+    async def get(reader, writer):
+        writer.write(b"GET /tm HTTP/1.1\\r\\nHost: test\\r\\n\\r\\n")
+        await reader.readuntil(b"\\r\\n\\r\\n")
+        return await reader.readexactly(2)
+
+    connections = []
+    for start in range(0, count, 500):
+        connections.extend(await asyncio.gather(*[connect() for _ in range(min(500, count - start))]))
+    print("connected", flush=True)
+    sys.stdin.readline()
+    # Every connection polls twice while all of them are held open.
+    for _ in range(2):
+        results = await asyncio.gather(*[get(r, w) for r, w in connections])
+        assert results == [b"ok"] * count
+    print("done", flush=True)
+
+asyncio.run(main(int(sys.argv[1]), int(sys.argv[2])))
+"""
+
+
+def test_async_server_bounds_request_bodies():
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [environ["wsgi.input"].read()]
+
+    async def send(port: int, data: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        try:
+            return await asyncio.wait_for(reader.read(), 5)
+        finally:
+            writer.close()
+
+    head = b"POST /mup HTTP/1.1\r\nHost: test\r\nTransfer-Encoding: chunked\r\n\r\n"
+    server = AsyncWSGIServer(app, "127.0.0.1", 0, keepalive_timeout=0.2)
+    with _ServerThread(server):
+        # A chunk size line longer than the stream limit.
+        response = asyncio.run(send(server.port, head + b"1" * 100_000))
+        assert response.startswith(b"HTTP/1.1 400 ")
+
+        # A body that stops arriving, the connection is closed without a response.
+        response = asyncio.run(send(server.port, head + b"5\r\nab"))
+        assert response == b""
+
+        response = asyncio.run(
+            send(server.port, head.replace(b"1.1", b"1.0") + b"2\r\nok\r\n0\r\n\r\n"))
+        assert response.endswith(b"\r\n\r\nok")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", [10_000])
+def test_async_server_holds_10k_connections(count):
+    served = []
+
+    def app(environ, start_response):
+        served.append(environ["PATH_INFO"])
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    server = AsyncWSGIServer(app, "127.0.0.1", 0, keepalive_timeout=None)
+    with _ServerThread(server):
+        # The client runs in its own process so the two ends don't share a descriptor limit.
+        client = subprocess.Popen([sys.executable, "-c", _LOAD_CLIENT, str(server.port), str(count)],
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  text=True)
+        try:
+            assert client.stdout.readline().strip() == "connected"
+            deadline = time.time() + 10
+            while server.connections < count and time.time() < deadline:
+                time.sleep(0.05)
+            assert server.connections == count
+
+            client.stdin.write("\n")
+            client.stdin.flush()
+            assert client.stdout.readline().strip() == "done"
+        finally:
+            client.kill()
+            client.wait()
+
+    assert len(served) == 2 * count
+    assert server.max_connections == count
+
+
+def test_client_pool_keeps_connections_alive(new_tls_repository):
+    from concurrent.futures import ThreadPoolExecutor
+    from pathlib import Path
+
+    import ieee_2030_5.models as m
+    from ieee_2030_5.client import IEEE2030_5_Client
+    from ieee_2030_5.flask_server import __build_ssl_context__
+    from ieee_2030_5.utils import dataclass_to_xml
+
+    repo = new_tls_repository
+    repo.create_cert("dev1")
+    dcap = dataclass_to_xml(m.DeviceCapability(href="/dcap", pollRate=900)).encode()
+    posts = []
+
+    def app(environ, start_response):
+        if environ["REQUEST_METHOD"] == "POST":
+            posts.append(environ["wsgi.input"].read())
+            start_response("201 Created", [("Location", f"/mup_{len(posts)}"),
+                                           ("Content-Length", "0")])
+            return [b""]
+        start_response("200 OK", [("Content-Type", "application/sep+xml"),
+                                  ("Content-Length", str(len(dcap)))])
+        return [dcap]
+
+    server = AsyncWSGIServer(app, "127.0.0.1", 0, ssl_context=__build_ssl_context__(repo))
+    cert_file, key_file = repo.get_file_pair("dev1")
+    with _ServerThread(server):
+        client = IEEE2030_5_Client(cafile=repo.ca_cert_file, server_hostname="127.0.0.1",
+                                   server_ssl_port=server.port, keyfile=Path(key_file),
+                                   certfile=Path(cert_file), debug=False, pool_size=3)
+        transport = client.transport
+        transport.max_idle = 60
+        for _ in range(20):
+            assert client.device_capability().pollRate == 900
+        assert transport.connections_opened == 1
+
+        # The server closes the idle connection, GET and POST are sent again on a new one.
+        server.keepalive_timeout = 0.1
+        client.get("/dcap")
+        time.sleep(0.5)
+        assert client.get("/dcap").pollRate == 900
+        time.sleep(0.5)
+        response = client.__post__("/mup", data="<MirrorUsagePoint/>")
+        assert (response.status, response.getheader("Location")) == (201, "/mup_1")
+        assert posts == [b"<MirrorUsagePoint/>"]
+        assert transport.connections_opened == 3
+        server.keepalive_timeout = 300
+
+        # Threads share the connections, never more than the size of the pool.
+        with ThreadPoolExecutor(8) as pool:
+            assert all(d.pollRate == 900 for d in pool.map(lambda _: client.get("/dcap"),
+                                                           range(80)))
+        assert transport.connections_opened <= 5
+        assert 1 <= transport.idle_connections <= 3
+        client.disconnect()
+        client.__close__()
+    assert client.handshake_stats.snapshot()["resumed"] >= 2
@@ -0,0 +1,246 @@
+from types import SimpleNamespace
+
+from flask import Flask
+
+import ieee_2030_5.hrefs as hrefs
+import ieee_2030_5.models as m
+from ieee_2030_5.data.indexer import Indexer
+from ieee_2030_5.data.response_cache import ResponseCache
+
+
+def test_conditional_get(monkeypatch):
+    import ieee_2030_5.data.indexer as indexer
+    import ieee_2030_5.server.base_request as base_request
+
+    monkeypatch.setattr(indexer, "set_point", lambda href, value: None)
+    idx = Indexer()
+    monkeypatch.setattr(base_request, "get_href_index", idx.index)
+    cache = ResponseCache()
+    monkeypatch.setattr(base_request, "response_cache", cache)
+    monkeypatch.setattr(indexer, "response_cache", cache)
+    hashes = []
+    monkeypatch.setattr(base_request, "content_hash",
+                        lambda obj: hashes.append(obj) or indexer.content_hash(obj))
+    serialized = []
+    monkeypatch.setattr(base_request, "dataclass_to_xml",
+                        lambda obj: serialized.append(obj) or "<DeviceCapability/>")
+
+    dcap = m.DeviceCapability(href="/dcap", pollRate=900)
+    idx.add("/dcap", dcap)
+    endpoints = SimpleNamespace(tls_repo=None, config=None)
+    app = Flask(__name__)
+
+    def get(headers=None):
+        with app.test_request_context("/dcap",
+                                      headers=headers,
+                                      environ_base={"ieee_2030_5_peercert": None}):
+            return base_request.RequestOp(endpoints).build_response_from_dataclass(dcap)
+
+    response = get()
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+    assert len(serialized) == 1
+    # The ETag is the hash the store computed when dcap was written.
+    assert etag == f'"{idx.index("/dcap").last_hash}"'
+
+    response = get({"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    response = get({"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    assert len(serialized) == 1
+
+    # A change written to the store changes the ETag.
+    dcap.pollRate = 60
+    idx.add("/dcap", dcap)
+    response = get({"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(serialized) == 2
+    # Unchanged so served from the response cache.
+    response = get()
+    assert response.status_code == 200
+    assert response.data == b"<DeviceCapability/>"
+    assert len(serialized) == 2
+    assert cache.hits == 1
+    assert not hashes
+
+    # A resource the store doesn't hold, e.g. one held by an adapter and changed in place,
+    # is hashed on every request.
+    der_program = m.DERProgram(href="/derp_0", primacy=1)
+
+    def get_program(headers=None):
+        with app.test_request_context("/derp_0",
+                                      headers=headers,
+                                      environ_base={"ieee_2030_5_peercert": None}):
+            return base_request.RequestOp(endpoints).build_response_from_dataclass(der_program)
+
+    etag = get_program().headers["ETag"]
+    assert get_program({"If-None-Match": etag}).status_code == 304
+    assert len(hashes) == 2
+    der_program.primacy = 2
+    response = get_program({"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_updated_resource_changes_body_and_etag(ignore_adapter_load, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    import ieee_2030_5.server.base_request as base_request
+    from ieee_2030_5.adapters import ResourceListAdapter
+    from ieee_2030_5.server.meteringfs import MirrorUsagePointRequest
+    from ieee_2030_5.utils import dataclass_to_xml
+
+    monkeypatch.setattr(adpt, "ListAdapter", ResourceListAdapter())
+    cache = ResponseCache()
+    monkeypatch.setattr(base_request, "response_cache", cache)
+    config = SimpleNamespace(mirror_usage_point_post_rate=300,
+                             reading_retention_count=None,
+                             reading_retention_seconds=None)
+    endpoints = SimpleNamespace(tls_repo=None, config=config)
+    app = Flask(__name__)
+
+    def send(method, path, headers=None, data=None):
+        with app.test_request_context(path,
+                                      method=method,
+                                      headers=headers,
+                                      data=data,
+                                      environ_base={"ieee_2030_5_peercert": None}):
+            op = MirrorUsagePointRequest(server_endpoints=endpoints)
+            return op.get() if method == "GET" else op.post()
+
+    def post(description):
+        mup = m.MirrorUsagePoint(mRID=bytes.fromhex("0600006CC8"),
+                                 description=description,
+                                 deviceLFDI=b"\x18",
+                                 roleFlags=b"\x0d",
+                                 serviceCategoryKind=0,
+                                 status=1)
+        return send("POST", "/mup", data=dataclass_to_xml(mup))
+
+    assert post("Gas Mirroring").status_code == 201
+    response = send("GET", "/mup_0")
+    etag = response.headers["ETag"]
+    assert b"Gas Mirroring" in response.data
+    assert send("GET", "/mup_0", {"If-None-Match": etag}).status_code == 304
+
+    # The same mRID posted again updates the mirror usage point in place.
+    assert post("Water Mirroring").status_code == 204
+    response = send("GET", "/mup_0", {"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert b"Water Mirroring" in response.data and b"Gas Mirroring" not in response.data
+    # Served from the cache under the new ETag until it changes again.
+    assert send("GET", "/mup_0").data == response.data
+    assert cache.hits == 1
+
+
+def test_server_endpoints_dispatch_by_shape(ignore_adapter_load, monkeypatch):
+    import ieee_2030_5.adapters as adpt
+    import ieee_2030_5.server.base_request as base_request
+    import ieee_2030_5.server.server_endpoints as server_endpoints
+    from ieee_2030_5.adapters import ResourceListAdapter
+
+    monkeypatch.setattr(adpt, "ListAdapter", ResourceListAdapter())
+    monkeypatch.setattr(base_request, "response_cache", ResponseCache())
+    monkeypatch.setattr(server_endpoints, "response_cache", ResponseCache())
+    config = SimpleNamespace(response_cache_max_bytes=1024 * 1024,
+                             response_cache_max_entry_bytes=1024,
+                             mirror_usage_point_post_rate=300,
+                             reading_retention_count=None,
+                             reading_retention_seconds=None)
+    app = Flask(__name__)
+    server_endpoints.ServerEndpoints(app, tls_repo=None, config=config)
+    client = app.test_client()
+
+    def get(path):
+        response = client.get(path, environ_base={"ieee_2030_5_peercert": None})
+        assert response.status_code == 200
+        return response.data.decode()
+
+    mup = adpt.create_mirror_usage_point(
+        m.MirrorUsagePoint(mRID=bytes.fromhex("0600006CC8"), deviceLFDI=b"\x18",
+                           roleFlags=b"\x0d", serviceCategoryKind=0, status=1)).an_object
+    readings = [
+        m.Reading(localID=bytes([i]), value=i, timePeriod=m.DateTimeInterval(start=i, duration=1))
+        for i in range(3)
+    ]
+    adpt.create_or_update_meter_reading(
+        mup.href,
+        m.MirrorMeterReading(mRID=bytes.fromhex("0700006CC8"),
+                             ReadingType=m.ReadingType(uom=38),
+                             MirrorReadingSet=[m.MirrorReadingSet(mRID=b"\x01",
+                                                                  Reading=readings)]))
+
+    assert 'pollRate="300"' in get("/mup")
+    assert "<MirrorUsagePoint " in get("/mup_0")
+    # Reading lists are served newest first.
+    body = get("/upt_0_mr_0_rs_0_r?l=3")
+    assert body.index("<value>2</value>") < body.index("<value>0</value>")
+    assert "<value>1</value>" in get("/upt_0_mr_0_rs_0_r_1")
+    assert "<MeterReading " in get("/upt_0_mr_0")
+
+
+def test_response_cache_eviction_and_invalidation():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("/derp", "", "v1", b"12345")
+    cache.put("/derp_0", "", "v1", b"12345")
+    assert cache.get("/derp", "", "v1") == b"12345"
+    assert cache.get("/derp", "s=0&l=10", "v1") is None
+    # /derp_0 is the least recently used.
+    cache.put("/dcap", "", "v1", b"1")
+    assert cache.get("/derp_0", "", "v1") is None
+    assert cache.size == 6
+
+    cache.put("/derp_0", "", "v2", b"1234")
+    cache.invalidate_list("/derp")
+    assert len(cache) == 1
+    cache.invalidate("/dcap")
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_response_cache_skips_volatile_and_large_responses():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=10)
+    cache.put("/tm", "", "v1", b"<Time/>")
+    cache.put("/derp_0_derc", "s=0&l=10", "v1", b"<List/>")
+    cache.put("/derp_0_derc", "", "v1", b"<DERControlList/>")
+    assert len(cache) == 0 and cache.size == 0
+    assert cache.get("/tm", "", "v1") is None and cache.misses == 0
+
+    cache.put("/derp_0_derc", "", "v1", b"<List/>")
+    assert cache.get("/derp_0_derc", "", "v1") == b"<List/>"
+
+
+def test_href_router():
+    from ieee_2030_5.server.server_endpoints import HrefRouter, RegexConverter
+
+    router = HrefRouter()
+    router.add("der", lambda path: f"der {path}", ["GET", "PUT"])
+    router.add("derp", lambda path: f"derp {path}", ["GET"])
+    app = Flask(__name__)
+    app.url_map.converters['regex'] = RegexConverter
+    app.add_url_rule(router.rule, view_func=router.dispatch, methods=sorted(router.methods))
+    client = app.test_client()
+
+    assert client.get("/derp_0_derc_1").data == b"derp derp_0_derc_1"
+    assert client.get("/der").data == b"der der"
+    assert client.put("/der_1_ders").data == b"der der_1_ders"
+    assert client.put("/derp_0").status_code == 405
+    assert client.get("/dera").status_code == 404
+    assert client.get("/edev_0").status_code == 404
+
+    # A view added for a shape serves the methods it was added with for that shape only.
+    router.add("der", lambda path: f"der list {path}", ["GET"], shape=("der", ))
+    router.add("der", lambda path: f"der status {path}", ["GET"],
+               shape=("der", hrefs.INDEX, "ders"))
+    app = Flask(__name__)
+    app.url_map.converters['regex'] = RegexConverter
+    app.add_url_rule(router.rule, view_func=router.dispatch, methods=sorted(router.methods))
+    client = app.test_client()
+    assert client.get("/der").data == b"der list der"
+    assert client.get("/der_1_ders").data == b"der status der_1_ders"
+    assert client.put("/der_1_ders").data == b"der der_1_ders"
+    assert client.get("/der_1_derg").data == b"der der_1_derg"
+    assert client.get("/derp_0").data == b"derp derp_0"
@@ -92,3 +92,15 @@ def test_edev_href():
     assert 0 == href.edev_index
     assert 0 == href.edev_subtype_index
     
+
+
+def test_parse_href():
+    key = hrefs.parse_href("/edev_3_der_0_ders")
+
+    assert key.root == "edev"
+    assert key.parts == ("edev", 3, "der", 0, "ders")
+    assert key.shape == ("edev", hrefs.INDEX, "der", hrefs.INDEX, "ders")
+    assert key.indices == (3, 0)
+    assert key.at(2) == "der" and key.at(5) is None
+    assert key.join(3) == "/edev_3_der"
+    assert not hrefs.parse_href("/derp").has_index()
@@ -0,0 +1,102 @@
+import ieee_2030_5.models as m
+from ieee_2030_5.data.indexer import Indexer
+from ieee_2030_5.persistance.points import AppendOnlyLog
+
+
+def test_append_only_log_last_record_wins(create_project_dir):
+    path = create_project_dir / "points.log"
+    log = AppendOnlyLog(path, sync_every=2)
+    log.put("/a", b"1")
+    log.put("/b", b"2")
+    log.put("/a", b"3")
+    assert log.get("/a") == b"3"
+    log.close()
+
+    # Simulate a crash part way through writing a record.
+    with open(path, "ab") as f:
+        f.write(b"\x05\x00\x00\x00\x10")
+
+    log = AppendOnlyLog(path)
+    assert sorted(log.keys()) == ["/a", "/b"]
+    assert log.get("/a") == b"3"
+    log.compact()
+    assert dict(log.items()) == {"/a": b"3", "/b": b"2"}
+    log.close()
+
+
+def test_legacy_points_imported_once(create_project_dir, monkeypatch):
+    import pickle
+
+    import ieee_2030_5.data.indexer as indexer
+    from ieee_2030_5.data.indexer import Index
+    from ieee_2030_5.persistance.points import import_legacy_points
+
+    log = AppendOnlyLog(create_project_dir / "points.log")
+    log.put("/edev_1", pickle.dumps(("added", "written", "hash", pickle.dumps("newer"))))
+    # The files of the file per key store the points used to be kept in.
+    for href, item in (("/edev_0", m.EndDevice(href="/edev_0", lFDI="abc")), ("/edev_1", "old")):
+        index = Index(href, item, added="then", last_written="then", last_hash=None)
+        (create_project_dir / href.replace("/", "^^^^")).write_bytes(pickle.dumps(index))
+
+    monkeypatch.setattr(indexer, "get_points", log.items)
+    monkeypatch.setattr(indexer, "import_legacy_points", lambda: import_legacy_points(log))
+    idx = Indexer()
+    assert idx.load() == 2
+    assert idx.get("/edev_0").lFDI == "abc"
+    assert idx.index("/edev_0").last_hash == indexer.content_hash(idx.get("/edev_0"))
+    assert idx.get("/edev_1") == "newer"
+    assert sorted(p.name for p in (create_project_dir / "legacy").iterdir()) == \
+        ["^^^^edev_0", "^^^^edev_1"]
+    assert import_legacy_points(log) == 0
+    log.close()
+
+
+def test_indexer_skips_unchanged_writes(monkeypatch):
+    import ieee_2030_5.data.indexer as indexer
+
+    writes = []
+    monkeypatch.setattr(indexer, "set_point", lambda href, value: writes.append(href))
+    pickled = []
+    dumps = indexer.pickle.dumps
+    monkeypatch.setattr(indexer.pickle, "dumps",
+                        lambda obj: pickled.append(type(obj)) or dumps(obj))
+
+    idx = Indexer()
+    ed = m.EndDevice(href="/edev_0", lFDI="abc")
+    idx.add("/edev_0", ed)
+    # The item is pickled once, the record holding it a second time.
+    assert pickled == [m.EndDevice, tuple]
+    assert idx.index("/edev_0").last_hash == indexer.content_hash(ed)
+    idx.add("/edev_0", m.EndDevice(href="/edev_0", lFDI="abc"))
+    assert len(writes) == 1
+
+    ed.lFDI = "def"
+    idx.add("/edev_0", ed)
+    assert len(writes) == 2
+    assert idx.get("/edev_0") is ed
+    assert idx.get("/edev_1") is None
+
+
+def test_prefix_index_queries():
+    from ieee_2030_5.data.prefix_index import PrefixIndex
+
+    idx = PrefixIndex(["/edev_1_der_0_ders", "/edev_0_der_0_ders", "/edev_0_der_0_dera", "/edev_10"])
+    assert idx.with_prefix("/edev_0") == ["/edev_0_der_0_dera", "/edev_0_der_0_ders"]
+    assert idx.with_prefix("/edev_1") == ["/edev_10", "/edev_1_der_0_ders"]
+    assert sorted(idx.with_suffix("ders")) == ["/edev_0_der_0_ders", "/edev_1_der_0_ders"]
+
+    idx.discard("/edev_0_der_0_ders")
+    assert idx.with_suffix("ders") == ["/edev_1_der_0_ders"]
+    assert "/edev_0_der_0_ders" not in idx
+    assert len(idx) == 3
+
+
+def test_indexer_filtered():
+    idx = Indexer()
+    idx.add("/edev_0_der_0_ders", m.DERStatus(href="/edev_0_der_0_ders"))
+    idx.add("/edev_1_der_0_ders", m.DERStatus(href="/edev_1_der_0_ders"))
+    idx.add("/edev_1_der_0_dera", m.DERAvailability(href="/edev_1_der_0_dera"))
+
+    assert [x.href for x in idx.filtered("/edev_1")] == ["/edev_1_der_0_dera", "/edev_1_der_0_ders"]
+    assert len(idx.filtered(suffix="ders")) == 2
+    assert [x.href for x in idx.filtered("/edev_0", suffix="ders")] == ["/edev_0_der_0_ders"]
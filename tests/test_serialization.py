@@ -1,5 +1,7 @@
 import base64
 
+import pytest
+
 from ieee_2030_5.models.sep import EndDevice, EndDeviceList
 from ieee_2030_5.utils import dataclass_to_xml, xml_to_dataclass
 
@@ -38,3 +40,206 @@ def test_from_string():
     ed = new_class.EndDevice[0]
     assert 125842441685 == ed.sFDI
     assert b'2EE1453C8A019B6BE4EC91317DCF6082C2F8090A' == ed.lFDI
+
+
+def _random_instance(cls, rnd, depth=0):
+    import dataclasses
+    import inspect
+    import typing
+
+    import ieee_2030_5.models.sep as sep
+
+    def value(tp, depth):
+        origin = typing.get_origin(tp)
+        args = typing.get_args(tp)
+        if origin is typing.Union:
+            return value([a for a in args if a is not type(None)][0], depth)
+        if origin is list:
+            return [value(args[0], depth) for _ in range(rnd.randint(0, 2))]
+        if tp is bool:
+            return rnd.choice([True, False])
+        if tp is int:
+            return rnd.choice([0, 1, -5, 123456789])
+        if tp is str:
+            return rnd.choice(["a", "x<y>&\"'", "", "abc\tdef"])
+        if tp is bytes:
+            return rnd.choice([b"\x01\xab", b"", b"AB"])
+        if dataclasses.is_dataclass(tp) and depth < 3:
+            subclasses = [
+                c for c in vars(sep).values()
+                if inspect.isclass(c) and dataclasses.is_dataclass(c) and issubclass(c, tp)
+            ]
+            return _random_instance(rnd.choice(subclasses), rnd, depth + 1)
+        return None
+
+    hints = typing.get_type_hints(cls, vars(sep))
+    return cls(**{
+        f.name: value(hints[f.name], depth)
+        for f in dataclasses.fields(cls) if f.init and rnd.random() > 0.3
+    })
+
+
+def test_compact_writer_matches_xsdata():
+    import dataclasses
+    import inspect
+    import random
+
+    import ieee_2030_5.models.sep as sep
+    from ieee_2030_5.utils import __compact_serializer__, __compact_writer__, __ns_map__
+
+    rnd = random.Random(2030)
+    classes = [
+        c for c in vars(sep).values()
+        if inspect.isclass(c) and dataclasses.is_dataclass(c) and c.__module__ == sep.__name__
+    ]
+    for cls in classes:
+        for _ in range(3):
+            obj = _random_instance(cls, rnd)
+            expected = __compact_serializer__.render(obj, ns_map=__ns_map__)
+            assert __compact_writer__.render(obj) == expected
+
+
+@pytest.mark.benchmark
+def test_compact_writer_benchmark():
+    import time
+
+    import ieee_2030_5.models as m
+    from ieee_2030_5.utils import __ns_map__, __serializer__
+
+    readings = [
+        m.Reading(href=f"/mup_0_mr_0_rs_0_r_{i}",
+                  timePeriod=m.DateTimeInterval(start=i * 300, duration=300),
+                  value=i,
+                  qualityFlags=b"\x00\x01") for i in range(100)
+    ]
+    payloads = {
+        "EndDeviceList":
+        m.EndDeviceList(href="/edev", all=100, results=100, EndDevice=[
+            m.EndDevice(href=f"/edev_{i}",
+                        lFDI=b"\x12" * 20,
+                        sFDI=i,
+                        changedTime=i,
+                        enabled=True,
+                        DERListLink=m.DERListLink(href=f"/edev_{i}_der", all=1),
+                        FunctionSetAssignmentsListLink=m.FunctionSetAssignmentsListLink(
+                            href=f"/edev_{i}_fsa", all=1),
+                        RegistrationLink=m.RegistrationLink(href=f"/edev_{i}_rg"))
+            for i in range(100)
+        ]),
+        "DERControlList":
+        m.DERControlList(href="/derp_0_derc", all=100, results=100, DERControl=[
+            m.DERControl(href=f"/derp_0_derc_{i}",
+                         mRID=f"{i:032X}",
+                         creationTime=i,
+                         interval=m.DateTimeInterval(start=i, duration=10),
+                         EventStatus=m.EventStatus(currentStatus=1, dateTime=i,
+                                                   potentiallySuperseded=False),
+                         DERControlBase=m.DERControlBase(
+                             opModConnect=True,
+                             opModMaxLimW=50,
+                             opModTargetW=m.ActivePower(value=1, multiplier=0)))
+            for i in range(100)
+        ]),
+        "MirrorUsagePoint":
+        m.MirrorUsagePoint(href="/mup_0", mRID="ABC", roleFlags=b"\x49", serviceCategoryKind=0,
+                           status=1, deviceLFDI=b"\x12" * 20, MirrorMeterReading=[
+                               m.MirrorMeterReading(
+                                   mRID=f"MMR{j}",
+                                   ReadingType=m.ReadingType(uom=38, kind=37, flowDirection=1),
+                                   MirrorReadingSet=[
+                                       m.MirrorReadingSet(mRID="MRS0",
+                                                          timePeriod=m.DateTimeInterval(
+                                                              start=0, duration=30000),
+                                                          Reading=readings)
+                                   ]) for j in range(3)
+                           ])
+    }
+
+    def timed(fn, obj):
+        start = time.perf_counter()
+        for _ in range(10):
+            fn(obj)
+        return (time.perf_counter() - start) / 10
+
+    for name, obj in payloads.items():
+        xsdata = timed(lambda o: __serializer__.render(o, ns_map=__ns_map__), obj)
+        compact = timed(dataclass_to_xml, obj)
+        print(f"{name}: xsdata pretty {xsdata * 1000:.2f}ms compact {compact * 1000:.2f}ms")
+        assert compact * 2 < xsdata
+
+
+def test_stream_mirror_readings():
+    import io
+
+    import ieee_2030_5.models as m
+    from ieee_2030_5.utils import stream_mirror_readings
+
+    mmr = m.MirrorMeterReading(
+        mRID=b"\x00\x01",
+        description="Real Power",
+        MirrorReadingSet=[
+            m.MirrorReadingSet(mRID=bytes([i]),
+                               timePeriod=m.DateTimeInterval(start=0, duration=1000),
+                               Reading=[
+                                   m.Reading(value=j,
+                                             timePeriod=m.DateTimeInterval(start=j, duration=1))
+                                   for j in range(2000)
+                               ]) for i in range(2)
+        ],
+        Reading=m.Reading(value=7),
+        ReadingType=m.ReadingType(uom=38))
+    body = dataclass_to_xml(m.MirrorMeterReadingList(all=1, results=1, MirrorMeterReading=[mmr]))
+
+    stream = stream_mirror_readings(io.BytesIO(body.encode()))
+    assert stream.root_tag == "MirrorMeterReadingList"
+    items = []
+    for kind, value in stream:
+        items.append((kind, value))
+        # Parsed readings aren't kept in the tree, only what lxml has read ahead.
+        assert sum(1 for _ in stream._root.iter()) < 2000
+
+    kinds = [kind for kind, _ in items]
+    assert kinds == ["MirrorMeterReading"] + (["MirrorReadingSet"] + ["Reading"] * 2000 + ["end"]) * 2 \
+        + ["Reading", "end"]
+    # The ReadingType follows the readings so is only known at the end.
+    assert items[0][1] == m.MirrorMeterReading(mRID=b"\x00\x01", description="Real Power")
+    assert items[-1][1] == m.MirrorMeterReading(mRID=b"\x00\x01", description="Real Power",
+                                                ReadingType=m.ReadingType(uom=38))
+    assert items[1][1] == m.MirrorReadingSet(mRID=b"\x00",
+                                             timePeriod=m.DateTimeInterval(start=0, duration=1000))
+    assert [value for kind, value in items if kind == "Reading"] == \
+        mmr.MirrorReadingSet[0].Reading + mmr.MirrorReadingSet[1].Reading + [mmr.Reading]
+
+
+def test_parsers_per_thread():
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pytest
+    from xsdata.exceptions import ParserError
+
+    import ieee_2030_5.models as m
+    import ieee_2030_5.utils as utils
+
+    documents = [
+        m.DERStatus(href=f"/edev_{i}_der_0_ders", readingTime=i,
+                    genConnectStatus=m.ConnectStatusType(dateTime=i, value=b"\x01"))
+        if i % 2 else m.DERSettings(href=f"/edev_{i}_der_0_derg", setMaxW=m.ActivePower(i, 0),
+                                    setGradW=i, updatedTime=i) for i in range(200)
+    ]
+    xmls = [dataclass_to_xml(doc) for doc in documents]
+
+    def parse(i):
+        return utils.__xml_parsers__.parser, xml_to_dataclass(xmls[i]), \
+            xml_to_dataclass(xmls[i], type(documents[i]))
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(parse, range(200)))
+    assert [parsed for _, parsed, _ in results] == documents
+    assert [parsed for _, _, parsed in results] == documents
+    parsers = {id(parser) for parser, _, _ in results}
+    assert len(parsers) <= 8
+    assert id(utils.__xml_parsers__.parser) not in parsers
+
+    # The type passed is checked against the root element.
+    with pytest.raises(ParserError):
+        xml_to_dataclass(xmls[1], m.DERSettings)
@@ -1,5 +1,7 @@
 from pathlib import Path
 
+import pytest
+
 import ieee_2030_5.models as m
 from ieee_2030_5.client import IEEE2030_5_Client
 
@@ -27,3 +29,161 @@ def test_starting_server_using_fixture(server_startup):
 
 def test_first_enddevice_using_fixture(first_client: IEEE2030_5_Client):
     assert first_client
+
+
+def test_pooled_server_handles_requests_concurrently():
+    import http.client
+    import ssl
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from werkzeug.serving import generate_adhoc_ssl_context
+
+    from ieee_2030_5.flask_server import PooledWSGIServer
+
+    def app(environ, start_response):
+        time.sleep(0.2)
+        start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+        return [b"ok"]
+
+    server = PooledWSGIServer("127.0.0.1", 0, app, workers=20, backlog=64,
+                              ssl_context=generate_adhoc_ssl_context())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    client_context = ssl.create_default_context()
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+
+    def get(_):
+        conn = http.client.HTTPSConnection("127.0.0.1", server.port, context=client_context)
+        try:
+            conn.request("GET", "/dcap")
+            return conn.getresponse().read()
+        finally:
+            conn.close()
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(40) as pool:
+            responses = list(pool.map(get, range(40)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+    assert responses == [b"ok"] * 40
+    # Served one at a time this would take 8 seconds.
+    assert elapsed < 2
+    assert not thread.is_alive()
+
+
+def test_peer_identity_cached_per_connection_and_certificate(monkeypatch):
+    from types import SimpleNamespace
+
+    import OpenSSL
+    from werkzeug.serving import generate_adhoc_ssl_pair
+    from cryptography.hazmat.primitives.serialization import Encoding
+
+    from ieee_2030_5.certs import lfdi_from_fingerprint, sfdi_from_lfdi
+    from ieee_2030_5.flask_server import PeerCertWSGIRequestHandler
+
+    cert, _ = generate_adhoc_ssl_pair()
+    der = cert.public_bytes(Encoding.DER)
+
+    lookups = []
+    devices = {"dev1"}
+    tlsrepo = SimpleNamespace(
+        find_device_id_from_sfdi=lambda sfdi: lookups.append(sfdi) or next(iter(devices), None),
+        index_version=0)
+    config = SimpleNamespace(lfdi_mode="lfdi_mode_from_cert_fingerprint",
+                             lfdi_client=None,
+                             generate_admin_cert=False)
+    monkeypatch.setattr(PeerCertWSGIRequestHandler, "config", config, raising=False)
+    monkeypatch.setattr(PeerCertWSGIRequestHandler, "tlsrepo", tlsrepo, raising=False)
+    PeerCertWSGIRequestHandler.identity_from_cert.cache_clear()
+
+    loads = []
+    load_certificate = OpenSSL.crypto.load_certificate
+    monkeypatch.setattr(OpenSSL.crypto, "load_certificate",
+                        lambda *args: loads.append(args) or load_certificate(*args))
+
+    peer_certs = []
+
+    def get_peer_cert():
+        peer_certs.append(der)
+        return der
+
+    try:
+        connection_cache = {}
+        first = PeerCertWSGIRequestHandler.peer_environ("/dcap", get_peer_cert, connection_cache)
+        second = PeerCertWSGIRequestHandler.peer_environ("/edev", get_peer_cert, connection_cache)
+        lfdi = lfdi_from_fingerprint(
+            load_certificate(OpenSSL.crypto.FILETYPE_ASN1, der).digest("sha256").decode('ascii'))
+        assert first["ieee_2030_5_lfdi"] == second["ieee_2030_5_lfdi"] == lfdi
+        assert second["ieee_2030_5_sfdi"] == sfdi_from_lfdi(lfdi)
+        # Keep-alive requests don't touch the peer certificate at all.
+        assert len(peer_certs) == 1
+
+        # A new connection with the same certificate only pays for fetching the DER bytes.
+        third = PeerCertWSGIRequestHandler.peer_environ("/dcap", get_peer_cert, {})
+        assert third["ieee_2030_5_lfdi"] == lfdi
+        assert len(peer_certs) == 2
+        assert len(loads) == 1
+        assert len(lookups) == 1
+
+        # Once the certificate leaves the index neither cache vouches for the device.
+        devices.clear()
+        tlsrepo.index_version += 1
+        with pytest.raises(AssertionError, match="Unknown device"):
+            PeerCertWSGIRequestHandler.peer_environ("/edev", get_peer_cert, connection_cache)
+        assert len(lookups) == 2
+    finally:
+        PeerCertWSGIRequestHandler.identity_from_cert.cache_clear()
+
+
+def test_tls_sessions_resumed_on_reconnect(new_tls_repository):
+    import threading
+
+    from ieee_2030_5.flask_server import PooledWSGIServer, __build_ssl_context__
+    from ieee_2030_5.utils import dataclass_to_xml
+    from ieee_2030_5.utils.tls_sessions import ClientSessionCache
+
+    repo = new_tls_repository
+    repo.create_cert("dev1")
+    body = dataclass_to_xml(m.DeviceCapability(href="/dcap", pollRate=900)).encode()
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "application/sep+xml"),
+                                  ("Content-Length", str(len(body)))])
+        return [body]
+
+    server = PooledWSGIServer("127.0.0.1", 0, app, workers=4,
+                              ssl_context=__build_ssl_context__(repo))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    cert_file, key_file = repo.get_file_pair("dev1")
+    sessions = ClientSessionCache(size=4)
+    try:
+        client = IEEE2030_5_Client(cafile=repo.ca_cert_file, server_hostname="127.0.0.1",
+                                   server_ssl_port=server.port, keyfile=Path(key_file),
+                                   certfile=Path(cert_file), debug=False, session_cache=sessions)
+        # The werkzeug server closes the connection after each response so each poll reconnects.
+        for _ in range(4):
+            assert client.device_capability().pollRate == 900
+        client.disconnect()
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+    assert client.handshake_stats.snapshot()["resumed"] == 3
+    stats = server.handshake_stats.snapshot()
+    assert (stats["full"], stats["resumed"], stats["failed"]) == (1, 3, 0)
+    assert stats["resumption_ratio"] == 0.75 and stats["handshakes_per_second"] > 0
+    assert len(sessions) == 1
+
+    # Sessions aren't resumed once they are older than the lifetime of the cache.
+    sessions.lifetime = 0
+    assert sessions.get(("127.0.0.1", server.port, cert_file)) is None
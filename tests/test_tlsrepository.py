@@ -15,3 +15,159 @@ def test_tls_creates_client_cert_and_key(new_tls_repository):
     # Note using internal api this may change!
     assert Path(new_tls_repository.__get_key_file__("foo")).exists()
     assert Path(new_tls_repository.__get_cert_file__("foo")).exists()
+
+
+def test_tls_device_lookups_use_index(new_tls_repository, monkeypatch):
+    from ieee_2030_5.certs import TLSRepository
+
+    new_tls_repository.create_cert("foo")
+    new_tls_repository.create_cert("bar")
+    foo_sfdi = new_tls_repository.sfdi("foo")
+    bar_lfdi = new_tls_repository.lfdi("bar")
+
+    reads = []
+    read_fingerprint = TLSRepository._read_fingerprint
+    monkeypatch.setattr(TLSRepository, "_read_fingerprint",
+                        lambda self, *args: reads.append(args) or read_fingerprint(self, *args))
+
+    for _ in range(10):
+        assert new_tls_repository.find_device_id_from_sfdi(foo_sfdi) == "foo"
+        assert new_tls_repository.find_device_id_from_lfdi(bar_lfdi) == "bar"
+    assert new_tls_repository.client_list["foo"]["lFID"] == new_tls_repository.lfdi("foo")
+    assert not reads
+
+    # A certificate created by another repository on the same directory is picked up.
+    other = TLSRepository(repo_dir=new_tls_repository._repo_dir,
+                          openssl_cnffile_template=new_tls_repository._openssl_cnf_file,
+                          serverhost="serverhostname")
+    other.create_cert("baz")
+    assert new_tls_repository.find_device_id_from_sfdi(other.sfdi("baz")) == "baz"
+    assert "baz" in new_tls_repository.client_list
+    assert new_tls_repository.find_device_id_from_sfdi(12345) is None
+
+
+def test_tls_bulk_provisioning(new_tls_repository):
+    import subprocess
+
+    from ieee_2030_5.utils.tls_wrapper import OpensslWrapper
+
+    repo = new_tls_repository
+    repo.create_cert("foo")
+    serial = int(Path(repo._repo_dir, "serial").read_text(), 16)
+    names = [f"house{i}" for i in range(6)]
+
+    report = repo.create_certs(names + ["foo", "house0"], workers=2)
+    assert sorted(report.created) == names
+    assert report.skipped == ["foo"]
+    assert not report.failed and report.per_second > 0
+
+    # The serials were reserved from the serial file and recorded like openssl ca does.
+    assert int(Path(repo._repo_dir, "serial").read_text(), 16) == serial + len(names)
+    index_lines = Path(repo._repo_dir, "index.txt").read_text().splitlines()
+    assert [line.split("\t")[-1] for line in index_lines[-6:]] == [f"/C=US/CN={n}" for n in names]
+
+    for name in names:
+        cert_file = repo.__get_cert_file__(name)
+        subprocess.check_call(["openssl", "verify", "-CAfile", str(repo.ca_cert_file), str(cert_file)],
+                              stdout=subprocess.DEVNULL)
+        assert repo.fingerprint(name) == \
+            OpensslWrapper.tls_get_fingerprint_from_cert(cert_file).replace(":", "")
+        assert repo.find_device_id_from_sfdi(repo.sfdi(name)) == name
+        assert name in repo.client_list
+
+    # openssl ca carries on from the bookkeeping.
+    repo.create_cert("bar")
+    assert int(Path(repo._repo_dir, "serial").read_text(), 16) == serial + len(names) + 1
+
+
+def test_tls_identity_from_manifest(new_tls_repository, monkeypatch):
+    import json
+    import os
+    import shutil
+    import subprocess
+
+    import ieee_2030_5.certs as certs
+    from ieee_2030_5.certs import TLSRepository
+    from ieee_2030_5.utils.tls_wrapper import OpensslWrapper
+
+    repo = new_tls_repository
+    repo.create_cert("foo")
+    repo.create_certs([f"house{i}" for i in range(3)], workers=1)
+
+    # The fingerprint is computed in process the way openssl does.
+    cert_file = repo.__get_cert_file__("foo")
+    out = subprocess.check_output(
+        ["openssl", "x509", "-in", str(cert_file), "-noout", "-fingerprint", "-sha256"], text=True)
+    assert OpensslWrapper.tls_get_fingerprint_from_cert(cert_file) == out.split("=")[1].strip()
+
+    manifest = json.loads(repo.__get_manifest_file__("house1").read_text())
+    assert manifest["common_name"] == "house1"
+    assert manifest["fingerprint"] == repo.fingerprint("house1")
+    assert (manifest["lfdi"], manifest["sfdi"]) == (repo.lfdi("house1"), repo.sfdi("house1"))
+    assert manifest["not_after"]
+
+    # A repository opened on the directory doesn't read the certificates.
+    loads = []
+    load = certs.x509.load_pem_x509_certificate
+    monkeypatch.setattr(certs.x509, "load_pem_x509_certificate",
+                        lambda *args: loads.append(args) or load(*args))
+    other = TLSRepository(repo_dir=repo._repo_dir,
+                          openssl_cnffile_template=repo._openssl_cnf_file,
+                          serverhost="serverhostname")
+    assert other.has_device("house2") and other.lfdi("house2") == repo.lfdi("house2")
+    assert not loads
+
+    # A certificate replaced in place no longer matches its manifest.
+    shutil.copyfile(repo.__get_cert_file__("house0"), repo.__get_cert_file__("house2"))
+    os.utime(repo.__get_cert_file__("house2"), ns=(1, 1))
+    version = other.index_version
+    other.refresh_index(force=True)
+    assert other.lfdi("house2") == repo.lfdi("house0")
+    assert len(loads) == 1
+    # Identities cached from the replaced certificate are dropped.
+    assert other.index_version > version
+
+
+def test_tls_warm_start(new_tls_repository, monkeypatch):
+    import os
+    import shutil
+
+    from ieee_2030_5.certs import TLSRepository
+
+    repo = new_tls_repository
+    repo.create_certs([f"house{i}" for i in range(4)], workers=1)
+    assert repo._index_manifest_file.exists()
+
+    def open_repo():
+        return TLSRepository(repo_dir=repo._repo_dir,
+                             openssl_cnffile_template=repo._openssl_cnf_file,
+                             serverhost="serverhostname",
+                             warm_start=True)
+
+    # Nothing is read from the certs or manifest directories when the index manifest is
+    # up to date.
+    globbed = []
+    glob = Path.glob
+    monkeypatch.setattr(Path, "glob", lambda self, *args: globbed.append(self) or glob(self, *args))
+    monkeypatch.setattr(TLSRepository, "verify_index", lambda self: [])
+    warm = open_repo()
+    assert not globbed
+    assert warm.has_device("house3") and not warm.has_device("ca")
+    assert warm.find_device_id_from_sfdi(repo.sfdi("house3")) == "house3"
+    assert warm.client_list["house1"]["lFID"] == repo.lfdi("house1")
+    monkeypatch.undo()
+
+    # The verifier picks up a certificate replaced behind the manifest's back.
+    lfdi = repo.lfdi("house2")
+    stat = repo._certs_dir.stat()
+    shutil.copyfile(repo.__get_cert_file__("house0"), repo.__get_cert_file__("house2"))
+    os.utime(repo._certs_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    warm = open_repo()
+    assert warm.lfdi("house2") in (lfdi, repo.lfdi("house0"))
+    warm._verifier.join()
+    assert warm.lfdi("house2") == repo.lfdi("house0")
+    assert open_repo().lfdi("house2") == repo.lfdi("house0")
+
+    # A change to the directories means the manifest isn't used.
+    repo.create_cert("foo")
+    assert open_repo().has_device("foo")